@@ -63,6 +63,9 @@ class Settings(BaseSettings):
     # where to store regridding files
     MAP_FILES: str = ""
 
+    # save the Legendre tables of earth2mip.sht under LOCAL_CACHE
+    SHT_CACHE: bool = False
+
     # End point for s3 commands
     S3_ENDPOINT: str = "https://pbss.s8k.io"
 
@@ -0,0 +1,165 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import logging
+import queue
+import threading
+from time import perf_counter
+from typing import List, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWriter:
+    """Write each output step on a background thread
+
+    :py:meth:`write` selects or reduces the parts of the step's data to save on
+    the device, copies them to host memory once, pinned when the data is on the GPU,
+    and queues them. A background thread then calls :py:meth:`_write_step`, so
+    the next model step runs while the previous one is being written. At most
+    ``max_queue`` steps wait in the queue, and their host buffers are reused.
+
+    Subclasses implement :py:meth:`_write_step`, and can override
+    :py:meth:`_select` to only copy the data they save.
+
+    Attributes:
+        max_queue_depth: the largest number of steps waiting to be written
+        stall_time: the seconds :py:meth:`write` spent waiting for room in the
+            queue. If this is large, writing is the bottleneck.
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_queue: int = 2):
+        self.max_queue = max_queue
+
+        self.n_writes = 0
+        self.max_queue_depth = 0
+        self.stall_time = 0.0
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        # one buffer per queue slot and one for the step being written
+        self._buffers = queue.Queue()
+        self._n_buffers = 0
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _get_buffers(
+        self, tensors: List[Optional[torch.Tensor]]
+    ) -> List[Optional[torch.Tensor]]:
+        def layout(tensors):
+            return [None if t is None else (t.shape, t.dtype) for t in tensors]
+
+        if self._n_buffers <= self.max_queue:
+            self._n_buffers += 1
+        else:
+            start = perf_counter()
+            buffers = self._buffers.get()
+            self.stall_time += perf_counter() - start
+            if layout(buffers) == layout(tensors):
+                return buffers
+        return [
+            None
+            if t is None
+            else torch.empty(
+                t.shape,
+                dtype=t.dtype,
+                pin_memory=t.is_cuda and torch.cuda.is_available(),
+            )
+            for t in tensors
+        ]
+
+    def write(
+        self,
+        data: torch.Tensor,
+        batch_id: int,
+        time_count: int,
+        time: datetime.datetime,
+    ):
+        """Queue the (batch, channel, lat, lon) ``data`` valid at ``time``"""
+        self._raise_error()
+        tensors = self._select(data, batch_id, time_count)
+        buffers = self._get_buffers(tensors)
+        for buffer, tensor in zip(buffers, tensors):
+            if tensor is not None:
+                buffer.copy_(tensor, non_blocking=True)
+        event = None
+        if data.is_cuda:
+            event = torch.cuda.Event()
+            event.record()
+
+        start = perf_counter()
+        self._queue.put((buffers, event, batch_id, time_count, time))
+        self.stall_time += perf_counter() - start
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            buffers, event, batch_id, time_count, valid_time = item
+            try:
+                if self._error is None:
+                    if event is not None:
+                        event.synchronize()
+                    self._write_step(buffers, batch_id, time_count, valid_time)
+                    self.n_writes += 1
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._buffers.put(buffers)
+
+    def _select(
+        self, data: torch.Tensor, batch_id: int, time_count: int
+    ) -> List[Optional[torch.Tensor]]:
+        """The tensors to copy to the host for ``data``, None if nothing to copy"""
+        return [data]
+
+    def _write_step(
+        self,
+        data: List[torch.Tensor],
+        batch_id: int,
+        time_count: int,
+        time: datetime.datetime,
+    ):
+        raise NotImplementedError
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError("Writing the output failed.") from self._error
+
+    def close(self):
+        """Wait for the queued steps to be written"""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+            logger.info(
+                f"Wrote {self.n_writes} steps. Max queue depth "
+                f"{self.max_queue_depth}/{self.max_queue}, "
+                f"stalled for {self.stall_time:.2f}s."
+            )
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -45,8 +45,10 @@ def open_hdf5(*, path, f=None, metadata):
     ds = array.rename(dict(zip(array.dims, dims)))
     year = time.filename_to_year(path)
     n = array.shape[0]
+    # zonal data has no lon dimension, so only assign coords for dims on disk
+    coords = {k: v for k, v in metadata["coords"].items() if k in dims}
     ds = ds.assign_coords(
-        time=time.datetime_range(year, time_step=time_step, n=n), **metadata["coords"]
+        time=time.datetime_range(year, time_step=time_step, n=n), **coords
     )
     ds = ds.assign_attrs(metadata["attrs"], path=path)
     return ds
@@ -14,27 +14,52 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import numpy as np
 import torch
 from netCDF4._netCDF4 import Group
 
-from earth2mip import weather_events
+from earth2mip import geometry, weather_events
 from earth2mip.schema import Grid
 from earth2mip.weather_events import CWBDomain, MultiPoint, Window
 
 
+def get_netcdf_encoding(
+    encoding: weather_events.OutputEncoding, default_dtype: Any = float
+) -> Tuple[Any, Dict[str, Any]]:
+    """The netCDF dtype and createVariable keyword arguments of ``encoding``"""
+    if encoding.dtype == "float16":
+        raise ValueError(
+            "netCDF has no 16 bit float, use int16 or significant_bits instead."
+        )
+    if encoding.dtype == "int16" and encoding.scale_factor is None:
+        raise ValueError("int16 encoding needs a scale_factor.")
+
+    dtype = np.dtype(encoding.dtype) if encoding.dtype else default_dtype
+    kwargs = {}
+    if encoding.compression:
+        kwargs["compression"] = encoding.compression
+        kwargs["complevel"] = encoding.complevel
+    if encoding.least_significant_digit is not None:
+        kwargs["least_significant_digit"] = encoding.least_significant_digit
+    if encoding.significant_bits is not None:
+        kwargs["significant_digits"] = encoding.significant_bits
+        kwargs["quantize_mode"] = "BitRound"
+    return dtype, kwargs
+
+
 class Diagnostics:
     def __init__(
         self,
-        group: Group,
+        group: Optional[Group],
         domain: Union[CWBDomain, Window, MultiPoint],
         grid: Grid,
         diagnostic: weather_events.Diagnostic,
         lat: np.ndarray,
         lon: np.ndarray,
         device: torch.device,
+        n_ensemble: Optional[int] = None,
     ):
         self.group, self.domain, self.grid, self.lat, self.lon = (
             group,
@@ -45,10 +70,22 @@ class Diagnostics:
         )
         self.diagnostic = diagnostic
         self.device = device
+        self.n_ensemble = n_ensemble
+
+        # the domain's (lat, lon) index into the output grid
+        lat_index, lon_index = geometry.get_space_index(lat, lon, domain)
+        if not isinstance(lat_index, slice):
+            lat_index = torch.as_tensor(lat_index, device=device)
+            lon_index = torch.as_tensor(lon_index, device=device)
+        self.space_index = (lat_index, lon_index)
+        self.channel_index = None
 
-        self._init_subgroup()
-        self._init_dimensions()
-        self._init_variables()
+        # without a netCDF group the caller creates the variables and sets
+        # the ``subgroup`` that :py:meth:`update` writes to
+        if group is not None:
+            self._init_subgroup()
+            self._init_dimensions()
+            self._init_variables()
 
     def _init_subgroup(
         self,
@@ -72,12 +109,44 @@ class Diagnostics:
         dims = self.get_dimensions()
         dtypes = self.get_dtype()
         for channel in self.diagnostic.channels:
-            if self.diagnostic.type == "histogram":
-                pass
-            else:
-                self.subgroup.createVariable(
-                    channel, dtypes[self.diagnostic.type], dims[self.diagnostic.type]
-                )
+            encoding = self.diagnostic.encoding
+            dtype, kwargs = get_netcdf_encoding(encoding, dtypes[self.diagnostic.type])
+            variable = self.subgroup.createVariable(
+                channel, dtype, dims[self.diagnostic.type], **kwargs
+            )
+            if encoding.dtype == "int16":
+                # netCDF4 packs the data on write and unpacks on read
+                variable.scale_factor = encoding.scale_factor
+                variable.add_offset = encoding.add_offset
+
+    def set_channels(self, channel_names_of_data: List[str]):
+        """Precompute the index of the diagnostic's channels in the data"""
+        index = [channel_names_of_data.index(c) for c in self.diagnostic.channels]
+        self.channel_index = torch.tensor(index, device=self.device)
+
+    def select(self, data: torch.Tensor) -> torch.Tensor:
+        """Gather the diagnostic's channels and domain from the data
+
+        Args:
+            data: (batch, channel, lat, lon) data on the output grid, with the
+                channels given to :py:meth:`set_channels`
+
+        Returns:
+            (batch, diagnostic channel, *domain dims) data on the same device
+        """
+        lat_index, lon_index = self.space_index
+        return data[:, :, lat_index, lon_index].index_select(1, self.channel_index)
+
+    def reduce(
+        self, output: torch.Tensor, time_index: int, batch_id: int, batch_size: int
+    ) -> Optional[torch.Tensor]:
+        """Reduce the output of :py:meth:`select` on the device
+
+        Returns:
+            the data to pass to :py:meth:`update`, or None if there is nothing
+            to write for this batch yet
+        """
+        return output
 
     def get_dimensions(
         self,
@@ -103,15 +172,16 @@ class Diagnostics:
 class Raw(Diagnostics):
     def __init__(
         self,
-        group: Group,
+        group: Optional[Group],
         domain: Union[CWBDomain, Window, MultiPoint],
         grid: Grid,
         diagnostic: weather_events.Diagnostic,
         lat: np.ndarray,
         lon: np.ndarray,
         device: torch.device,
+        n_ensemble: Optional[int] = None,
     ):
-        super().__init__(group, domain, grid, diagnostic, lat, lon, device)
+        super().__init__(group, domain, grid, diagnostic, lat, lon, device, n_ensemble)
 
     def get_dimensions(self):
         return {"raw": ("ensemble", "time") + self.domain_dims}
@@ -122,12 +192,387 @@ class Raw(Diagnostics):
     def update(
         self, output: torch.Tensor, time_index: int, batch_id: int, batch_size: int
     ):
+        """Write the output of :py:meth:`select`"""
+        # one device to host copy for all the channels
+        output = output.cpu().numpy()
+        for c, channel in enumerate(self.diagnostic.channels):
+            self.subgroup[channel][
+                batch_id : batch_id + batch_size, time_index
+            ] = output[:, c]
+
+
+class EnsembleStatistic(Diagnostics):
+    """A statistic over the ensemble members, streamed across batches
+
+    The members of each output time are accumulated on the device as their
+    batches arrive, only the statistic is copied to the host and written once
+    the last of the ``n_ensemble`` members is seen. The state of every output
+    time is kept until then, since ensemble batches are the outer loop of
+    inference. With several ranks each file holds the statistic of the
+    members run by its rank.
+
+    Statistics with several values per point, such as quantiles or
+    histograms, set ``category`` to the name of their leading dimension and
+    return its coordinate from :py:meth:`get_categories`.
+    """
+
+    category: Optional[str] = None
+
+    def __init__(
+        self,
+        group: Group,
+        domain: Union[CWBDomain, Window, MultiPoint],
+        grid: Grid,
+        diagnostic: weather_events.Diagnostic,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        device: torch.device,
+        n_ensemble: Optional[int] = None,
+    ):
+        if n_ensemble is None:
+            raise ValueError(f"{diagnostic.type} needs the ensemble size.")
+        super().__init__(group, domain, grid, diagnostic, lat, lon, device, n_ensemble)
+        self._state = {}
+        self._count = {}
+
+    def _init_dimensions(self):
+        super()._init_dimensions()
+        if self.category is not None:
+            categories = self.get_categories()
+            self.subgroup.createDimension(self.category, len(categories))
+            v = self.subgroup.createVariable(self.category, float, (self.category,))
+            v[:] = categories
+
+    def get_categories(self) -> List[float]:
+        """The coordinate of the ``category`` dimension"""
+        raise NotImplementedError
+
+    def get_dimensions(self):
+        dims = ("time",) + self.domain_dims
+        if self.category is not None:
+            dims = (self.category,) + dims
+        return {self.diagnostic.type: dims}
+
+    def get_dtype(self):
+        return {self.diagnostic.type: float}
+
+    def reduce(
+        self, output: torch.Tensor, time_index: int, batch_id: int, batch_size: int
+    ) -> Optional[torch.Tensor]:
+        count = self._count.get(time_index, 0)
+        if count == 0:
+            self._state[time_index] = self.init_state(output)
+        else:
+            self._state[time_index] = self.accumulate(
+                self._state[time_index], output, count
+            )
+        count += batch_size
+        if count < self.n_ensemble:
+            self._count[time_index] = count
+            return None
+
+        self._count.pop(time_index, None)
+        return self.finalize(self._state.pop(time_index), count)
+
+    def init_state(self, output: torch.Tensor) -> Any:
+        """The state of the (member, channel, *domain) ``output`` of one batch"""
+        raise NotImplementedError
+
+    def accumulate(self, state: Any, output: torch.Tensor, count: int) -> Any:
+        """Add a batch of members to the ``state`` of ``count`` members"""
+        raise NotImplementedError
+
+    def finalize(self, state: Any, count: int) -> torch.Tensor:
+        """The ([category], channel, *domain) statistic of ``count`` members"""
+        raise NotImplementedError
+
+    def update(
+        self, output: torch.Tensor, time_index: int, batch_id: int, batch_size: int
+    ):
+        """Write the output of :py:meth:`reduce`"""
+        output = output.cpu().numpy()
         for c, channel in enumerate(self.diagnostic.channels):
-            self.subgroup[channel][batch_id : batch_id + batch_size, time_index] = (
-                output[:, c].cpu().numpy()
+            if self.category is None:
+                self.subgroup[channel][time_index] = output[c]
+            else:
+                self.subgroup[channel][:, time_index] = output[:, c]
+
+
+class EnsembleMean(EnsembleStatistic):
+    def init_state(self, output):
+        return output.mean(0)
+
+    def accumulate(self, state, output, count):
+        n = output.shape[0]
+        return state + (output.mean(0) - state) * (n / (count + n))
+
+    def finalize(self, state, count):
+        return state
+
+
+class EnsembleVariance(EnsembleStatistic):
+    """The population (ddof=0) variance of the members
+
+    Batches are merged with the parallel form of Welford's algorithm, which
+    avoids the cancellation of accumulating sums of squares.
+    """
+
+    def init_state(self, output):
+        mean = output.mean(0)
+        return mean, ((output - mean) ** 2).sum(0)
+
+    def accumulate(self, state, output, count):
+        mean, m2 = state
+        n = output.shape[0]
+        batch_mean = output.mean(0)
+        batch_m2 = ((output - batch_mean) ** 2).sum(0)
+        delta = batch_mean - mean
+        total = count + n
+        mean = mean + delta * (n / total)
+        m2 = m2 + batch_m2 + delta**2 * (count * n / total)
+        return mean, m2
+
+    def finalize(self, state, count):
+        _, m2 = state
+        return m2 / count
+
+
+class EnsembleMin(EnsembleStatistic):
+    def init_state(self, output):
+        return output.amin(0)
+
+    def accumulate(self, state, output, count):
+        return torch.minimum(state, output.amin(0))
+
+    def finalize(self, state, count):
+        return state
+
+
+class EnsembleMax(EnsembleStatistic):
+    def init_state(self, output):
+        return output.amax(0)
+
+    def accumulate(self, state, output, count):
+        return torch.maximum(state, output.amax(0))
+
+    def finalize(self, state, count):
+        return state
+
+
+class EnsembleQuantile(EnsembleStatistic):
+    """Running estimates of the ``diagnostic.quantiles`` of the members
+
+    Each quantile of each grid point is tracked by the five markers of the P²
+    algorithm (Jain and Chlamtac, 1985), so the memory does not grow with the
+    ensemble size. The members are kept as long as they take no more memory
+    than the markers, ten per quantile, and their quantiles are exact. Then
+    the markers of each quantile start at their desired positions among the
+    kept members.
+    """
+
+    category = "quantile"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not all(0 < p < 1 for p in self.diagnostic.quantiles):
+            raise ValueError(
+                f"quantiles must be between 0 and 1, got {self.diagnostic.quantiles}. "
+                "Use ensemble_min or ensemble_max for the extremes."
             )
+        self.probabilities = torch.tensor(
+            self.diagnostic.quantiles, dtype=torch.float64, device=self.device
+        )
+        # the heights and positions of the five markers of each quantile
+        self.max_samples = 2 * 5 * len(self.diagnostic.quantiles)
+
+    def get_categories(self):
+        return self.diagnostic.quantiles
+
+    def init_state(self, output):
+        return self.accumulate(output[:0], output, 0)
+
+    def accumulate(self, state, output, count):
+        for x in output:
+            if count < self.max_samples:
+                state = torch.cat([state, x[None]])
+            else:
+                if count == self.max_samples:
+                    state = self._init_markers(state)
+                state = self._add(state, x)
+            count += 1
+        return state
+
+    def finalize(self, state, count):
+        if count <= self.max_samples:
+            p = self.probabilities.to(state.dtype)
+            return torch.quantile(state, p, dim=0)
+        return state[0][:, 2]
+
+    def _init_markers(self, samples):
+        p = self.probabilities[:, None].to(samples.dtype)
+        # the fraction of the samples below each marker, which is also the
+        # increment of its desired position per sample, (quantile, marker)
+        increment = torch.cat([0 * p, p / 2, p, (1 + p) / 2, 1 + 0 * p], 1)
+        desired = 1 + (len(samples) - 1) * increment
+        # marker heights and positions, (quantile, marker, *fields), with each
+        # marker at its desired position among the samples
+        q = torch.quantile(samples, increment.flatten(), dim=0)
+        q = q.view(increment.shape + samples.shape[1:])
+        n = desired.view(desired.shape + (1,) * (samples.ndim - 1))
+        n = n.expand_as(q).clone()
+        return q, n, desired, increment
+
+    def _add(self, state, x):
+        q, n, desired, increment = state
+        # the cell of x, extending the extreme markers if needed
+        k = (x >= q[:, 1]).long() + (x >= q[:, 2]) + (x >= q[:, 3])
+        q[:, 0] = torch.minimum(q[:, 0], x)
+        q[:, 4] = torch.maximum(q[:, 4], x)
+        for i in range(1, 5):
+            n[:, i] += k < i
+        desired = desired + increment
+
+        view = desired.shape + (1,) * (q.ndim - 2)
+        for i in range(1, 4):
+            d = desired[:, i].view(view[:1] + view[2:]) - n[:, i]
+            move = ((d >= 1) & (n[:, i + 1] - n[:, i] > 1)) | (
+                (d <= -1) & (n[:, i - 1] - n[:, i] < -1)
+            )
+            d = torch.sign(d) * move
+            q_parabolic = self._parabolic(q, n, i, d)
+            ok = (q[:, i - 1] < q_parabolic) & (q_parabolic < q[:, i + 1])
+            q_new = torch.where(ok, q_parabolic, self._linear(q, n, i, d))
+            q[:, i] = torch.where(move, q_new, q[:, i])
+            n[:, i] += d
+        return q, n, desired, increment
+
+    @staticmethod
+    def _parabolic(q, n, i, d):
+        return q[:, i] + d / (n[:, i + 1] - n[:, i - 1]) * (
+            (n[:, i] - n[:, i - 1] + d)
+            * (q[:, i + 1] - q[:, i])
+            / (n[:, i + 1] - n[:, i])
+            + (n[:, i + 1] - n[:, i] - d)
+            * (q[:, i] - q[:, i - 1])
+            / (n[:, i] - n[:, i - 1])
+        )
+
+    @staticmethod
+    def _linear(q, n, i, d):
+        q_j = torch.where(d < 0, q[:, i - 1], q[:, i + 1])
+        n_j = torch.where(d < 0, n[:, i - 1], n[:, i + 1])
+        return q[:, i] + d * (q_j - q[:, i]) / (n_j - n[:, i])
+
+
+class Histogram(EnsembleStatistic):
+    """The fraction of the members in each bin
+
+    The bins are ``diagnostic.bin_edges`` if given, otherwise ``nbins`` equal
+    bins spanning ``diagnostic.bin_range``. As in :py:func:`numpy.histogram`
+    the last bin includes its right edge and values outside of the bins are
+    not counted. The counts are accumulated on the device with a
+    scatter-add, one (bin, channel, *domain) array per output time.
+    """
+
+    category = "bin"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.edges = torch.tensor(
+            self.get_edges(), dtype=torch.float64, device=self.device
+        )
+
+    def get_edges(self) -> List[float]:
+        diagnostic = self.diagnostic
+        if diagnostic.bin_edges is not None:
+            edges = list(diagnostic.bin_edges)
+        elif diagnostic.bin_range is not None:
+            edges = np.linspace(*diagnostic.bin_range, diagnostic.nbins + 1).tolist()
+        else:
+            raise ValueError(f"{diagnostic.type} needs bin_edges or bin_range.")
+        if len(edges) < 2 or np.any(np.diff(edges) <= 0):
+            raise ValueError(f"bin edges must be increasing, got {edges}.")
+        return edges
+
+    def _init_dimensions(self):
+        super()._init_dimensions()
+        edges = self.get_edges()
+        for name, values in [("bin_lower", edges[:-1]), ("bin_upper", edges[1:])]:
+            v = self.subgroup.createVariable(name, float, ("bin",))
+            v[:] = values
+
+    def get_categories(self):
+        edges = self.get_edges()
+        return [(a + b) / 2 for a, b in zip(edges[:-1], edges[1:])]
+
+    def init_state(self, output):
+        counts = torch.zeros(
+            (len(self.edges) - 1,) + output.shape[1:],
+            dtype=torch.int32,
+            device=output.device,
+        )
+        return self.accumulate(counts, output, 0)
+
+    def accumulate(self, state, output, count):
+        edges = self.edges.to(output.dtype)
+        nbins = len(edges) - 1
+        index = torch.bucketize(output, edges, right=True) - 1
+        # the right edge of the last bin is closed
+        index = torch.where(output == edges[-1], nbins - 1, index)
+        inside = (index >= 0) & (index < nbins)
+        state.scatter_add_(0, index.clamp(0, nbins - 1), inside.to(state.dtype))
+        return state
+
+    def finalize(self, state, count):
+        return state / count
+
+
+class BinCount(Histogram):
+    """The number of members in each bin of :py:class:`Histogram`"""
+
+    def get_dtype(self):
+        return {self.diagnostic.type: np.int32}
+
+    def finalize(self, state, count):
+        return state
+
+
+class ExceedanceProbability(EnsembleStatistic):
+    """The fraction of the members above each of ``diagnostic.thresholds``"""
+
+    category = "threshold"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.diagnostic.thresholds:
+            raise ValueError(f"{self.diagnostic.type} needs thresholds.")
+        self.thresholds = torch.tensor(
+            self.diagnostic.thresholds, dtype=torch.float64, device=self.device
+        )
+
+    def get_categories(self):
+        return self.diagnostic.thresholds
+
+    def init_state(self, output):
+        return self.accumulate(0, output, 0)
+
+    def accumulate(self, state, output, count):
+        view = (-1,) + (1,) * output.ndim
+        thresholds = self.thresholds.to(output.dtype).view(view)
+        return state + (output > thresholds).sum(1, dtype=torch.int32)
+
+    def finalize(self, state, count):
+        return state / count
 
 
 DiagnosticTypes = {
     "raw": Raw,
+    "ensemble_mean": EnsembleMean,
+    "ensemble_variance": EnsembleVariance,
+    "ensemble_min": EnsembleMin,
+    "ensemble_max": EnsembleMax,
+    "ensemble_quantile": EnsembleQuantile,
+    "histogram": Histogram,
+    "bin_count": BinCount,
+    "exceedance_probability": ExceedanceProbability,
 }
@@ -14,12 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import os
 from datetime import datetime
-from typing import Union
+from typing import Iterator, Optional, Sequence, Tuple, Union
 
+import numpy as np
 import torch
-import torch_harmonics as th
 
+from earth2mip import sht
+from earth2mip.grid import LatLonGrid
 from earth2mip.time_loop import TimeLoop
 
 
@@ -33,6 +37,8 @@ class GaussianRandomFieldS2(torch.nn.Module):
         radius=1.0,
         grid="equiangular",
         dtype=torch.float32,
+        nlon=None,
+        device=None,
     ):
         super().__init__()
         """A mean-zero Gaussian Random Field on the sphere with Matern covariance:
@@ -46,8 +52,7 @@ class GaussianRandomFieldS2(torch.nn.Module):
         Parameters
         ----------
         nlat : int
-            Number of latitudinal modes;
-            longitudinal modes are 2*nlat.
+            Number of latitudes of the output grid.
         alpha : float, default is 2
             Regularity parameter. Larger means smoother.
         tau : float, default is 3
@@ -62,10 +67,15 @@ class GaussianRandomFieldS2(torch.nn.Module):
             "legendre-gauss".
         dtype : torch.dtype, default is torch.float32
             Numerical type for the calculations.
+        nlon : int, default is None
+            Number of longitudes of the output grid. If None, nlon = 2*nlat.
+        device : torch.device, default is None
+            Device of the inverse SHT, the CPU if None.
         """
 
-        # Number of latitudinal modes.
+        # Size of the output grid.
         self.nlat = nlat
+        self.nlon = 2 * nlat if nlon is None else nlon
 
         # Default value of sigma if None is given.
         if sigma is None:
@@ -73,15 +83,23 @@ class GaussianRandomFieldS2(torch.nn.Module):
             sigma = tau ** (0.5 * (2 * alpha - 2.0))
 
         # Inverse SHT
-        self.isht = th.InverseRealSHT(
-            self.nlat, 2 * self.nlat, grid=grid, norm="backward"
-        ).to(dtype=dtype)
+        self.isht = sht.get_inverse_sht(
+            self.nlat,
+            self.nlon,
+            grid=grid,
+            norm="backward",
+            dtype=dtype,
+            device=device,
+        )
+
+        # Number of modes, the triangular truncation of the SHT.
+        self.lmax, self.mmax = self.isht.lmax, self.isht.mmax
 
         # Square root of the eigenvalues of C.
         sqrt_eig = (
-            torch.tensor([j * (j + 1) for j in range(self.nlat)])
-            .view(self.nlat, 1)
-            .repeat(1, self.nlat + 1)
+            torch.tensor([j * (j + 1) for j in range(self.lmax)])
+            .view(self.lmax, 1)
+            .repeat(1, self.mmax)
         )
         sqrt_eig = torch.tril(
             sigma * (((sqrt_eig / radius**2) + tau**2) ** (-alpha / 2.0))
@@ -108,7 +126,7 @@ class GaussianRandomFieldS2(torch.nn.Module):
         N : int
             Number of functions to sample.
         xi : torch.Tensor, default is None
-            Noise is a complex tensor of size (N, nlat, nlat+1).
+            Noise is a complex tensor of size (N, lmax, mmax).
             If None, new Gaussian noise is sampled.
             If xi is provided, N is ignored.
 
@@ -116,12 +134,12 @@ class GaussianRandomFieldS2(torch.nn.Module):
         -------
         u : torch.Tensor
            N random samples from the GRF returned as a
-           tensor of size (N, nlat, 2*nlat) on a equiangular grid.
+           tensor of size (N, nlat, nlon) on a equiangular grid.
         """
         # Sample Gaussian noise.
         if xi is None:
             xi = self.gaussian_noise.sample(
-                torch.Size((N, self.nlat, self.nlat + 1, 2))
+                torch.Size((N, self.lmax, self.mmax, 2))
             ).squeeze()
             xi = torch.view_as_complex(xi)
 
@@ -145,28 +163,137 @@ class GaussianRandomFieldS2(torch.nn.Module):
         return self
 
 
-def generate_noise_correlated(shape, *, reddening, device, noise_amplitude):
-    return noise_amplitude * brown_noise(shape, reddening).to(device)
+class MemberRNG:
+    """Independent random number streams for the members of an ensemble
+
+    The stream of a member is keyed on ``(seed, member)`` only, where
+    ``member`` is the index of the member in the whole ensemble, so any
+    member can be regenerated on its own whatever the number of ranks, the
+    batch size or the order in which the members are run. The key is hashed
+    into the seed of a fresh generator; on CUDA this is the counter-based
+    Philox generator, so no state is carried between members. The streams
+    are reproducible for a given device type, CPU and CUDA draw different
+    numbers.
+    """
 
+    def __init__(self, seed: int):
+        self.seed = seed
 
-def generate_noise_grf(shape, grid, alpha, sigma, tau, device=None):
-    sampler = GaussianRandomFieldS2(nlat=720, alpha=alpha, tau=tau, sigma=sigma).to(
-        device
+    def generator(
+        self,
+        member: int,
+        device: Union[str, torch.device, None] = None,
+        stream: Optional[int] = None,
+    ) -> torch.Generator:
+        """A generator at the start of ``member``'s stream
+
+        ``stream`` selects one of several independent streams of the member,
+        e.g. one per field, so that the fields can be drawn in any grouping.
+        """
+        key = [self.seed, member] if stream is None else [self.seed, member, stream]
+        (state,) = np.random.SeedSequence(key).generate_state(1, dtype=np.uint64)
+        generator = torch.Generator(device=device or "cpu")
+        generator.manual_seed(int(state))
+        return generator
+
+    def randn(
+        self,
+        members: Sequence[int],
+        shape: Sequence[int],
+        device: Union[str, torch.device, None] = None,
+        dtype: Optional[torch.dtype] = None,
+        out: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        """(len(members), *shape) standard normal noise, one stream per member"""
+        if out is None:
+            out = torch.empty((len(members), *shape), device=device, dtype=dtype)
+        for i, member in enumerate(members):
+            out[i].normal_(generator=self.generator(member, out.device))
+        return out
+
+
+def generate_noise_correlated(
+    shape, *, reddening, device, noise_amplitude, generator=None
+):
+    return noise_amplitude * brown_noise(
+        shape, reddening, device=device, generator=generator
     )
-    sample_noise = sampler(shape[0] * shape[1] * shape[2]).reshape(
-        shape[0], shape[1], shape[2], 720, 1440
+
+
+@functools.lru_cache(maxsize=4)
+def _get_grf_sampler(nlat, nlon, alpha, tau, sigma, device, dtype):
+    sampler = GaussianRandomFieldS2(
+        nlat, alpha=alpha, tau=tau, sigma=sigma, dtype=dtype, nlon=nlon, device=device
     )
-    if grid.shape == (721, 1440):
-        noise = torch.zeros(shape).to(device)
-        noise[:, :, :, :-1, :] = sample_noise
-        noise[:, :, :, -1:, :] = noise[:, :, :, -2:-1, :]
-    else:
-        noise = sample_noise
+    return sampler.to(device)
+
+
+def get_grf_sampler(
+    grid: LatLonGrid,
+    alpha: float,
+    tau: float,
+    sigma: Optional[float],
+    device: Union[str, torch.device, None] = None,
+    dtype: torch.dtype = torch.float32,
+) -> GaussianRandomFieldS2:
+    """A cached :py:class:`GaussianRandomFieldS2` sampling on ``grid``
+
+    The samplers of recently used parameters are kept. Their inverse SHTs
+    come from :py:mod:`earth2mip.sht`, so samplers on the same grid share the
+    Legendre polynomials. The field is sampled on the equiangular grid with
+    the shape of ``grid``.
+    """
+    device = torch.device(device or "cpu")
+    return _get_grf_sampler(*grid.shape, alpha, tau, sigma, device, dtype)
+
+
+def generate_noise_grf(
+    shape,
+    grid,
+    alpha,
+    sigma,
+    tau,
+    device=None,
+    rng: Optional[MemberRNG] = None,
+    members: Optional[Sequence[int]] = None,
+    chunk_size: int = 16,
+):
+    """Gaussian random field noise, see :py:class:`GaussianRandomFieldS2`
+
+    The (batch, time, channel, lat, lon) noise is sampled ``chunk_size``
+    fields at a time to bound the memory of the spectral coefficients.
+
+    If ``rng`` is given each field comes from its own stream of the member in
+    ``members``, otherwise from the global random state.
+    """
+    if tuple(shape[-2:]) != grid.shape:
+        raise ValueError(f"Noise shape {shape} does not match grid {grid.shape}.")
+    sampler = get_grf_sampler(grid, alpha, tau, sigma, device)
+    noise = torch.empty(shape, device=device, dtype=sampler.mean.dtype)
+    fields = noise.view(-1, *grid.shape)
+    fields_per_member = len(fields) // shape[0]
+    for start in range(0, len(fields), chunk_size):
+        stop = min(start + chunk_size, len(fields))
+        xi = None
+        if rng is not None:
+            xi = torch.empty(
+                (stop - start, sampler.lmax, sampler.mmax, 2),
+                device=noise.device,
+                dtype=noise.dtype,
+            )
+            for i in range(start, stop):
+                member, field = divmod(i, fields_per_member)
+                generator = rng.generator(members[member], noise.device, field)
+                xi[i - start].normal_(generator=generator)
+            xi = torch.view_as_complex(xi)
+        fields[start:stop] = sampler(stop - start, xi=xi)
     return noise
 
 
-def brown_noise(shape, reddening=2):
-    noise = torch.normal(torch.zeros(shape), torch.ones(shape))
+def brown_noise(
+    shape, reddening=2, device=None, generator: Optional[torch.Generator] = None
+):
+    noise = torch.randn(shape, device=device, generator=generator)
 
     x_white = torch.fft.fft2(noise)
     S = (
@@ -183,6 +310,176 @@ def brown_noise(shape, reddening=2):
     return noise_shaped
 
 
+class EnsembleBatches:
+    """The initial conditions of an ensemble, one batch of members at a time
+
+    Holds a single copy of the base initial condition on the device and
+    broadcasts it into a buffer reused by every batch, which the
+    perturbation can then modify in place. The batch is only valid until the
+    next one is drawn.
+
+    Args:
+        x: the (1, time, channel, lat, lon) base initial condition
+        n_ensemble: the number of members
+        batch_size: the maximum number of members in a batch
+        device: the device of the batches
+
+    Yields:
+        (batch_id, x) where x holds members ``batch_id, batch_id + 1, ...``
+    """
+
+    def __init__(
+        self,
+        x: torch.Tensor,
+        n_ensemble: int,
+        batch_size: int,
+        device: Union[str, torch.device, None] = None,
+    ):
+        if x.shape[0] != 1:
+            raise ValueError(f"Expected a single initial condition, got {x.shape}.")
+        self.x = x.to(device)
+        self.n_ensemble = n_ensemble
+        self.batch_size = batch_size
+        self._buffer = torch.empty(
+            (min(batch_size, n_ensemble),) + x.shape[1:],
+            dtype=x.dtype,
+            device=self.x.device,
+        )
+
+    def __len__(self):
+        return -(-self.n_ensemble // self.batch_size)
+
+    def __iter__(self) -> Iterator[Tuple[int, torch.Tensor]]:
+        for batch_id in range(0, self.n_ensemble, self.batch_size):
+            batch = self._buffer[: min(self.batch_size, self.n_ensemble - batch_id)]
+            batch.copy_(self.x.expand_as(batch))
+            yield batch_id, batch
+
+
+class BredVectorEngine:
+    """Breeds perturbations by repeatedly growing them with one model step
+
+    Each of the ``integration_steps`` cycles steps the network once on the
+    whole batch of perturbed members, takes the difference to the control
+    forecast, and rescales every (member, channel) field of the difference to
+    a root mean square of ``noise_amplitude``. The control forecast is run
+    once, in the same batch as the members' first cycle. The state stays
+    normalized between cycles when the model is an
+    :py:class:`earth2mip.networks.Inference`, other time loops are stepped
+    through their iterator.
+
+    If ``checkpoint_dir`` is given, the bred vector of each member is saved
+    there and used instead of random noise to start the member's breeding the
+    next time, e.g. at the next initial time.
+
+    Args:
+        model: the time loop to breed with
+        noise_amplitude: the amplitude of the bred vectors in normalized units,
+            a scalar or one per channel
+        integration_steps: the number of breeding cycles
+        inflate: if True add ``noise_amplitude`` times the deviation from the
+            mean of the batch in each cycle, which couples the members
+        checkpoint_dir: a directory to keep the bred vectors in
+    """
+
+    def __init__(
+        self,
+        model: TimeLoop,
+        noise_amplitude: Union[float, torch.Tensor],
+        integration_steps: int = 40,
+        inflate: bool = False,
+        checkpoint_dir: Optional[str] = None,
+    ):
+        self.model = model
+        self.noise_amplitude = torch.as_tensor(noise_amplitude, dtype=torch.float32)
+        if self.noise_amplitude.ndim > 1:
+            raise ValueError("noise_amplitude must be a scalar or one per channel.")
+        self.integration_steps = integration_steps
+        self.inflate = inflate
+        self.checkpoint_dir = checkpoint_dir
+        self._normalized = hasattr(model, "step") and hasattr(model, "center")
+
+    def _normalization(self, x):
+        if self._normalized:
+            return self.model.center.to(x.dtype), self.model.scale.to(x.dtype)
+        return 0, 1
+
+    def _step(self, z: torch.Tensor, time: Optional[datetime]) -> torch.Tensor:
+        if self._normalized:
+            return self.model.step(z, time)
+        # one step of a generic time loop, the first output is the input
+        iterator = self.model(time, z)
+        next(iterator)
+        _, data, _ = next(iterator)
+        return data.unsqueeze(1) if data.ndim != z.ndim else data
+
+    def _amplitude(self, dz: torch.Tensor) -> torch.Tensor:
+        amplitude = self.noise_amplitude.to(dz.device, dz.dtype)
+        return amplitude[:, None, None] if amplitude.ndim else amplitude
+
+    def _rescale_(self, dz: torch.Tensor) -> torch.Tensor:
+        norm = torch.linalg.vector_norm(dz, dim=(-2, -1), keepdim=True)
+        size = dz.shape[-2] * dz.shape[-1]
+        return dz.mul_(self._amplitude(dz) * size**0.5 / norm.clamp_min(1e-12))
+
+    def _checkpoint_path(self, member: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"bred_vector_{member}.pt")
+
+    def __call__(
+        self,
+        x: torch.Tensor,
+        time: Optional[datetime] = None,
+        rng: Optional[MemberRNG] = None,
+        members: Optional[Sequence[int]] = None,
+    ) -> torch.Tensor:
+        """The bred vectors of the members of the (batch, time, channel, lat, lon)
+        initial conditions ``x``, which all share the initial condition ``x[:1]``
+
+        The initial noise of the members comes from the streams of ``members`` of
+        ``rng`` if given, otherwise from the global random state.
+
+        Returns:
+            the normalized bred vectors, with the shape of ``x``
+        """
+        if self.checkpoint_dir and members is None:
+            raise ValueError("Checkpointing bred vectors needs the member indices.")
+
+        with torch.no_grad():
+            center, scale = self._normalization(x)
+            z0 = (x[:1] - center) / scale
+            if rng is None:
+                dz = torch.randn(x.shape, device=x.device, dtype=x.dtype)
+            else:
+                dz = rng.randn(members, x.shape[1:], device=x.device, dtype=x.dtype)
+            if self.checkpoint_dir:
+                for i, member in enumerate(members):
+                    path = self._checkpoint_path(member)
+                    if os.path.exists(path):
+                        dz[i] = torch.load(path, map_location=x.device)
+            self._rescale_(dz)
+
+            # the control and the perturbed members stepped as one batch
+            batch = torch.cat([z0, z0 + dz])
+            control = None
+            for _ in range(self.integration_steps):
+                if control is None:
+                    output = self._step(batch, time)
+                    control, perturbed = output[:1], output[1:]
+                else:
+                    torch.add(z0, dz, out=batch[1:])
+                    perturbed = self._step(batch[1:], time)
+                torch.sub(perturbed, control, out=dz)
+                if self.inflate:
+                    dz.addcmul_(dz - dz.mean(dim=0), self._amplitude(dz))
+                self._rescale_(dz)
+
+            if self.checkpoint_dir:
+                os.makedirs(self.checkpoint_dir, exist_ok=True)
+                for i, member in enumerate(members):
+                    torch.save(dz[i].cpu(), self._checkpoint_path(member))
+        return dz
+
+
 def generate_bred_vector(
     x: torch.Tensor,
     model: TimeLoop,
@@ -190,43 +487,15 @@ def generate_bred_vector(
     time: Union[datetime, None] = None,
     integration_steps: int = 40,
     inflate=False,
+    rng: Optional[MemberRNG] = None,
+    members: Optional[Sequence[int]] = None,
 ) -> torch.Tensor:
-    # Assume x has shape [ENSEMBLE, TIME, CHANNEL, LAT, LON]
-
-    if isinstance(noise_amplitude, float):
-        noise_amplitude = torch.tensor([noise_amplitude])
-
-    assert (noise_amplitude.shape[0] == x.shape[2]) or (  # noqa
-        torch.numel(noise_amplitude) == 1
-    )
-
-    x0 = x[:1]
-
-    # Get control forecast
-    for _, data, _ in model(time, x0):
-        xd = data
-        break
-
-    # Unsqueeze if time has been collapsed.
-    if xd.ndim != x0.ndim:
-        xd = xd.unsqueeze(1)
+    """Bred vector perturbations of the members in x
 
-    dx = noise_amplitude[:, None, None] * torch.randn(
-        x.shape, device=x.device, dtype=x.dtype
+    See :py:class:`BredVectorEngine`. x has shape [ENSEMBLE, TIME, CHANNEL,
+    LAT, LON] and all members share the initial condition ``x[:1]``.
+    """
+    engine = BredVectorEngine(
+        model, noise_amplitude, integration_steps=integration_steps, inflate=inflate
     )
-    for _ in range(integration_steps):
-        x1 = x + dx
-        for _, data, _ in model(time, x1):
-            x2 = data
-            break
-
-        # Unsqueeze if time has been collapsed.
-        if x2.ndim != x1.ndim:
-            x2 = x2.unsqueeze(1)
-        dx = x2 - xd
-
-        if inflate:
-            dx += noise_amplitude * (dx - dx.mean(dim=0))
-
-    gamma = torch.norm(x) / torch.norm(x + dx)
-    return noise_amplitude * dx * gamma
+    return engine(x, time, rng=rng, members=members)
@@ -33,18 +33,16 @@ def get_bounds_window(geom, lat, lon):
     return slice(i_min, i_max + 1), slice(j_min, j_max + 1)
 
 
-def select_space(data, lat, lon, domain):
+def get_space_index(lat, lon, domain):
+    """The (lat, lon) index of ``domain`` in a grid with ``lat`` and ``lon``
+
+    Returns slices for windows and integer arrays for points.
+    """
     lat = np.asarray(lat)
     lon = np.asarray(lon)
-    assert data.ndim == 4, data.ndim  # noqa
-    assert data.shape[2] == lat.size, lat.size  # noqa
-    assert data.shape[3] == lon.size, lon.size  # noqa
     domain_type = domain.type
     if domain_type == "Window" or domain_type == LAT_AVERAGE or domain_type == "global":
-        lat_sl, lon_sl = get_bounds_window(domain, lat, lon)
-        domain_lat = lat[lat_sl]
-        domain_lon = lon[lon_sl]
-        return domain_lat, domain_lon, data[:, :, lat_sl, lon_sl]
+        return get_bounds_window(domain, lat, lon)
     elif domain_type == "MultiPoint":
         # Convert lat-long points to array index (just got to closest 0.25 degree)
         i = lat.size - np.searchsorted(lat[::-1], domain.lat, side="right")
@@ -52,12 +50,22 @@ def select_space(data, lat, lon, domain):
         # TODO refactor this assertion to a test
         np.testing.assert_array_equal(domain.lat, lat[i])
         np.testing.assert_array_equal(domain.lon, lon[j])
-        return lat[i], lon[j], data[:, :, i, j]
+        return i, j
     else:
         raise ValueError(
             f"domain {domain_type} is not supported. Check the weather_events.json"
         )
 
 
+def select_space(data, lat, lon, domain):
+    lat = np.asarray(lat)
+    lon = np.asarray(lon)
+    assert data.ndim == 4, data.ndim  # noqa
+    assert data.shape[2] == lat.size, lat.size  # noqa
+    assert data.shape[3] == lon.size, lon.size  # noqa
+    i, j = get_space_index(lat, lon, domain)
+    return lat[i], lon[j], data[:, :, i, j]
+
+
 def bilinear(data: torch.tensor, dims, source_coords, target_coords):
     return
@@ -22,11 +22,11 @@ import sys
 from datetime import datetime
 from typing import Any, Optional
 
-import cftime
 import numpy as np
 import torch
 import tqdm
 import xarray
+import zarr
 from modulus.distributed.manager import DistributedManager
 from netCDF4 import Dataset as DS
 
@@ -40,14 +40,22 @@ __all__ = ["run_inference", "run_basic_inference"]
 from earth2mip import initial_conditions, regrid, time_loop
 from earth2mip._channel_stds import channel_stds
 from earth2mip.ensemble_utils import (
-    generate_bred_vector,
+    BredVectorEngine,
+    EnsembleBatches,
+    MemberRNG,
     generate_noise_correlated,
     generate_noise_grf,
 )
-from earth2mip.netcdf import initialize_netcdf, update_netcdf
+from earth2mip.netcdf import AsyncNetCDFWriter, initialize_netcdf
 from earth2mip.networks import get_model
-from earth2mip.schema import EnsembleRun, PerturbationStrategy
+from earth2mip.schema import EnsembleRun, OutputFormat, PerturbationStrategy
 from earth2mip.time_loop import TimeLoop
+from earth2mip.zarr_output import (
+    AsyncZarrWriter,
+    check_zarr_domains,
+    get_compressor,
+    initialize_zarr,
+)
 
 logger = logging.getLogger("inference")
 
@@ -84,84 +92,132 @@ def run_ensembles(
     output_path: str,
     restart_initial_directory: str = "",
     progress: bool = True,
+    output_queue_size: int = 2,
+    ensemble_offset: int = 0,
 ):
+    """Run the ensemble and save the outputs
+
+    Args:
+        perturb: ``perturb(x, rank, member, device)`` returns the perturbed
+            initial conditions of the members ``member, member + 1, ...`` of
+            the whole ensemble, numbered from ``ensemble_offset``. ``x`` is a
+            buffer reused by every batch and can be modified in place.
+        x: the (1, time, channel, lat, lon) initial condition to perturb
+        nc: the netCDF4 dataset to write to, or the root of a zarr store
+            already set up by :py:func:`earth2mip.zarr_output.initialize_zarr`
+        output_queue_size: the number of output steps that can wait to be
+            written while the model runs
+        ensemble_offset: the index of this rank's first ensemble member, which
+            keys the noise of its members and their region of a zarr store
+            shared by several ranks
+    """
     if not output_grid:
         output_grid = model.grid
 
     regridder = regrid.get_regridder(model.grid, output_grid).to(model.device)
-
-    diagnostics = initialize_netcdf(nc, domains, output_grid, n_ensemble, model.device)
     initial_time = date_obj
-    time_units = initial_time.strftime("hours since %Y-%m-%d %H:%M:%S")
-    nc["time"].units = time_units
-    nc["time"].calendar = "standard"
-
-    for batch_id in range(0, n_ensemble, batch_size):
-        logger.info(f"ensemble members {batch_id+1}-{batch_id+batch_size}/{n_ensemble}")
-        batch_size = min(batch_size, n_ensemble - batch_id)
-
-        x = x.repeat(batch_size, 1, 1, 1, 1)
-        x_start = perturb(x, rank, batch_id, model.device)
-        # restart_dir = weather_event.properties.restart
-
-        # TODO: figure out if needed
-        # if restart_dir:
-        #     path = get_checkpoint_path(rank, batch_id, restart_dir)
-        #     # TODO use logger
-        #     logger.info(f"Loading from restart from {path}")
-        #     kwargs = torch.load(path)
-        # else:
-        #     kwargs = dict(
-        #         x=x,
-        #         normalize=False,
-        #         time=time,
-        #     )
-
-        iterator = model(initial_time, x_start)
-
-        # Check if stdout is connected to a terminal
-        if sys.stderr.isatty() and progress:
-            iterator = tqdm.tqdm(iterator, total=n_steps)
-
-        time_count = -1
-
-        # for time, data, restart in iterator:
-
-        for k, (time, data, _) in enumerate(iterator):
-            # if restart_frequency and k % restart_frequency == 0:
+
+    if isinstance(nc, zarr.Group):
+        writer = AsyncZarrWriter(
+            nc,
+            domains,
+            output_grid,
+            model.out_channel_names,
+            ensemble_offset=ensemble_offset,
+            max_queue=output_queue_size,
+            device=model.device,
+        )
+    else:
+        diagnostics = initialize_netcdf(
+            nc,
+            domains,
+            output_grid,
+            n_ensemble,
+            model.device,
+            channel_names_of_data=model.out_channel_names,
+        )
+        time_units = initial_time.strftime("hours since %Y-%m-%d %H:%M:%S")
+        nc["time"].units = time_units
+        nc["time"].calendar = "standard"
+        writer = AsyncNetCDFWriter(
+            nc,
+            diagnostics,
+            domains,
+            model.grid,
+            model.out_channel_names,
+            max_queue=output_queue_size,
+        )
+
+    batches = EnsembleBatches(x, n_ensemble, batch_size, device=model.device)
+    lazy = getattr(model, "supports_lazy_output", False)
+    output = None
+    with writer:
+        for batch_id, x_batch in batches:
+            logger.info(
+                f"ensemble members {batch_id+1}-{batch_id+len(x_batch)}/{n_ensemble}"
+            )
+            x_start = perturb(x_batch, rank, ensemble_offset + batch_id, model.device)
+            # restart_dir = weather_event.properties.restart
+
+            # TODO: figure out if needed
+            # if restart_dir:
+            #     path = get_checkpoint_path(rank, batch_id, restart_dir)
+            #     # TODO use logger
+            #     logger.info(f"Loading from restart from {path}")
+            #     kwargs = torch.load(path)
+            # else:
+            #     kwargs = dict(
+            #         x=x,
+            #         normalize=False,
+            #         time=time,
+            #     )
+
+            # only denormalize the steps that are saved
+            if lazy:
+                iterator = model(initial_time, x_start, lazy=True)
+            else:
+                iterator = model(initial_time, x_start)
+
+            # Check if stdout is connected to a terminal
+            if sys.stderr.isatty() and progress:
+                iterator = tqdm.tqdm(iterator, total=n_steps)
+
+            time_count = -1
+
+            # for time, data, restart in iterator:
+
+            for k, (time, data, _) in enumerate(iterator):
+                # if restart_frequency and k % restart_frequency == 0:
+                #     save_restart(
+                #         restart,
+                #         rank,
+                #         batch_id,
+                #         path=os.path.join(output_path, "restart", time.isoformat()),
+                #     )
+
+                # Saving the output
+                if output_frequency and k % output_frequency == 0:
+                    time_count += 1
+                    logger.debug(f"Saving data at step {k} of {n_steps}.")
+                    if lazy:
+                        if output is None or output.shape != data.shape:
+                            output = torch.empty(
+                                data.shape, dtype=data.dtype, device=data.device
+                            )
+                        data = data.materialize(out=output)
+                    writer.write(regridder(data), batch_id, time_count, time)
+
+                if k == n_steps:
+                    break
+
+            # if restart_frequency is not None:
             #     save_restart(
             #         restart,
             #         rank,
             #         batch_id,
-            #         path=os.path.join(output_path, "restart", time.isoformat()),
+            #         path=os.path.join(output_path, "restart", "end"),
             #     )
 
-            # Saving the output
-            if output_frequency and k % output_frequency == 0:
-                time_count += 1
-                logger.debug(f"Saving data at step {k} of {n_steps}.")
-                nc["time"][time_count] = cftime.date2num(time, nc["time"].units)
-                update_netcdf(
-                    regridder(data),
-                    diagnostics,
-                    domains,
-                    batch_id,
-                    time_count,
-                    model.grid,
-                    model.out_channel_names,
-                )
-
-            if k == n_steps:
-                break
-
-        # if restart_frequency is not None:
-        #     save_restart(
-        #         restart,
-        #         rank,
-        #         batch_id,
-        #         path=os.path.join(output_path, "restart", "end"),
-        #     )
-
 
 def main(config=None):
     logging.basicConfig(level=logging.INFO)
@@ -209,19 +265,58 @@ def get_initializer(
     model,
     config,
 ):
+    """The ``perturb`` function of ``config.perturbation_strategy``
+
+    The noise of every strategy is drawn from the stream of each member of
+    :py:class:`earth2mip.ensemble_utils.MemberRNG` keyed on ``config.seed``,
+    so the members do not depend on the number of ranks or the batch size.
+    The gaussian and correlated noise is drawn on the device into a buffer
+    reused across batches.
+    """
+    rng = MemberRNG(config.seed)
+    buffers = {}
+    if config.perturbation_strategy == PerturbationStrategy.bred_vector:
+        breed = BredVectorEngine(
+            model,
+            config.noise_amplitude,
+            integration_steps=config.bred_vector_integration_steps,
+            checkpoint_dir=config.bred_vector_checkpoint_dir,
+        )
+
+    def get_buffer(name, x):
+        buffer = buffers.get(name)
+        if buffer is None or buffer.numel() < x.numel() or buffer.device != x.device:
+            buffer = torch.empty(x.shape, dtype=x.dtype, device=x.device)
+            buffers[name] = buffer
+        return buffer.view(-1)[: x.numel()].view(x.shape)
+
+    def get_scale(x):
+        # When field is not in known normalization dictionary set scale to 0
+        scale = buffers.get("scale")
+        if scale is None or scale.device != x.device:
+            scale = torch.tensor(
+                [channel_stds.get(channel, 0) for channel in model.in_channel_names],
+                device=x.device,
+            )
+            buffers["scale"] = scale
+        return scale
+
     def perturb(x, rank, batch_id, device):
         shape = x.shape
+        members = range(batch_id, batch_id + shape[0])
         if config.perturbation_strategy == PerturbationStrategy.gaussian:
-            noise = config.noise_amplitude * torch.normal(
-                torch.zeros(shape), torch.ones(shape)
-            ).to(device)
+            noise = rng.randn(members, shape[1:], out=get_buffer("noise", x))
+            noise *= config.noise_amplitude
         elif config.perturbation_strategy == PerturbationStrategy.correlated:
-            noise = generate_noise_correlated(
-                shape,
-                reddening=config.noise_reddening,
-                device=device,
-                noise_amplitude=config.noise_amplitude,
-            )
+            noise = get_buffer("noise", x)
+            for i, member in enumerate(members):
+                noise[i] = generate_noise_correlated(
+                    shape[1:],
+                    reddening=config.noise_reddening,
+                    device=noise.device,
+                    noise_amplitude=config.noise_amplitude,
+                    generator=rng.generator(member, noise.device),
+                )
         elif config.perturbation_strategy == PerturbationStrategy.spherical_grf:
             noise = generate_noise_grf(
                 shape,
@@ -230,30 +325,24 @@ def get_initializer(
                 alpha=config.grf_noise_alpha,
                 tau=config.grf_noise_tau,
                 device=device,
+                rng=rng,
+                members=members,
             )
         elif config.perturbation_strategy == PerturbationStrategy.bred_vector:
-            noise = generate_bred_vector(
+            noise = breed(
                 x,
-                model,
-                config.noise_amplitude,
-                time=config.weather_event.properties.start_time,
+                config.weather_event.properties.start_time,
+                rng=rng,
+                members=members,
             )
         elif config.perturbation_strategy == PerturbationStrategy.none:
             return x
-        if rank == 0 and batch_id == 0:  # first ens-member is deterministic
+        if batch_id == 0:  # first ens-member is deterministic
             noise[0, :, :, :, :] = 0
 
-        # When field is not in known normalization dictionary set scale to 0
-        scale = []
-        for i, channel in enumerate(model.in_channel_names):
-            if channel in channel_stds:
-                scale.append(channel_stds[channel])
-            else:
-                scale.append(0)
-        scale = torch.tensor(scale, device=x.device)
-
+        scale = get_scale(x)
         if config.perturbation_channels is None:
-            return x + noise * scale[:, None, None]
+            x.addcmul_(noise, scale[:, None, None])
         else:
             channel_list = model.in_channel_names
             indices = torch.tensor(
@@ -281,15 +370,18 @@ def run_basic_inference(
 
     x = initial_conditions.get_initial_condition_for_model(model, data_source, time)
 
-    arrays = []
-    times = []
-    for k, (time, data, _) in enumerate(model(time, x)):
-        arrays.append(data.cpu().numpy())
-        times.append(time)
-        if k == n:
-            break
+    # the outputs are gathered on the host
+    out = torch.empty(
+        (n + 1, x.shape[0], len(model.out_channel_names), *model.grid.shape),
+        dtype=x.dtype,
+    )
+    if hasattr(model, "rollout"):
+        model.rollout(x, time, n, out=out)
+    else:
+        time_loop.TimeLoop.rollout(model, x, time, n, out=out)
 
-    stacked = np.stack(arrays)
+    stacked = out.numpy()
+    times = [time + k * model.time_step for k in range(n + 1)]
     coords = dict(lat=model.grid.lat, lon=model.grid.lon)
     coords["channel"] = model.out_channel_names
     coords["time"] = times
@@ -313,7 +405,9 @@ def run_inference(
         group: the torch distributed group to use for the calculation
         progress: if True use tqdm to show a progress bar
         data_source: a Mapping object indexed by datetime and returning an
-            xarray.Dataset object.
+            xarray.Dataset object. Use
+            :py:class:`earth2mip.initial_conditions.memory.DataSource` to run
+            from arrays already in memory.
     """
     if not perturb:
         perturb = get_initializer(model, config)
@@ -322,6 +416,9 @@ def run_inference(
         group = torch.distributed.group.WORLD
 
     weather_event = config.get_weather_event()
+    if config.output_format == OutputFormat.zarr:
+        # before any output is set up, the schema only checks inline events
+        check_zarr_domains(weather_event.domains)
 
     if not data_source:
         data_source = initial_conditions.get_data_source(
@@ -340,7 +437,8 @@ def run_inference(
         logger.warning("World size is larger than global number of ensembles.")
         n_ensemble = n_ensemble_global
 
-    # Set random seed
+    # Set random seed, the built-in perturbations use the per-member streams of
+    # MemberRNG instead
     seed = config.seed
     torch.manual_seed(seed + dist.rank)
     np.random.seed(seed + dist.rank)
@@ -367,40 +465,78 @@ def run_inference(
             f.write(config.json())
 
     group_rank = torch.distributed.get_group_rank(group, dist.rank)
-    output_file_path = os.path.join(output_path, f"ensemble_out_{group_rank}.nc")
-
-    with DS(output_file_path, "w", format="NETCDF4") as nc:
-        # assign global attributes
-        nc.model = config.weather_model
-        nc.config = config.json()
-        nc.weather_event = weather_event.json()
-        nc.date_created = datetime.now().isoformat()
-        nc.history = " ".join(sys.argv)
-        nc.institution = "NVIDIA"
-        nc.Conventions = "CF-1.10"
-
-        run_ensembles(
-            weather_event=weather_event,
-            model=model,
-            perturb=perturb,
-            nc=nc,
-            domains=weather_event.domains,
-            x=x,
-            n_ensemble=n_ensemble,
-            n_steps=config.simulation_length,
-            output_frequency=config.output_frequency,
-            batch_size=config.ensemble_batch_size,
-            rank=dist.rank,
-            date_obj=date_obj,
-            restart_frequency=config.restart_frequency,
-            output_path=output_path,
-            output_grid=(
-                earth2mip.grid.from_enum(config.output_grid)
-                if config.output_grid
-                else None
-            ),
-            progress=progress,
-        )
+    attrs = dict(
+        model=config.weather_model,
+        config=config.json(),
+        weather_event=weather_event.json(),
+        date_created=datetime.now().isoformat(),
+        history=" ".join(sys.argv),
+        institution="NVIDIA",
+        Conventions="CF-1.10",
+    )
+    kwargs = dict(
+        weather_event=weather_event,
+        model=model,
+        perturb=perturb,
+        domains=weather_event.domains,
+        x=x,
+        n_ensemble=n_ensemble,
+        n_steps=config.simulation_length,
+        output_frequency=config.output_frequency,
+        batch_size=config.ensemble_batch_size,
+        rank=dist.rank,
+        date_obj=date_obj,
+        restart_frequency=config.restart_frequency,
+        output_path=output_path,
+        output_grid=(
+            earth2mip.grid.from_enum(config.output_grid) if config.output_grid else None
+        ),
+        progress=progress,
+        ensemble_offset=group_rank * n_ensemble,
+    )
+
+    if config.output_format == OutputFormat.zarr:
+        # all ranks write their members to disjoint regions of one store
+        output_file_path = os.path.join(output_path, "ensemble_out.zarr")
+        n_ensemble_total = n_ensemble * dist.world_size
+        ensemble_chunk = config.output_chunks.get("ensemble", n_ensemble_total)
+        if dist.world_size > 1 and n_ensemble % ensemble_chunk != 0:
+            raise ValueError(
+                f"The ensemble chunk size {ensemble_chunk} must divide the "
+                f"{n_ensemble} ensemble members of each rank."
+            )
+
+        if group_rank == 0:
+            root = zarr.open_group(output_file_path, mode="w")
+            root.attrs.update(attrs)
+            output_steps = (
+                range(0, config.simulation_length + 1, config.output_frequency)
+                if config.output_frequency
+                else []
+            )
+            initialize_zarr(
+                root,
+                weather_event.domains,
+                kwargs["output_grid"] or model.grid,
+                n_ensemble=n_ensemble_total,
+                times=[date_obj + k * model.time_step for k in output_steps],
+                chunks=config.output_chunks,
+                compressor=get_compressor(
+                    config.output_compression, config.output_compression_level
+                ),
+            )
+        if torch.distributed.is_initialized():
+            torch.distributed.barrier(group)
+
+        root = zarr.open_group(output_file_path, mode="r+")
+        run_ensembles(nc=root, **kwargs)
+    else:
+        output_file_path = os.path.join(output_path, f"ensemble_out_{group_rank}.nc")
+        with DS(output_file_path, "w", format="NETCDF4") as nc:
+            # assign global attributes
+            nc.setncatts(attrs)
+            run_ensembles(nc=nc, **kwargs)
+
     if torch.distributed.is_initialized():
         torch.distributed.barrier(group)
 
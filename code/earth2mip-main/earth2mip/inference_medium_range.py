@@ -15,11 +15,16 @@
 # limitations under the License.
 
 import argparse
+import collections
+import concurrent.futures
 import datetime
+import itertools
 import logging
 import os
 import tempfile
-from typing import IO, List
+import threading
+import warnings
+from typing import IO, Callable, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 import pandas as pd
@@ -106,6 +111,177 @@ def flat_map(func, seq, *args):
         yield from func(x, *args)
 
 
+class VerificationCache:
+    """A thread-safe LRU cache of verification fields keyed by valid time
+
+    Neighbouring initial times verify against mostly the same valid times, so
+    sharing this cache between forecasts avoids reading each snapshot again for
+    every forecast that targets it. The fields are kept in host memory and the
+    least recently used are evicted to stay within ``max_bytes``.
+
+    Args:
+        max_bytes: the maximum size of the cached fields in bytes. If None, it
+            is set to ``min_fields`` times the size of the first field put.
+        min_fields: the number of fields the cache needs to hold to be useful,
+            e.g. the ``n + 1`` valid times of one forecast. A smaller
+            ``max_bytes`` warns when the first field is put.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, min_fields: int = 1):
+        self.max_bytes = max_bytes
+        self.min_fields = min_fields
+        self._checked = False
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "collections.OrderedDict[datetime.datetime, torch.Tensor]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, time: datetime.datetime) -> bool:
+        return time in self._data
+
+    def get(self, time: datetime.datetime) -> Optional[torch.Tensor]:
+        with self._lock:
+            data = self._data.get(time)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(time)
+            return data
+
+    def _check_budget(self, nbytes: int):
+        needed = self.min_fields * nbytes
+        if self.max_bytes is None:
+            self.max_bytes = needed
+            logger.info(
+                f"Sized the verification cache to {needed / 2**30:.2f} GiB, "
+                f"{self.min_fields} fields."
+            )
+        elif self.max_bytes < needed:
+            warnings.warn(
+                f"The verification cache of {self.max_bytes} bytes holds fewer "
+                f"than {self.min_fields} fields of {nbytes} bytes, so it will "
+                f"mostly miss. Increase it to at least {needed} bytes."
+            )
+
+    def put(self, time: datetime.datetime, data: torch.Tensor):
+        nbytes = data.element_size() * data.nelement()
+        with self._lock:
+            if not self._checked:
+                self._checked = True
+                self._check_budget(nbytes)
+            if nbytes > self.max_bytes:
+                return
+            if time in self._data:
+                self._data.move_to_end(time)
+                return
+            self._data[time] = data
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.nbytes -= evicted.element_size() * evicted.nelement()
+
+    def get_or_load(
+        self,
+        time: datetime.datetime,
+        load: Callable[[datetime.datetime], torch.Tensor],
+    ) -> torch.Tensor:
+        data = self.get(time)
+        if data is None:
+            data = load(time)
+            self.put(time, data)
+        return data
+
+
+class VerificationReader:
+    """Read verification fields ahead of the forecast
+
+    Iterating yields ``(time, data)`` for each of ``times`` in order, with
+    ``data`` a (batch, channel, lat, lon) tensor. The upcoming reads run on a
+    thread pool so that loading the data overlaps with the model stepping.
+
+    Args:
+        data_source: the source of the verification data
+        times: the full schedule of valid times to read
+        channel_names: the channels to read
+        grid: the grid to regrid the data to
+        device: the device to load the data to
+        lookahead: the number of reads to keep in flight ahead of the one
+            being consumed. 0 reads synchronously.
+        cache: if provided, fields are read through this cache, which can be
+            shared with other readers of the same data.
+    """
+
+    def __init__(
+        self,
+        data_source: initial_conditions.base.DataSource,
+        times: Sequence[datetime.datetime],
+        channel_names: List[str],
+        grid,
+        device,
+        lookahead: int = 2,
+        cache: Optional[VerificationCache] = None,
+    ):
+        self.data_source = data_source
+        self.times = times
+        self.channel_names = channel_names
+        self.grid = grid
+        self.device = device
+        self.lookahead = lookahead
+        self.cache = cache
+
+    def _read(self, time: datetime.datetime, device) -> torch.Tensor:
+        data = initial_conditions.get_data_from_source(
+            data_source=self.data_source,
+            time=time,
+            channel_names=self.channel_names,
+            grid=self.grid,
+            n_history_levels=1,
+            device=device,
+        )
+        # select first history level
+        return data[:, -1]
+
+    def _load(self, time: datetime.datetime) -> torch.Tensor:
+        if self.cache is None:
+            return self._read(time, self.device)
+        # the cache holds host copies
+        data = self.cache.get_or_load(time, lambda time: self._read(time, "cpu"))
+        return data.to(self.device)
+
+    def __iter__(self) -> Iterator[Tuple[datetime.datetime, torch.Tensor]]:
+        if self.lookahead == 0:
+            for time in self.times:
+                yield time, self._load(time)
+            return
+
+        times = iter(self.times)
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(self.lookahead) as pool:
+
+            def submit(time):
+                pending.append((time, pool.submit(self._load, time)))
+
+            for time in itertools.islice(times, self.lookahead):
+                submit(time)
+            try:
+                while pending:
+                    time, future = pending.popleft()
+                    for next_time in itertools.islice(times, 1):
+                        submit(next_time)
+                    yield time, future.result()
+            finally:
+                # stopped early, don't wait for reads that are no longer needed
+                for _, future in pending:
+                    future.cancel()
+
+
 def run_forecast(
     model: time_loop.TimeLoop,
     n,
@@ -114,6 +290,8 @@ def run_forecast(
     data_source: initial_conditions.base.DataSource,
     mean,
     f: IO[str],
+    lookahead: int = 2,
+    cache: Optional[VerificationCache] = None,
 ):
     mean = mean.squeeze()
     assert mean.ndim == 3  # noqa
@@ -133,6 +311,24 @@ def run_forecast(
     acc = ACC(mean, weight=weight_torch)
     metrics = [acc, RMSE(weight=weight_torch)]
 
+    # the verification for every lead time of every forecast is known up front
+    schedule = [
+        initial_time + k * model.time_step
+        for initial_time in initial_times
+        for k in range(n + 1)
+    ]
+    verification = iter(
+        VerificationReader(
+            data_source,
+            schedule,
+            channel_names=model.out_channel_names,
+            grid=model.grid,
+            device=model.device,
+            lookahead=lookahead,
+            cache=cache,
+        )
+    )
+
     def process(initial_time):
         logger.info(f"Running {initial_time}")
         x = initial_conditions.get_initial_condition_for_model(
@@ -148,16 +344,8 @@ def run_forecast(
 
             lead_time = valid_time - initial_time
             logger.debug(f"{valid_time}")
-            verification_torch = initial_conditions.get_data_from_source(
-                data_source=data_source,
-                time=valid_time,
-                channel_names=model.out_channel_names,
-                grid=model.grid,
-                n_history_levels=1,
-                device=model.device,
-            )
-            # select first history level
-            verification_torch = verification_torch[:, -1]
+            verification_time, verification_torch = next(verification)
+            assert verification_time == valid_time  # noqa
             for metric in metrics:
                 outputs = metric.call(verification_torch, data)
                 for name, tensor in zip(metric.output_names, outputs):
@@ -175,9 +363,21 @@ def run_forecast(
     for initial_time in initial_times:
         process(initial_time)
 
+    if cache is not None:
+        logger.info(
+            f"Verification cache: {cache.hits} hits, {cache.misses} misses, "
+            f"{cache.nbytes / 2**30:.2f} GiB"
+        )
+
 
 def score_deterministic(
-    model: time_loop.TimeLoop, n: int, initial_times, data_source, time_mean
+    model: time_loop.TimeLoop,
+    n: int,
+    initial_times,
+    data_source,
+    time_mean,
+    lookahead: int = 2,
+    cache_bytes: Optional[int] = 0,
 ) -> xr.Dataset:
     """Compute deterministic accs and rmses
 
@@ -189,6 +389,10 @@ def score_deterministic(
             condition and the scoring
         time_mean: a (channel, lat, lon) numpy array containing the time_mean.
             Used for ACC.
+        lookahead: the number of verification fields to read ahead of the
+            forecast. 0 reads them synchronously.
+        cache_bytes: the host memory budget for verification fields shared
+            between initial times, see :py:func:`save_scores`.
 
     Returns:
         metrics: an xarray dataset wtih this structure::
@@ -230,6 +434,8 @@ def score_deterministic(
             rank=rank,
             world_size=world_size,
             device=device,
+            lookahead=lookahead,
+            cache_bytes=cache_bytes,
         )
         series = earth2mip.forecast_metrics_io.read_metrics(tmpdir)
         return time_average_metrics(series)
@@ -261,6 +467,8 @@ def save_scores(
     rank: int = 0,
     world_size: int = 1,
     device: str = "cuda",
+    lookahead: int = 2,
+    cache_bytes: Optional[int] = 0,
 ) -> None:
     """Compute deterministic skill scores, saving the results the a csv file
 
@@ -281,12 +489,21 @@ def save_scores(
             condition and the scoring
         time_mean: a (channel, lat, lon) numpy array containing the time_mean.
             Used for ACC.
+        lookahead: the number of verification fields to read ahead of the
+            forecast. 0 reads them synchronously.
+        cache_bytes: the host memory budget for verification fields shared
+            between initial times. Each snapshot is read once if the budget
+            holds one forecast's ``n + 1`` valid times and the initial times
+            are in increasing order. None sizes the cache to exactly that
+            from the first field read, a smaller budget warns. The default 0
+            disables the cache, which can take several GB of host memory.
 
     Returns:
         metrics
 
     """
     local_initial_times = initial_times[rank::world_size]
+    cache = None if cache_bytes == 0 else VerificationCache(cache_bytes, n + 1)
     os.makedirs(output_directory, exist_ok=True)
     csv_path = os.path.join(output_directory, f"{rank}.csv")
     with open(csv_path, "a") as f:
@@ -298,6 +515,8 @@ def save_scores(
             data_source=data_source,
             mean=time_mean,
             f=f,
+            lookahead=lookahead,
+            cache=cache,
         )
 
 
@@ -324,6 +543,20 @@ def main():
     parser.add_argument(
         "--data", type=str, help="path to hdf5 root directory containing data.json"
     )
+    parser.add_argument(
+        "--lookahead",
+        type=int,
+        default=2,
+        help="number of verification fields to read ahead of the forecast",
+    )
+    parser.add_argument(
+        "--cache-gb",
+        type=float,
+        default=0,
+        help="host memory budget in GiB for verification fields shared between "
+        "initial times. It should hold the n + 1 valid times of one forecast. "
+        "0 disables the cache.",
+    )
 
     args = parser.parse_args()
     DistributedManager.initialize()
@@ -352,6 +585,8 @@ def main():
         rank=args.shard * args.n_shards + dist.rank,
         world_size=dist.world_size * args.n_shards,
         device=dist.device,
+        lookahead=args.lookahead,
+        cache_bytes=int(args.cache_gb * 2**30),
     )
 
 
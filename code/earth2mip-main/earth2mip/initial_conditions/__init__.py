@@ -21,7 +21,7 @@ import numpy as np
 import torch
 
 from earth2mip import config, regrid, schema, time_loop
-from earth2mip.initial_conditions import base, cds, gfs, hdf5, hrmip, ifs
+from earth2mip.initial_conditions import base, cds, gfs, hdf5, hrmip, ifs, memory
 
 __all__ = [
     "get_data_source",
@@ -30,6 +30,7 @@ __all__ = [
     "gfs",
     "hrmip",
     "hdf5",
+    "memory",
 ]
 
 
@@ -79,23 +80,52 @@ def get_data_from_source(
     Returns:
         (time_levels, c, lat, lon) shaped data
     """
+    # sources that can read a channel subset return it in the requested order,
+    # otherwise select the channels from everything the source returns
+    subset = isinstance(data_source, base.ChannelSubsetDataSource)
+    source_channels = channel_names if subset else data_source.channel_names
+
     dt = time_step
     arrays = []
     for i in range(n_history_levels - 1, -1, -1):
         time_to_get = time - i * dt
-        arr = data_source[time_to_get]
-        expected_shape = (len(data_source.channel_names), *data_source.grid.shape)
+        if subset:
+            arr = data_source.read(time_to_get, channel_names)
+        else:
+            arr = data_source[time_to_get]
+        expected_shape = (len(source_channels), *data_source.grid.shape)
         arrays.append(arr)
         if arr.shape != expected_shape:
             raise ValueError(time_to_get, arr.shape, expected_shape)
 
-    # stack the history
-    array = np.stack(arrays, axis=0)
-
-    index = [data_source.channel_names.index(c) for c in channel_names]
-    values = np.take(array, index, axis=1)
+    # zonally symmetric sources return broadcast views along lon, only expand
+    # them once the data is on the device
+    zonal = all(_is_broadcast_along_lon(arr) for arr in arrays)
+    if zonal:
+        arrays = [arr[..., :1] for arr in arrays]
+
+    index = [source_channels.index(c) for c in channel_names]
+    reorder = index != list(range(len(source_channels)))
+    if isinstance(arrays[0], torch.Tensor):
+        # tensors are stacked where they are, data already on the device never
+        # goes through the host. The stack also keeps the source unaliased.
+        values = torch.stack(arrays, dim=0)
+        if reorder:
+            values = values[:, index]
+        x = values.to(device=device, dtype=dtype)
+    else:
+        # stack the history, a single freshly read level needs no copy
+        if subset and len(arrays) == 1 and not zonal:
+            values = arrays[0][None]
+        else:
+            values = np.stack(arrays, axis=0)
+
+        if reorder:
+            values = np.take(values, index, axis=1)
+        x = torch.from_numpy(values).to(device).type(dtype)
     regridder = regrid.get_regridder(data_source.grid, grid).to(device)
-    x = torch.from_numpy(values).to(device).type(dtype)
+    if zonal:
+        x = x.expand(*x.shape[:-1], data_source.grid.shape[-1]).contiguous()
     # need a batch dimension of length 1
     # make an empty batch dim
     x = x[None]
@@ -103,6 +133,12 @@ def get_data_from_source(
     return x
 
 
+def _is_broadcast_along_lon(arr) -> bool:
+    if isinstance(arr, torch.Tensor):
+        return arr.stride(-1) == 0
+    return isinstance(arr, np.ndarray) and arr.strides[-1] == 0
+
+
 def get_initial_condition_for_model(
     time_loop: time_loop.TimeLoop, data_source: base.DataSource, time: datetime
 ) -> torch.Tensor:
@@ -15,7 +15,7 @@
 # limitations under the License.from typing import Protocol, List, runtime_checkable
 
 import datetime
-from typing import List, Protocol, runtime_checkable
+from typing import List, Optional, Protocol, Sequence, runtime_checkable
 
 import numpy as np
 
@@ -38,3 +38,32 @@ class DataSource(Protocol):
             data at ``time``. shape is (len(channel_names), *grid.shape)
         """
         pass
+
+
+@runtime_checkable
+class ChannelSubsetDataSource(DataSource, Protocol):
+    """A DataSource that can read a subset of its channels
+
+    Implementing ``read`` is optional. Sources that have it are used to read
+    only the channels a model needs.
+    """
+
+    def read(
+        self,
+        time: datetime.datetime,
+        channel_names: Optional[Sequence[str]] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+
+        Args:
+            time: the valid time to read.
+            channel_names: the channels to read, in the order they should be
+                returned. Defaults to :py:attr:`channel_names`.
+            out: an optional buffer of shape (len(channel_names), *grid.shape)
+                to read the data into.
+
+        Returns:
+            data at ``time``. shape is (len(channel_names), *grid.shape)
+        """
+        pass
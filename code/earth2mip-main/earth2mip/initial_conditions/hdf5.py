@@ -14,13 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
 import datetime
 import json
 import logging
 import os
+import threading
 import warnings
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import h5py
 import numpy as np
 import s3fs
 import xarray
@@ -35,7 +38,7 @@ logger = logging.getLogger(__name__)
 # TODO move to earth2mip/datasets/era5?
 
 
-class DataSource(base.DataSource):
+class DataSource(base.ChannelSubsetDataSource):
     """HDF5 Data Sources
 
     Works with a directory structure like this::
@@ -52,11 +55,18 @@ class DataSource(base.DataSource):
         coords.lat - list of lats
         coords.lon - list of lons
         dhours - timestep in hours (default 6 hours)
+        zonal - if true, the data is zonally symmetric and stored without a lon
+            dimension (``dims`` ends with ``lat``). It is broadcast along lon
+            when read (default false)
 
     """
 
     def __init__(
-        self, root: str, metadata: Any, channel_names: Optional[List[str]] = None
+        self,
+        root: str,
+        metadata: Any,
+        channel_names: Optional[List[str]] = None,
+        max_open_files: int = 4,
     ):
         """
 
@@ -65,6 +75,8 @@ class DataSource(base.DataSource):
             metadata: Metadata about the HDF5 data.
             channel_names: If provided, only get these channel names.
                 Defaults to all channels in the data.
+            max_open_files: The number of HDF5 files to keep open. The least
+                recently used file is closed when more are needed.
         """
         self.root = root
         self.metadata = metadata
@@ -74,6 +86,17 @@ class DataSource(base.DataSource):
             self._channel_names = [
                 c for c in metadata["coords"]["channel"] if c in channel_names
             ]
+        # contiguous channel runs, keyed by the requested channel order
+        self._runs: Dict[Tuple[str, ...], List[Tuple[int, int, int]]] = {}
+        self._time_step = datetime.timedelta(hours=metadata.get("dhours", 6))
+
+        # the files are indexed once, and kept open in an LRU pool
+        self._files = _get_index(root)
+        self.max_open_files = max_open_files
+        self._handles: "collections.OrderedDict[str, h5py.File]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
 
     @classmethod
     def from_path(cls, root: str, **kwargs: Any) -> "DataSource":
@@ -99,27 +122,121 @@ class DataSource(base.DataSource):
         time_mean_path = filesystem.download_cached(time_mean_path)
         return np.load(time_mean_path)
 
-    def __getitem__(self, time: datetime.datetime) -> np.ndarray:
-        path = _get_path(self.root, time)
+    def _open(self, path: str) -> h5py.File:
+        # must be called with self._lock held
+        if path in self._handles:
+            self._handles.move_to_end(path)
+            return self._handles[path]
+
+        logger.debug(f"Opening {path}.")
         if path.startswith("s3://"):
             fs = s3fs.S3FileSystem(
                 client_kwargs=dict(endpoint_url="https://pbss.s8k.io")
             )
-            f = fs.open(path)
+            f = h5py.File(fs.open(path), "r")
         else:
-            f = None
+            f = h5py.File(path, "r")
+
+        self._handles[path] = f
+        while len(self._handles) > self.max_open_files:
+            _, evicted = self._handles.popitem(last=False)
+            evicted.close()
+        return f
+
+    def close(self):
+        with self._lock:
+            while self._handles:
+                _, f = self._handles.popitem()
+                f.close()
+
+    def _get_runs(self, channel_names: Sequence[str]) -> List[Tuple[int, int, int]]:
+        key = tuple(channel_names)
+        if key not in self._runs:
+            missing = [c for c in channel_names if c not in self._channel_names]
+            if missing:
+                raise ValueError(f"Channels {missing} not in {self._channel_names}.")
+            all_channels = self.metadata["coords"]["channel"]
+            index = [all_channels.index(c) for c in channel_names]
+            self._runs[key] = _contiguous_runs(index)
+        return self._runs[key]
+
+    def read(
+        self,
+        time: datetime.datetime,
+        channel_names: Optional[Sequence[str]] = None,
+        out: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Read ``channel_names`` at ``time`` in the requested order
+
+        Each run of channels that is contiguous in the file is read with a
+        single hyperslab selection directly into ``out``.
+
+        Args:
+            time: the valid time to read.
+            channel_names: the channels to read, in the order they should be
+                returned. Defaults to :py:attr:`channel_names`.
+            out: an optional C-contiguous buffer of shape (channel, lat, lon),
+                or (channel, lat) for zonal data, e.g. a view of pinned memory.
+                Allocated if not given.
+
+        Returns:
+            (channel, lat, lon) shaped data
 
-        logger.debug(f"Opening {path} for {time}.")
-        ds = era5.open_hdf5(path=path, f=f, metadata=self.metadata)
-        subset = ds.sel(time=time, channel=self._channel_names)
-        return subset.values
+        """
+        if channel_names is None:
+            channel_names = self._channel_names
+        runs = self._get_runs(channel_names)
+
+        path = self._files[time.strftime("%Y.h5")]
+        year = era5.time.filename_to_year(path)
+        i, remainder = divmod(time - datetime.datetime(year, 1, 1), self._time_step)
+        if remainder:
+            raise KeyError(time)
+
+        with self._lock:
+            array = self._open(path)[self.metadata["h5_path"]]
+            if not 0 <= i < array.shape[0]:
+                raise KeyError(time)
+            shape = (len(channel_names), *array.shape[2:])
+            if out is None:
+                out = np.empty(shape, dtype=array.dtype)
+            elif out.shape != shape:
+                raise ValueError(out.shape, shape)
+            for dest, source, n in runs:
+                array.read_direct(
+                    out, np.s_[i, source : source + n], np.s_[dest : dest + n]
+                )
+
+        if self.metadata.get("zonal", False):
+            # zero-copy view, every longitude shares the stored (channel, lat) values
+            nlon = len(self.metadata["coords"]["lon"])
+            return np.broadcast_to(out[..., None], (*out.shape, nlon))
+        return out
+
+    def __getitem__(self, time: datetime.datetime) -> np.ndarray:
+        return self.read(time)
+
+
+def _contiguous_runs(index: Sequence[int]) -> List[Tuple[int, int, int]]:
+    """Group ``index`` into (destination start, source start, length) runs"""
+    runs = []
+    for dest, source in enumerate(index):
+        if runs and runs[-1][1] + runs[-1][2] == source:
+            start, run_source, n = runs[-1]
+            runs[-1] = (start, run_source, n + 1)
+        else:
+            runs.append((dest, source, 1))
+    return runs
+
+
+def _get_index(path: str) -> Dict[str, str]:
+    h5_files = filesystem.glob(os.path.join(path, "**/*.h5"), maxdepth=2)
+    return {os.path.basename(f): f for f in h5_files}
 
 
 def _get_path(path: str, time) -> str:
     filename = time.strftime("%Y.h5")
-    h5_files = filesystem.glob(os.path.join(path, "**/*.h5"), maxdepth=2)
-    files = {os.path.basename(f): f for f in h5_files}
-    return files[filename]
+    return _get_index(path)[filename]
 
 
 def open_xarray(time: datetime.datetime) -> xarray.DataArray:
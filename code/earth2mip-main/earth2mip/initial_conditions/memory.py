@@ -0,0 +1,96 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+from typing import List, Union
+
+import numpy as np
+import torch
+
+from earth2mip import grid
+from earth2mip.initial_conditions import base
+
+__all__ = ["DataSource"]
+
+
+class DataSource(base.DataSource):
+    """In-memory Data Source
+
+    Serves initial conditions that are already in memory, such as the output of
+    the idealized IC preprocessing, without an HDF5 round trip.
+
+    The leading dimension of ``data`` is time: ``data[i]`` is valid at
+    ``start_time + i * time_step``. With the defaults this is the same
+    member-to-time layout as an ``1970.h5`` file read by
+    :py:class:`earth2mip.initial_conditions.hdf5.DataSource`.
+
+    ``data`` can also be zonally symmetric with shape (time, channel, lat), in
+    which case it is broadcast along lon without a copy.
+
+    A tensor ``data`` is kept where it is and served as tensors, so data that
+    already lives on the device of the model is not copied through the host.
+
+    """
+
+    def __init__(
+        self,
+        data: Union[np.ndarray, torch.Tensor],
+        channel_names: List[str],
+        grid: grid.LatLonGrid,
+        start_time: datetime.datetime = datetime.datetime(1970, 1, 1),
+        time_step: datetime.timedelta = datetime.timedelta(hours=6),
+    ):
+        """
+
+        Args:
+            data: (time, channel, lat, lon) or (time, channel, lat) shaped data.
+                Tensors are not copied.
+            channel_names: the names of the channels in ``data``.
+            grid: the grid of ``data``.
+            start_time: the time of ``data[0]``.
+            time_step: the time between consecutive entries of ``data``.
+        """
+        expected_shape = (len(channel_names), *grid.shape)
+        if tuple(data.shape[1:]) not in [expected_shape, expected_shape[:-1]]:
+            raise ValueError(data.shape, expected_shape)
+
+        self._data = data
+        self._channel_names = list(channel_names)
+        self.grid = grid
+        self.start_time = start_time
+        self.time_step = time_step
+
+    @property
+    def channel_names(self) -> List[str]:
+        return self._channel_names
+
+    @property
+    def times(self) -> List[datetime.datetime]:
+        return [self.start_time + i * self.time_step for i in range(len(self._data))]
+
+    def __getitem__(self, time: datetime.datetime) -> Union[np.ndarray, torch.Tensor]:
+        i, remainder = divmod(time - self.start_time, self.time_step)
+        if remainder or not 0 <= i < len(self._data):
+            raise KeyError(time)
+
+        array = self._data[i]
+        if array.ndim == 2:
+            # zero-copy view, every longitude shares the stored (channel, lat) values
+            shape = (*array.shape, self.grid.shape[-1])
+            if isinstance(array, torch.Tensor):
+                return array[..., None].expand(shape)
+            return np.broadcast_to(array[..., None], shape)
+        return array
@@ -16,18 +16,26 @@
 
 """Routines to save domains to a netCDF file
 """
-from typing import Iterable, List
+from typing import Iterable, List, Optional
 
+import cftime
 import numpy as np
 import torch
 import xarray as xr
 
 import earth2mip.grid
 from earth2mip import geometry
+from earth2mip._writer import AsyncWriter
 from earth2mip.diagnostics import Diagnostics, DiagnosticTypes
 from earth2mip.weather_events import Domain
 
-__all__ = ["initialize_netcdf", "update_netcdf"]
+__all__ = [
+    "initialize_netcdf",
+    "update_netcdf",
+    "select_netcdf",
+    "write_netcdf",
+    "AsyncNetCDFWriter",
+]
 
 
 def _assign_lat_attributes(nc_variable):
@@ -107,8 +115,21 @@ def init_dimensions(domain: Domain, group, grid: earth2mip.grid.LatLonGrid):
 
 
 def initialize_netcdf(
-    nc, domains: Iterable[Domain], grid: earth2mip.grid.LatLonGrid, n_ensemble, device
+    nc,
+    domains: Iterable[Domain],
+    grid: earth2mip.grid.LatLonGrid,
+    n_ensemble,
+    device,
+    channel_names_of_data: Optional[List[str]] = None,
 ) -> List[List[Diagnostics]]:
+    """Create the netCDF groups and variables of ``domains``
+
+    Args:
+        grid: the grid of the data passed to :py:func:`update_netcdf`
+        channel_names_of_data: the channels of the data passed to
+            :py:func:`update_netcdf`. If given, the index of each diagnostic's
+            channels is computed here rather than at the first update.
+    """
     nc.createVLType(str, "vls")
     nc.createDimension("time", None)
     nc.createDimension("ensemble", n_ensemble)
@@ -122,8 +143,10 @@ def initialize_netcdf(
             lat = np.array(grid.lat)
             lon = np.array(grid.lon)
             diagnostic = DiagnosticTypes[d.type](
-                group, domain, grid, d, lat, lon, device
+                group, domain, grid, d, lat, lon, device, n_ensemble=n_ensemble
             )
+            if channel_names_of_data is not None:
+                diagnostic.set_channels(channel_names_of_data)
             diagnostics.append(diagnostic)
 
         total_diagnostics.append(diagnostics)
@@ -139,19 +162,91 @@ def update_netcdf(
     grid: earth2mip.grid.LatLonGrid,
     channel_names_of_data: List[str],
 ):
+    """Save the (batch, channel, lat, lon) ``data`` of one output step
+
+    The domain and channels of each diagnostic are gathered and reduced on the
+    device, then copied to the host once. ``grid`` is unused, the domains are
+    selected from the grid given to :py:func:`initialize_netcdf`.
+    """
     assert len(total_diagnostics) == len(domains), (total_diagnostics, domains)  # noqa
-    lat = np.array(grid.lat)
-    lon = np.array(grid.lon)
+    outputs = select_netcdf(
+        data, total_diagnostics, channel_names_of_data, batch_id, time_count
+    )
+    write_netcdf(outputs, total_diagnostics, batch_id, time_count)
 
-    batch_size = geometry.get_batch_size(data)
-    for d_index, domain in enumerate(domains):
-        lat, lon, regional_data = geometry.select_space(data, lat, lon, domain)
 
-        domain_diagnostics = total_diagnostics[d_index]
+def select_netcdf(
+    data: torch.Tensor,
+    total_diagnostics: List[List[Diagnostics]],
+    channel_names_of_data: List[str],
+    batch_id,
+    time_count,
+) -> List[Optional[torch.Tensor]]:
+    """Gather and reduce the output of each diagnostic on its device
+
+    The output of a diagnostic is None if it has nothing to write for this
+    batch, e.g. a statistic still waiting for more ensemble members.
+    """
+    outputs = []
+    batch_size = geometry.get_batch_size(data)
+    for domain_diagnostics in total_diagnostics:
         for diagnostic in domain_diagnostics:
-            index = [
-                channel_names_of_data.index(c) for c in diagnostic.diagnostic.channels
-            ]
-            output = data[:, index]
+            if diagnostic.channel_index is None:
+                diagnostic.set_channels(channel_names_of_data)
+            output = diagnostic.select(data)
+            outputs.append(diagnostic.reduce(output, time_count, batch_id, batch_size))
+    return outputs
+
+
+def write_netcdf(
+    outputs: List[torch.Tensor],
+    total_diagnostics: List[List[Diagnostics]],
+    batch_id,
+    time_count,
+):
+    """Write the outputs of :py:func:`select_netcdf`"""
+    diagnostics = [
+        d for domain_diagnostics in total_diagnostics for d in domain_diagnostics
+    ]
+    for diagnostic, output in zip(diagnostics, outputs):
+        if output is not None:
+            batch_size = geometry.get_batch_size(output)
             diagnostic.update(output, time_count, batch_id, batch_size)
-    return
+
+
+class AsyncNetCDFWriter(AsyncWriter):
+    """Write the diagnostics of each output step on a background thread
+
+    See :py:class:`earth2mip._writer.AsyncWriter`. The netCDF file must not be
+    accessed by other threads until :py:meth:`close` returns, since netCDF4 is
+    not thread-safe.
+    """
+
+    def __init__(
+        self,
+        nc,
+        total_diagnostics: List[List[Diagnostics]],
+        domains: List[Domain],
+        grid: earth2mip.grid.LatLonGrid,
+        channel_names_of_data: List[str],
+        max_queue: int = 2,
+    ):
+        self.nc = nc
+        self.total_diagnostics = total_diagnostics
+        self.domains = domains
+        self.grid = grid
+        self.channel_names_of_data = channel_names_of_data
+        super().__init__(max_queue)
+
+    def _select(self, data, batch_id, time_count):
+        return select_netcdf(
+            data,
+            self.total_diagnostics,
+            self.channel_names_of_data,
+            batch_id,
+            time_count,
+        )
+
+    def _write_step(self, data, batch_id, time_count, time):
+        self.nc["time"][time_count] = cftime.date2num(time, self.nc["time"].units)
+        write_netcdf(data, self.total_diagnostics, batch_id, time_count)
@@ -22,7 +22,6 @@ from typing import Any, Callable, Iterator, Optional, Tuple
 
 import numpy as np
 import torch
-from modulus.utils.zenith_angle import cos_zenith_angle
 
 import earth2mip.grid
 from earth2mip import (
@@ -34,6 +33,7 @@ from earth2mip import (
     time_loop,
 )
 from earth2mip.loaders import LoaderProtocol
+from earth2mip.zenith_angle import CosZenith
 
 if sys.version_info < (3, 10):
     from importlib_metadata import EntryPoint, entry_points
@@ -83,14 +83,13 @@ class CosZenWrapper(torch.nn.Module):
         self.model = model
         self.lon = lon
         self.lat = lat
+        self.cos_zenith = CosZenith(np.asarray(lat)[:, None], np.asarray(lon)[None, :])
 
     def forward(self, x, time):
-        lon_grid, lat_grid = np.meshgrid(self.lon, self.lat)
-        cosz = cos_zenith_angle(time, lon_grid, lat_grid)
-        cosz = cosz.astype(np.float32)
-        z = torch.from_numpy(cosz).to(device=x.device)
+        z = self.cos_zenith(time).to(device=x.device, dtype=x.dtype)
         # assume no history
-        x = torch.cat([x, z[None, None]], dim=1)
+        z = z.expand(x.shape[0], 1, *z.shape)
+        x = torch.cat([x, z], dim=1)
         return self.model(x)
 
 
@@ -119,6 +118,8 @@ class _SimpleModelAdapter(torch.nn.Module):
 
 
 class Inference(torch.nn.Module, time_loop.TimeLoop):
+    supports_lazy_output = True
+
     def __init__(
         self,
         model,
@@ -193,6 +194,7 @@ class Inference(torch.nn.Module, time_loop.TimeLoop):
         x: torch.Tensor,
         restart: Optional[Any] = None,
         normalize=True,
+        lazy: bool = False,
     ) -> Iterator[Tuple[datetime.datetime, torch.Tensor, Any]]:
         """
         Args:
@@ -202,6 +204,8 @@ class Inference(torch.nn.Module, time_loop.TimeLoop):
             time: the datetime to start with
             restart: if provided this restart information (typically some torch
                 Tensor) can be used to restart the time loop
+            lazy: if True yield a :py:class:`earth2mip.time_loop.LazyOutput`
+                in place of ``output``, which is only denormalized if used
 
         Yields:
             (time, output, restart) tuples. ``output`` is a tensor with
@@ -210,15 +214,80 @@ class Inference(torch.nn.Module, time_loop.TimeLoop):
                 loop.
         """
         if restart:
-            yield from self._iterate(**restart)
+            yield from self._iterate(**restart, lazy=lazy)
         else:
-            yield from self._iterate(x=x, time=time)
+            yield from self._iterate(x=x, time=time, lazy=lazy)
+
+    def step(self, x: torch.Tensor, time: datetime.datetime) -> torch.Tensor:
+        """Advance the normalized state ``x`` valid at ``time`` by one time step
+
+        Args:
+            x: a normalized (B, n_history_levels, len(in_channel_names), Y, X)
+                state, as in the ``restart`` of :py:meth:`__call__`
+
+        Returns:
+            the normalized state at ``time + time_step``
+        """
+        if self.source:
+            x_with_units = x * self.scale + self.center
+            dt = torch.tensor(self.time_step.total_seconds())
+            x = x + self.source(x_with_units, time) / self.scale * dt
+        return self.model(x, time)
 
-    def _iterate(self, x, normalize=True, time=None):
+    def rollout(
+        self,
+        x: torch.Tensor,
+        time: datetime.datetime,
+        n_steps: int,
+        save_every: int = 1,
+        out: Optional[torch.Tensor] = None,
+        normalize: bool = True,
+    ) -> torch.Tensor:
+        """Run ``n_steps`` time steps in a loop and return the saved outputs
+
+        Unlike :py:meth:`__call__` there is no generator or restart data, and
+        only the saved steps are denormalized, straight into ``out``. See
+        :py:meth:`earth2mip.time_loop.TimeLoop.rollout` for the arguments.
+        """
+        n_saved = time_loop._check_rollout(n_steps, save_every)
+        if self.time_dependent and not time:
+            raise ValueError("Time dependent models require ``time``.")
+        time = time or datetime.datetime(1900, 1, 1)
+
+        with torch.no_grad():
+            if normalize:
+                x = (x - self.center) / self.scale
+            output = time_loop.LazyOutput(x, self.scale, self.center)
+            if out is None:
+                out = torch.empty(
+                    (n_saved,) + output.shape, dtype=output.dtype, device=x.device
+                )
+
+            def save(i, x):
+                output = time_loop.LazyOutput(x, self.scale, self.center)
+                if out.device == x.device:
+                    output.materialize(out=out[i])
+                else:
+                    out[i].copy_(output.materialize())
+
+            save(0, x)
+            for k in range(1, n_steps + 1):
+                x = self.step(x, time)
+                time = time + self.time_step
+                if k % save_every == 0:
+                    save(k // save_every, x)
+        return out
+
+    def _iterate(self, x, normalize=True, time=None, lazy=False):
         """Yield (time, unnormalized data, restart) tuples
 
         restart = (time, unnormalized data)
         """
+
+        def output(x):
+            out = time_loop.LazyOutput(x, self.scale, self.center)
+            return out if lazy else out.materialize()
+
         if self.time_dependent and not time:
             raise ValueError("Time dependent models require ``time``.")
         time = time or datetime.datetime(1900, 1, 1)
@@ -234,20 +303,15 @@ class Inference(torch.nn.Module, time_loop.TimeLoop):
 
             # yield initial time for convenience
             restart = dict(x=x, normalize=False, time=time)
-            yield time, self.scale * x[:, -1] + self.center, restart
+            yield time, output(x), restart
 
             while True:
-                if self.source:
-                    x_with_units = x * self.scale + self.center
-                    dt = torch.tensor(self.time_step.total_seconds())
-                    x += self.source(x_with_units, time) / self.scale * dt
-                x = self.model(x, time)
+                x = self.step(x, time)
                 time = time + self.time_step
 
                 # create args and kwargs for future use
                 restart = dict(x=x, normalize=False, time=time)
-                out = self.scale * x[:, -1] + self.center
-                yield time, out, restart
+                yield time, output(x), restart
 
 
 def _default_inference(package, metadata: schema.Model, device):
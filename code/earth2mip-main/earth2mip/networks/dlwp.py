@@ -22,9 +22,9 @@ import numpy as np
 import torch
 import xarray
 from modulus.utils.filesystem import Package
-from modulus.utils.zenith_angle import cos_zenith_angle
 
 import earth2mip.grid
+from earth2mip.zenith_angle import CosZenith
 
 logger = logging.getLogger(__file__)
 
@@ -138,6 +138,7 @@ class _DLWPWrapper(torch.nn.Module):
         self.lsm = lsm
         self.longrid = longrid
         self.latgrid = latgrid
+        self.cos_zenith = CosZenith(latgrid, longrid)
         self.topographic_height = topographic_height
 
         # load map weights
@@ -163,28 +164,20 @@ class _DLWPWrapper(torch.nn.Module):
         input_list = list(torch.split(input, 1, dim=1))
         input_list = [tensor.squeeze(1) for tensor in input_list]
         repeat_vals = (input.shape[0], -1, -1, -1, -1)  # repeat along batch dimension
+        times = [
+            time
+            - datetime.timedelta(hours=6 * (t - 1))
+            + datetime.timedelta(hours=6 * i)
+            for i in range(len(input_list))
+        ]
+        # subtract mean value
+        tisr = torch.clamp(self.cos_zenith(times), min=0) - 1 / np.pi
+        tisr = tisr.to(device=device, dtype=dtype)
         for i in range(len(input_list)):
-            tisr = np.maximum(
-                cos_zenith_angle(
-                    time
-                    - datetime.timedelta(hours=6 * (t - 1))
-                    + datetime.timedelta(hours=6 * i),
-                    self.longrid,
-                    self.latgrid,
-                ),
-                0,
-            ) - (
-                1 / np.pi
-            )  # subtract mean value
-            tisr = (
-                torch.tensor(tisr, dtype=dtype)
-                .to(device)
-                .unsqueeze(dim=0)
-                .unsqueeze(dim=0)
-            )  # add channel and batch size dimension
-            tisr = tisr.expand(*repeat_vals)  # TODO - find better way to batch TISR
+            # add channel and batch size dimension
+            tisr_i = tisr[i][None, None].expand(*repeat_vals)
             input_list[i] = torch.cat(
-                (input_list[i], tisr), dim=1
+                (input_list[i], tisr_i), dim=1
             )  # concat along channel dim
 
         input_model = torch.cat(
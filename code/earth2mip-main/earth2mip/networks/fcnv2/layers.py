@@ -324,8 +324,6 @@ class SpectralConv2d(nn.Module):
             x = x.to(dtype)
 
         # do spectral conv
-        modes = torch.zeros(x.shape, device=x.device)
-
         # modes[:, :, :self.modes_lat,  :self.modes_lon, :] = self.contract_handle(x[:, :, :self.modes_lat,  :self.modes_lon, :], self.wh)
         # modes[:, :, -self.modes_lat:, :self.modes_lon, :] = self.contract_handle(x[:, :, -self.modes_lat:, :self.modes_lon, :], self.wl)
         modes = self.contract_handle(x, self.w)
@@ -348,7 +346,12 @@ class SpectralConv2d(nn.Module):
 
 class SpectralConvS2(nn.Module):
     """
-    Spectral Convolution as utilized in
+    Spectral Convolution as utilized in the spherical Fourier neural operator.
+
+    With ``work_buffers=True`` inference reuses the mode plane across calls
+    instead of allocating and zero filling it every time. The retained modes
+    are gathered from and scattered to the plane with a single
+    ``index_select`` and ``index_copy_``.
     """
 
     def __init__(
@@ -361,6 +364,7 @@ class SpectralConvS2(nn.Module):
         compression=None,
         rank=128,
         bias=False,
+        work_buffers=False,
     ):
         super(SpectralConvS2, self).__init__()
 
@@ -382,6 +386,13 @@ class SpectralConvS2(nn.Module):
         self.register_buffer("ii", ii)
         self.register_buffer("jj", jj)
 
+        # the retained modes as offsets into the flattened (l, m) plane. Row l
+        # only keeps m <= l, so they are gathered and scattered by index
+        self.work_buffers = work_buffers
+        offsets = ii * self.modes_lon + jj
+        self.register_buffer("offsets", offsets, persistent=False)
+        self._buffers_by_shape = {}
+
         if compression == "tt":
             self.rank = rank
             # tensortrain coefficients
@@ -420,13 +431,16 @@ class SpectralConvS2(nn.Module):
             x = x.to(dtype)
 
         # do spectral conv
-        modes = torch.zeros(x.shape, device=x.device)
-        modes[:, :, self.ii, self.jj, :] = self.contract_handle(
-            x[:, :, self.ii, self.jj, :], self.w
-        )
+        if self.work_buffers and not torch.is_grad_enabled():
+            x = self._filter_with_work_buffers(x)
+        else:
+            modes = torch.zeros(x.shape, device=x.device)
+            modes[:, :, self.ii, self.jj, :] = self.contract_handle(
+                x[:, :, self.ii, self.jj, :], self.w
+            )
 
-        # finalize
-        x = F.softshrink(modes, lambd=self.sparsity_threshold)
+            # finalize
+            x = F.softshrink(modes, lambd=self.sparsity_threshold)
 
         with amp.autocast(enabled=False):
             x = x.to(torch.float32)
@@ -439,6 +453,39 @@ class SpectralConvS2(nn.Module):
 
         return x
 
+    def _get_work_buffers(self, x):
+        """The gathered modes and the mode plane for inputs like ``x``
+
+        The modes that are not retained are zeroed when the plane is
+        allocated and never written afterwards, so later calls skip the fill.
+        """
+        key = (x.shape, x.dtype, x.device)
+        if key not in self._buffers_by_shape:
+            B, C, L, M, _ = x.shape
+            retained = x.new_empty(B, C, len(self.offsets), 2)
+            if len(self.offsets) == L * M:
+                modes = x.new_empty(x.shape)
+            else:
+                modes = x.new_zeros(x.shape)
+            # only keep the buffers of the latest shape
+            self._buffers_by_shape = {key: (retained, modes)}
+        return self._buffers_by_shape[key]
+
+    def _filter_with_work_buffers(self, x):
+        """The spectral conv of the SHT coefficients ``x`` without allocating
+        the mode plane. Only for inference, the buffers are overwritten by the
+        next call."""
+        retained, modes = self._get_work_buffers(x)
+        torch.index_select(x.flatten(2, 3), 2, self.offsets, out=retained)
+
+        y = self.contract_handle(retained, self.w)
+        if self.sparsity_threshold != 0:
+            # softshrink leaves the zero modes zero
+            y = F.softshrink(y, lambd=self.sparsity_threshold)
+
+        modes.flatten(2, 3).index_copy_(2, self.offsets, y)
+        return modes
+
 
 class SpectralAttention2d(nn.Module):
     """
@@ -21,6 +21,8 @@ import torch.nn as nn
 import torch_harmonics as harmonics
 from apex.normalization import FusedLayerNorm
 
+from earth2mip import sht
+
 # helpers
 # to fake the sht module with ffts
 from earth2mip.networks.fcnv2.layers import (
@@ -52,6 +54,7 @@ class SpectralFilterLayer(nn.Module):
         complex_activation="real",
         spectral_layers=1,
         drop_rate=0.0,
+        work_buffers=False,
     ):
         super(SpectralFilterLayer, self).__init__()
 
@@ -99,6 +102,7 @@ class SpectralFilterLayer(nn.Module):
                 compression=compression,
                 rank=rank,
                 bias=False,
+                work_buffers=work_buffers,
             )
 
         elif filter_type == "linear" and isinstance(forward_transform, RealFFT2):
@@ -145,6 +149,7 @@ class FourierNeuralOperatorBlock(nn.Module):
         complex_activation="real",
         spectral_layers=1,
         checkpointing=False,
+        work_buffers=False,
     ):
         super(FourierNeuralOperatorBlock, self).__init__()
 
@@ -166,6 +171,7 @@ class FourierNeuralOperatorBlock(nn.Module):
             complex_activation=complex_activation,
             spectral_layers=spectral_layers,
             drop_rate=drop_rate,
+            work_buffers=work_buffers,
         )
 
         if inner_skip == "linear":
@@ -277,6 +283,8 @@ class FourierNeuralOperatorNet(nn.Module):
         spectral_layers=3,
         laplace_weighting=False,
         checkpointing=False,
+        work_buffers=False,
+        device=None,
     ):
         super(FourierNeuralOperatorNet, self).__init__()
 
@@ -347,6 +355,9 @@ class FourierNeuralOperatorNet(nn.Module):
         self.checkpointing = (
             params.checkpointing if hasattr(params, "checkpointing") else checkpointing
         )
+        self.work_buffers = (
+            params.work_buffers if hasattr(params, "work_buffers") else work_buffers
+        )
 
         # compute downsampled image size
         self.h = self.img_size[0] // self.scale_factor
@@ -412,25 +423,45 @@ class FourierNeuralOperatorNet(nn.Module):
         modes_lon = int((self.w // 2 + 1) * self.hard_thresholding_fraction)
 
         if self.spectral_transform == "sht":
-            self.trans_down = harmonics.RealSHT(
-                *self.img_size, lmax=modes_lat, mmax=modes_lon, grid="equiangular"
-            ).float()
-            self.itrans_up = harmonics.InverseRealSHT(
-                *self.img_size, lmax=modes_lat, mmax=modes_lon, grid="equiangular"
-            ).float()
-            self.trans = harmonics.RealSHT(
-                self.h, self.w, lmax=modes_lat, mmax=modes_lon, grid="legendre-gauss"
-            ).float()
-            self.itrans = harmonics.InverseRealSHT(
-                self.h, self.w, lmax=modes_lat, mmax=modes_lon, grid="legendre-gauss"
-            ).float()
-
+            # the transforms share their Legendre tables with other instances.
+            # They are built on ``device`` so moving the model there keeps the
+            # shared tables instead of copying them.
             # we introduce some ad-hoc rescaling of the weights to aid gradient computation:
             sht_rescaling_factor = 1e5
-            self.trans_down.weights = self.trans_down.weights * sht_rescaling_factor
-            self.itrans_up.pct = self.itrans_up.pct / sht_rescaling_factor
-            self.trans.weights = self.trans.weights * sht_rescaling_factor
-            self.itrans.pct = self.itrans.pct / sht_rescaling_factor
+            self.trans_down = sht.get_sht(
+                *self.img_size,
+                lmax=modes_lat,
+                mmax=modes_lon,
+                grid="equiangular",
+                scale=sht_rescaling_factor,
+                device=device,
+            )
+            self.itrans_up = sht.get_inverse_sht(
+                *self.img_size,
+                lmax=modes_lat,
+                mmax=modes_lon,
+                grid="equiangular",
+                scale=sht_rescaling_factor,
+                device=device,
+            )
+            self.trans = sht.get_sht(
+                self.h,
+                self.w,
+                lmax=modes_lat,
+                mmax=modes_lon,
+                grid="legendre-gauss",
+                scale=sht_rescaling_factor,
+                device=device,
+            )
+            self.itrans = sht.get_inverse_sht(
+                self.h,
+                self.w,
+                lmax=modes_lat,
+                mmax=modes_lon,
+                grid="legendre-gauss",
+                scale=sht_rescaling_factor,
+                device=device,
+            )
 
         elif self.spectral_transform == "fft":
             self.trans_down = RealFFT2(
@@ -487,6 +518,7 @@ class FourierNeuralOperatorNet(nn.Module):
                 complex_activation=self.complex_activation,
                 spectral_layers=self.spectral_layers,
                 checkpointing=self.checkpointing,
+                work_buffers=self.work_buffers,
             )
 
             self.blocks.append(block)
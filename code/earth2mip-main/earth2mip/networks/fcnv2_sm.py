@@ -136,7 +136,7 @@ def _fix_state_dict_keys(state_dict, add_module=False):
     return fixed_state_dict
 
 
-def load(package, *, pretrained=True, device="cuda"):
+def load(package, *, pretrained=True, device="cuda", work_buffers=False):
     assert pretrained  # noqa
 
     config_path = pathlib.Path(__file__).parent / "fcnv2" / "sfnonet.yaml"
@@ -146,7 +146,9 @@ def load(package, *, pretrained=True, device="cuda"):
     params.N_in_channels = 73
     params.N_out_channels = 73
 
-    core_model = fcnv2.FourierNeuralOperatorNet(params).to(device)
+    core_model = fcnv2.FourierNeuralOperatorNet(
+        params, device=device, work_buffers=work_buffers
+    ).to(device)
 
     local_center = np.load(package.get("global_means.npy"))
     local_std = np.load(package.get("global_stds.npy"))
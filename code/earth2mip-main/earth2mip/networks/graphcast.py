@@ -24,7 +24,7 @@ __all__ = ["load_time_loop", "load_time_loop_operational", "load_time_loop_small
 
 
 import datetime
-import warnings
+from typing import Optional
 
 import haiku as hk
 import jax
@@ -45,11 +45,11 @@ from graphcast import (
 )
 from graphcast.data_utils import add_derived_vars
 from graphcast.rollout import _get_next_inputs
-from modulus.utils import zenith_angle
 
 import earth2mip.grid
 from earth2mip import time_loop
 from earth2mip.initial_conditions import cds
+from earth2mip.zenith_angle import CosZenith
 
 # see ecwmf parameter table https://codes.ecmwf.int/grib/param-db/?&filter=grib1&table=128 # noqa
 CODE_TO_GRAPHCAST_NAME = {
@@ -135,53 +135,40 @@ def get_channel_names(variables, pressure_levels):
     return names
 
 
-def _get_array_module(x):
-    """
-    Used for device agnostic code, following this pattern:
-    https://docs.cupy.dev/en/stable/user_guide/basic.html#how-to-write-cpu-gpu-agnostic-code
-    """
-    if isinstance(x, jax.Array):
-        return jax.numpy
-    elif isinstance(x, np.ndarray):
-        return np
-    else:
-        raise ValueError(f"Unknown array type {type(x)}")
+def _jax_device_to_torch(device: jax.Device) -> torch.device:
+    if device.platform == "gpu":
+        return torch.device("cuda", device.id)
+    return torch.device("cpu")
 
 
-def _tisr(t, lat, lon):
-    """compute tisr with jax or numpy and without unnecessary warnings
+def _get_solar_provider(lat, lon) -> CosZenith:
+    """The solar provider of the (lat, lon) grid, on the device of ``lat``"""
+    if isinstance(lat, jax.Array):
+        device = _jax_device_to_torch(lat.device())
+    else:
+        device = torch.device("cpu")
+    return CosZenith(np.asarray(lat)[:, None], np.asarray(lon)[None, :], device=device)
+
 
-    Should be upstreamed to modulus
-    """
-    xp = _get_array_module(t)
-    try:
-        old_np = zenith_angle.np
-        zenith_angle.np = xp
-        # catch this warning
-        # /usr/local/lib/python3.10/dist-packages/modulus/utils/zenith_angle.py:276:
-        # RuntimeWarning: invalid value encountered in arccos
-        # hc = np.arccos(-A / B)
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", RuntimeWarning)
-            return zenith_angle.toa_incident_solar_radiation_accumulated(t, lat, lon)
-    finally:
-        zenith_angle.np = old_np
-
-
-def _get_tisr(seconds_since_epoch, lat, lon):
-    t = seconds_since_epoch[..., None, None]
-    lat = lat[:, None]
-    lon = lon[None, :]
-    tisr = _tisr(t, lat, lon)
+def _get_tisr(seconds_since_epoch, lat, solar: CosZenith):
+    """tisr of (batch, time) shaped seconds, on the device of ``lat``"""
+    tisr = solar.toa_incident_solar_radiation(seconds_since_epoch)
+    if isinstance(lat, jax.Array):
+        tisr = torch_to_jax(tisr)
+    else:
+        tisr = tisr.cpu().numpy()
     return xarray_jax.Variable(["batch", "time", "lat", "lon"], tisr)
 
 
-def get_forcings(time, lat, lon):
+def get_forcings(time, lat, lon, solar: Optional[CosZenith] = None):
     """
     Args:
         time: (batch, time) shaped array
         lat: (lat,) shaped array
         lon: (lon,) shaped array
+        solar: the solar provider of the (lat, lon) grid. Pass it when calling
+            this repeatedly on the same grid, otherwise it is built from
+            ``lat`` and ``lon`` on every call.
     Returns:
         forcings: Dataset, maximum dims are (batch, time, lat, lon)
 
@@ -208,9 +195,13 @@ def get_forcings(time, lat, lon):
         forcings = jax.tree_map(
             lambda x: jax.device_put(x, device=lat.device()), forcings
         )
-        seconds_since_epoch = jax.device_put(seconds_since_epoch, device=lat.device())
 
-    forcings["toa_incident_solar_radiation"] = _get_tisr(seconds_since_epoch, lat, lon)
+    # the sun position is computed on the host, the fields on the device of lat
+    if solar is None:
+        solar = _get_solar_provider(lat, lon)
+    forcings["toa_incident_solar_radiation"] = _get_tisr(
+        seconds_since_epoch, lat, solar
+    )
 
     return forcings
 
@@ -365,6 +356,8 @@ class GraphcastStepper(time_loop.TimeStepper):
         self._jax_device = torch_device_to_jax(self._device)
         self.lat = jax.device_put(lat, device=self._jax_device)
         self.lon = jax.device_put(lon, device=self._jax_device)
+        # keyed on the grid once, rather than on lat and lon every step
+        self._solar = CosZenith.from_grid(self._grid, device=self._device)
 
     @property
     def input_info(self) -> time_loop.GeoTensorInfo:
@@ -430,7 +423,7 @@ class GraphcastStepper(time_loop.TimeStepper):
         forcing_time = time + forcings_template.time.values
         # add batch dim
         forcing_time = forcing_time[None]
-        forcings = get_forcings(forcing_time, self.lat, self.lon)
+        forcings = get_forcings(forcing_time, self.lat, self.lon, self._solar)
         forcings = forcings.assign_coords(
             time=self.eval_forcings.time.isel(time=slice(0, 1))
         )
@@ -554,6 +547,7 @@ class GraphcastStepper(time_loop.TimeStepper):
             time + time_offset[None],
             self.eval_inputs.lat.values,
             self.eval_inputs.lon.values,
+            self._solar,
         )
         del forcings["year_progress"]
         del forcings["day_progress"]
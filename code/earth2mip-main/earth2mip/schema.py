@@ -16,7 +16,7 @@
 
 import datetime
 from enum import Enum
-from typing import Any, List, Mapping, Optional
+from typing import Any, Dict, List, Mapping, Optional
 
 import pydantic
 
@@ -29,6 +29,7 @@ __all__ = [
     "EnsembleRun",
     "InferenceEntrypoint",
     "PerturbationStrategy",
+    "OutputFormat",
 ]
 
 
@@ -78,6 +79,11 @@ class PerturbationStrategy(Enum):
     none = "none"
 
 
+class OutputFormat(Enum):
+    netcdf = "netcdf"
+    zarr = "zarr"
+
+
 class EnsembleRun(pydantic.BaseModel):
     """A configuration for running an ensemble weather forecast
 
@@ -102,6 +108,12 @@ class EnsembleRun(pydantic.BaseModel):
         grf_noise_alpha: tuning parameter of the Gaussian random field, see ensemble_utils.generate_noise_grf for details
         grf_noise_sigma: tuning parameter of the Gaussian random field, see ensemble_utils.generate_noise_grf for details
         grf_noise_tau: tuning parameter of the Gaussian random field, see ensemble_utils.generate_noise_grf for details
+        output_format: netcdf writes one file per rank, zarr writes a single ``ensemble_out.zarr`` store shared by all ranks.
+        output_chunks: zarr chunk sizes of the "ensemble", "time", "lat", "lon" and "npoints" dimensions. Dimensions not given are not chunked.
+        output_compression: the Blosc compressor of the zarr output (e.g. "zstd", "lz4"), None = uncompressed.
+        output_compression_level: the Blosc compression level of the zarr output.
+        bred_vector_integration_steps: the number of breeding cycles of the bred_vector perturbation strategy.
+        bred_vector_checkpoint_dir: if provided, the bred vectors are kept in this directory and start the breeding of the next run, e.g. at the next initial time.
 
     """  # noqa
 
@@ -127,6 +139,22 @@ class EnsembleRun(pydantic.BaseModel):
     grf_noise_alpha: float = 2.0
     grf_noise_sigma: float = 5.0
     grf_noise_tau: float = 2.0
+    output_format: OutputFormat = OutputFormat.netcdf
+    output_chunks: Dict[str, int] = {"ensemble": 1, "time": 1}
+    output_compression: Optional[str] = "zstd"
+    output_compression_level: int = 3
+    bred_vector_integration_steps: int = 40
+    bred_vector_checkpoint_dir: Optional[str] = None
+
+    @pydantic.validator("output_format")
+    def _check_zarr_domains(cls, output_format, values):
+        weather_event = values.get("weather_event")
+        if output_format == OutputFormat.zarr and weather_event is not None:
+            # imported here since the diagnostics import this module
+            from earth2mip.zarr_output import check_zarr_domains
+
+            check_zarr_domains(weather_event.domains)
+        return output_format
 
     def get_weather_event(self) -> weather_events.WeatherEvent:
         if self.forecast_name:
@@ -43,6 +43,13 @@ def _open(f, domain, chunks={"time": 1}):
 
 def open_ensemble(path, group):
     path = pathlib.Path(path)
+    zarr_path = path / "ensemble_out.zarr"
+    if zarr_path.exists():
+        # already a single store, see earth2mip.zarr_output
+        ds = xarray.open_zarr(zarr_path.as_posix(), group=group)
+        root = xarray.open_zarr(zarr_path.as_posix())
+        ds.attrs.update(root.attrs)
+        return ds
     ensemble_files = sorted(list(path.glob("ensemble_out_*.nc")))
     return xarray.concat([_open(f, group) for f in ensemble_files], dim="ensemble")
 
@@ -55,8 +62,11 @@ def open_verification(time):
 
 
 def read_weather_event(dir):
-    ncfile = os.path.join(dir, "ensemble_out_0.nc")
-    ds = xarray.open_dataset(ncfile)
+    zarr_path = os.path.join(dir, "ensemble_out.zarr")
+    if os.path.exists(zarr_path):
+        ds = xarray.open_zarr(zarr_path)
+    else:
+        ds = xarray.open_dataset(os.path.join(dir, "ensemble_out_0.nc"))
     weather_event = weather_events.WeatherEvent.parse_raw(ds.weather_event)
     return weather_event
 
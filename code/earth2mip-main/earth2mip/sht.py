@@ -0,0 +1,199 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Spherical harmonic transforms with shared Legendre tables
+
+Building a :py:class:`torch_harmonics.RealSHT` or
+:py:class:`torch_harmonics.InverseRealSHT` precomputes the associated Legendre
+polynomials, which dominates the construction of SHT based models. The
+transforms returned here are separate modules that share the tables of a
+process-wide plan per ``(nlat, nlon, lmax, mmax, grid, norm, scale, dtype,
+device)``.
+
+Moving a returned transform with ``.to`` or assigning its buffers leaves the
+plan untouched, only in-place updates of the buffers would be shared.
+
+With ``config.SHT_CACHE`` the tables of the plans are also saved to
+``config.LOCAL_CACHE/sht`` and loaded from there in later processes. Pass the
+``device`` a model runs on when building it, so that moving the model there
+keeps the tables shared.
+"""
+import copy
+import hashlib
+import logging
+import os
+import threading
+from typing import Optional, Union
+
+import torch
+import torch_harmonics as th
+
+from earth2mip import config
+
+__all__ = ["get_sht", "get_inverse_sht", "clear_cache"]
+
+logger = logging.getLogger(__name__)
+
+_plans = {}
+_lock = threading.Lock()
+
+
+def _share(module: torch.nn.Module) -> torch.nn.Module:
+    """A new module with the attributes and tensors of ``module``"""
+    shared = copy.copy(module)
+    shared._parameters = module._parameters.copy()
+    shared._buffers = module._buffers.copy()
+    shared._non_persistent_buffers_set = set(module._non_persistent_buffers_set)
+    shared._modules = module._modules.copy()
+    return shared
+
+
+def _cache_path(key) -> str:
+    name = hashlib.sha256(repr((th.__version__,) + key).encode()).hexdigest()
+    return os.path.join(config.LOCAL_CACHE, "sht", name + ".pt")
+
+
+# the buffer holding the precomputed table of each transform
+_TABLES = {th.RealSHT: "weights", th.InverseRealSHT: "pct"}
+
+
+def _save(module: torch.nn.Module, path: str):
+    """Save the table of ``module`` and its plain attributes"""
+    attributes = {
+        name: value
+        for name, value in vars(module).items()
+        if not name.startswith("_") and isinstance(value, (bool, int, float, str))
+    }
+    state = {"table": getattr(module, _TABLES[type(module)]), "attributes": attributes}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+def _load(cls, path: str) -> torch.nn.Module:
+    """The transform around the table saved by :py:func:`_save`
+
+    The module is not constructed with ``cls(...)``, which would recompute the
+    table.
+    """
+    state = torch.load(path, weights_only=True)
+    module = cls.__new__(cls)
+    torch.nn.Module.__init__(module)
+    vars(module).update(state["attributes"])
+    module.register_buffer(_TABLES[cls], state["table"], persistent=False)
+    return module
+
+
+def _build(cls, key, nlat, nlon, lmax, mmax, grid, norm, scale, dtype):
+    if config.SHT_CACHE:
+        path = _cache_path(key)
+        if os.path.exists(path):
+            logger.debug("Loading SHT plan from %s", path)
+            return _load(cls, path)
+
+    module = cls(nlat, nlon, lmax=lmax, mmax=mmax, grid=grid, norm=norm).to(dtype)
+    if scale != 1 and cls is th.RealSHT:
+        module.weights = module.weights * scale
+    elif scale != 1:
+        module.pct = module.pct / scale
+
+    if config.SHT_CACHE:
+        _save(module, path)
+    return module
+
+
+def _get_plan(
+    cls,
+    nlat: int,
+    nlon: int,
+    lmax: Optional[int],
+    mmax: Optional[int],
+    grid: str,
+    norm: str,
+    scale: float,
+    dtype: torch.dtype,
+    device: Union[str, torch.device, None],
+):
+    device = torch.device(device or "cpu")
+    key = (cls.__name__, nlat, nlon, lmax, mmax, grid, norm, scale, str(dtype))
+    with _lock:
+        if (key, device) not in _plans:
+            cpu = torch.device("cpu")
+            if (key, cpu) not in _plans:
+                _plans[(key, cpu)] = _build(
+                    cls, key, nlat, nlon, lmax, mmax, grid, norm, scale, dtype
+                )
+            _plans[(key, device)] = _plans[(key, cpu)].to(device)
+        return _share(_plans[(key, device)])
+
+
+def get_sht(
+    nlat: int,
+    nlon: int,
+    lmax: Optional[int] = None,
+    mmax: Optional[int] = None,
+    grid: str = "equiangular",
+    norm: str = "ortho",
+    scale: float = 1.0,
+    dtype: torch.dtype = torch.float32,
+    device: Union[str, torch.device, None] = None,
+) -> th.RealSHT:
+    """A :py:class:`torch_harmonics.RealSHT` sharing the cached tables
+
+    Args:
+        scale: multiplies the quadrature weights, the inverse transform of the
+            same ``scale`` undoes it
+        dtype: the dtype of the tables
+        device: the device of the tables
+
+    See :py:class:`torch_harmonics.RealSHT` for the other arguments.
+    """
+    return _get_plan(
+        th.RealSHT, nlat, nlon, lmax, mmax, grid, norm, scale, dtype, device
+    )
+
+
+def get_inverse_sht(
+    nlat: int,
+    nlon: int,
+    lmax: Optional[int] = None,
+    mmax: Optional[int] = None,
+    grid: str = "equiangular",
+    norm: str = "ortho",
+    scale: float = 1.0,
+    dtype: torch.dtype = torch.float32,
+    device: Union[str, torch.device, None] = None,
+) -> th.InverseRealSHT:
+    """A :py:class:`torch_harmonics.InverseRealSHT` sharing the cached tables
+
+    Args:
+        scale: divides the Legendre polynomials, this undoes the forward
+            transform of the same ``scale``
+        dtype: the dtype of the tables
+        device: the device of the tables
+
+    See :py:class:`torch_harmonics.InverseRealSHT` for the other arguments.
+    """
+    return _get_plan(
+        th.InverseRealSHT, nlat, nlon, lmax, mmax, grid, norm, scale, dtype, device
+    )
+
+
+def clear_cache():
+    """Drop the plans held by this process"""
+    with _lock:
+        _plans.clear()
@@ -94,6 +94,96 @@ class TimeLoop(Protocol):
         """
         pass
 
+    def rollout(
+        self,
+        x: torch.Tensor,
+        time: datetime.datetime,
+        n_steps: int,
+        save_every: int = 1,
+        out: Optional[torch.Tensor] = None,
+    ) -> torch.Tensor:
+        """Run ``n_steps`` time steps and return every ``save_every``-th output
+
+        This default drives ``self`` as an iterator, time loops can override it
+        with a tighter loop. It can also be called as ``TimeLoop.rollout(loop,
+        ...)`` for a time loop that does not inherit from this class.
+
+        Args:
+            x: an initial condition, as in :py:meth:`__call__`
+            time: the datetime of ``x``
+            n_steps: the number of time steps to run
+            save_every: the interval between the saved steps
+            out: a buffer to write the outputs to, allocated on the device of
+                the outputs if not given. Can be on another device, e.g. the
+                host for long runs.
+
+        Returns:
+            the (n_steps // save_every + 1, B, len(out_channel_names), Y, X)
+            outputs of steps 0, save_every, 2 * save_every, ...
+        """
+        n_saved = _check_rollout(n_steps, save_every)
+        for k, (_, output, _) in enumerate(self(time, x)):
+            if k % save_every == 0:
+                if out is None:
+                    out = output.new_empty((n_saved,) + output.shape)
+                out[k // save_every].copy_(output)
+            if k == n_steps:
+                break
+        return out
+
+
+def _check_rollout(n_steps: int, save_every: int) -> int:
+    """The number of steps saved by a rollout"""
+    if n_steps < 0 or save_every < 1:
+        raise ValueError(
+            f"Expected n_steps >= 0 and save_every >= 1, got {n_steps}, {save_every}."
+        )
+    return n_steps // save_every + 1
+
+
+class LazyOutput:
+    """The output of a time step, denormalized only when it is used
+
+    Time loops with ``supports_lazy_output = True`` yield this in place of the
+    output tensor when called with ``lazy=True``, so that the steps a caller
+    skips cost no denormalization.
+
+    Args:
+        x: the normalized (B, n_history_levels, channel, Y, X) state
+        scale: the (channel, 1, 1) scale of the state
+        center: the (channel, 1, 1) center of the state
+    """
+
+    def __init__(self, x: torch.Tensor, scale: torch.Tensor, center: torch.Tensor):
+        self._x = x
+        self._scale = scale
+        self._center = center
+
+    @property
+    def shape(self) -> torch.Size:
+        """The shape of the output, (B, channel, Y, X)"""
+        return self._x[:, -1].shape
+
+    @property
+    def dtype(self) -> torch.dtype:
+        return torch.promote_types(self._x.dtype, self._scale.dtype)
+
+    @property
+    def device(self) -> torch.device:
+        return self._x.device
+
+    def materialize(self, out: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """The denormalized (B, channel, Y, X) output
+
+        Args:
+            out: if given, a buffer to write the output to instead of
+                allocating a new tensor
+        """
+        if out is None:
+            return self._scale * self._x[:, -1] + self._center
+        torch.mul(self._scale, self._x[:, -1], out=out)
+        return out.add_(self._center)
+
 
 StateT = TypeVar("StateT")
 
@@ -17,7 +17,7 @@
 import datetime
 import json
 from enum import Enum
-from typing import List, Literal, Optional, Union
+from typing import List, Literal, Optional, Tuple, Union
 
 from pydantic import BaseModel
 
@@ -46,11 +46,47 @@ class WeatherEventProperties(BaseModel):
     restart: str = ""
 
 
+class OutputEncoding(BaseModel):
+    """How the output of a diagnostic is stored
+
+    Attributes:
+        dtype: the stored dtype. None uses the default of the output format
+            (float64 for netCDF, float32 for zarr). float16 is only supported by
+            zarr, netCDF has no 16 bit float. int16 packs the data with
+            ``scale_factor`` and ``add_offset``.
+        scale_factor: for int16, data = packed * scale_factor + add_offset
+        add_offset: for int16, see ``scale_factor``
+        compression: None, "zlib" or "zstd"
+        complevel: the compression level
+        least_significant_digit: quantize the data to this many decimal digits
+            after the point before compressing
+        significant_bits: keep this many mantissa bits (bit rounding) before
+            compressing
+    """
+
+    dtype: Optional[Literal["float64", "float32", "float16", "int16"]] = None
+    scale_factor: Optional[float] = None
+    add_offset: float = 0.0
+    compression: Optional[Literal["zlib", "zstd"]] = None
+    complevel: int = 4
+    least_significant_digit: Optional[int] = None
+    significant_bits: Optional[int] = None
+
+
 class Diagnostic(BaseModel):
     type: str
     function: str = ""
     channels: List[str]
+    # bins of the "histogram" and "bin_count" diagnostics, either explicit
+    # edges or nbins equal bins spanning bin_range
     nbins: int = 10
+    bin_range: Optional[Tuple[float, float]] = None
+    bin_edges: Optional[List[float]] = None
+    # thresholds of the "exceedance_probability" diagnostic
+    thresholds: List[float] = []
+    # probabilities of the "ensemble_quantile" diagnostic
+    quantiles: List[float] = [0.1, 0.5, 0.9]
+    encoding: OutputEncoding = OutputEncoding()
 
 
 class Window(BaseModel):
@@ -0,0 +1,295 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Routines to save domains to a zarr store shared by all ranks
+
+Unlike the netCDF output, which writes one file per rank, every rank writes a
+disjoint range of ensemble members into the same store. The store has a group
+per domain, and each ``raw`` diagnostic channel is an (ensemble, time, lat,
+lon) array that can be opened with ``xarray.open_zarr(path, group=domain)``.
+"""
+import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numcodecs
+import numpy as np
+import torch
+import zarr
+
+import earth2mip.grid
+from earth2mip import geometry
+from earth2mip._writer import AsyncWriter
+from earth2mip.diagnostics import Diagnostics, Raw
+from earth2mip.netcdf import select_netcdf, write_netcdf
+from earth2mip.weather_events import Domain, OutputEncoding
+
+__all__ = [
+    "check_zarr_domains",
+    "initialize_zarr",
+    "update_zarr",
+    "get_zarr_encoding",
+    "get_diagnostics",
+    "AsyncZarrWriter",
+]
+
+_DIMENSIONS = "_ARRAY_DIMENSIONS"
+
+
+def check_zarr_domains(domains: Sequence[Domain]):
+    """Raise a ValueError if ``domains`` cannot be saved to a zarr store
+
+    Only ``raw`` diagnostics are supported. Each rank writes its own members to
+    the store, while an ensemble statistic would need the members of all ranks.
+    """
+    for domain in domains:
+        if domain.type not in ("Window", "MultiPoint"):
+            raise ValueError(
+                f"domain type {domain.type} of {domain.name} is not supported by "
+                "the zarr output."
+            )
+        for diagnostic in domain.diagnostics:
+            if diagnostic.type != "raw":
+                raise ValueError(
+                    f"diagnostic type {diagnostic.type} of {domain.name} is not "
+                    "supported by the zarr output, use the netcdf output."
+                )
+
+
+def get_compressor(
+    compression: Optional[str], level: int = 3
+) -> Optional[numcodecs.abc.Codec]:
+    """A Blosc compressor using ``compression`` ("zstd", "lz4", ...), or None"""
+    if compression is None:
+        return None
+    return numcodecs.Blosc(
+        cname=compression, clevel=level, shuffle=numcodecs.Blosc.BITSHUFFLE
+    )
+
+
+def get_zarr_encoding(
+    encoding: OutputEncoding,
+    default_dtype: Any = np.float32,
+    default_compressor: Optional[numcodecs.abc.Codec] = None,
+) -> Tuple[Any, List[numcodecs.abc.Codec], Optional[numcodecs.abc.Codec]]:
+    """The zarr dtype, filters and compressor of ``encoding``"""
+    dtype = np.dtype(default_dtype)
+    filters = []
+    if encoding.dtype == "int16":
+        if encoding.scale_factor is None:
+            raise ValueError("int16 encoding needs a scale_factor.")
+        # stored as int16, read as float32
+        dtype = np.dtype(np.float32)
+        filters.append(
+            numcodecs.FixedScaleOffset(
+                offset=encoding.add_offset,
+                scale=1 / encoding.scale_factor,
+                dtype=dtype,
+                astype="i2",
+            )
+        )
+    elif encoding.dtype:
+        dtype = np.dtype(encoding.dtype)
+
+    if encoding.least_significant_digit is not None:
+        filters.append(
+            numcodecs.Quantize(digits=encoding.least_significant_digit, dtype=dtype)
+        )
+    if encoding.significant_bits is not None:
+        filters.append(numcodecs.BitRound(keepbits=encoding.significant_bits))
+
+    if encoding.compression == "zlib":
+        compressor = numcodecs.Zlib(level=encoding.complevel)
+    elif encoding.compression == "zstd":
+        compressor = numcodecs.Zstd(level=encoding.complevel)
+    else:
+        compressor = default_compressor
+    return dtype, filters, compressor
+
+
+def _create_coordinate(group: zarr.Group, name: str, dim: str, values):
+    array = group.array(name, np.asarray(values, dtype=np.float32), fill_value=None)
+    array.attrs[_DIMENSIONS] = [dim]
+    return array
+
+
+def _init_dimensions(domain: Domain, group: zarr.Group, lat, lon) -> Dict[str, int]:
+    if domain.type == "Window":
+        lat_sl, lon_sl = geometry.get_bounds_window(domain, lat, lon)
+        _create_coordinate(group, "lat", "lat", lat[lat_sl])
+        _create_coordinate(group, "lon", "lon", lon[lon_sl])
+        group.attrs.update(
+            imin=lat_sl.start, imax=lat_sl.stop, jmin=lon_sl.start, jmax=lon_sl.stop
+        )
+        return {"lat": lat[lat_sl].size, "lon": lon[lon_sl].size}
+    elif domain.type == "MultiPoint":
+        _create_coordinate(group, "lat_point", "npoints", domain.lat)
+        _create_coordinate(group, "lon_point", "npoints", domain.lon)
+        return {"npoints": len(domain.lat)}
+    else:
+        raise NotImplementedError(f"domain type {domain.type} not supported")
+
+
+def initialize_zarr(
+    root: zarr.Group,
+    domains: Sequence[Domain],
+    grid: earth2mip.grid.LatLonGrid,
+    n_ensemble: int,
+    times: Sequence[datetime.datetime],
+    chunks: Optional[Dict[str, int]] = None,
+    compressor: Optional[numcodecs.abc.Codec] = None,
+    dtype=np.float32,
+):
+    """Create the arrays of the output store
+
+    Should be called by one rank before any rank calls :py:func:`update_zarr`.
+
+    Args:
+        root: the root group of the store
+        domains: the domains to save
+        grid: the grid of the data passed to :py:func:`update_zarr`
+        n_ensemble: the total number of ensemble members over all ranks
+        times: the valid times of the output steps
+        chunks: the chunk size of each of the "ensemble", "time", "lat", "lon"
+            and "npoints" dimensions. Dimensions not given are not chunked. The
+            ensemble chunk size should divide the number of members per rank,
+            so that no two ranks write to the same chunk.
+        compressor: the compressor of the diagnostic arrays without a
+            compression in their encoding, see :py:func:`get_compressor`
+        dtype: the dtype of the diagnostic arrays without a dtype in their
+            encoding
+    """
+    check_zarr_domains(domains)
+    chunks = chunks or {}
+    lat = np.array(grid.lat)
+    lon = np.array(grid.lon)
+    hours = [(time - times[0]) / datetime.timedelta(hours=1) for time in times]
+    units = times[0].strftime("hours since %Y-%m-%d %H:%M:%S") if times else "hours"
+
+    for domain in domains:
+        group = root.create_group(domain.name)
+        sizes = {"ensemble": n_ensemble, "time": len(times)}
+        sizes.update(_init_dimensions(domain, group, lat, lon))
+
+        time = group.array("time", np.asarray(hours, dtype=np.float64), fill_value=None)
+        time.attrs.update({_DIMENSIONS: ["time"], "units": units})
+        time.attrs["calendar"] = "standard"
+
+        for diagnostic in domain.diagnostics:
+            array_dtype, filters, array_compressor = get_zarr_encoding(
+                diagnostic.encoding, dtype, compressor
+            )
+            for channel in diagnostic.channels:
+                array = group.full(
+                    channel,
+                    fill_value=np.nan,
+                    shape=tuple(sizes.values()),
+                    chunks=tuple(chunks.get(dim, size) for dim, size in sizes.items()),
+                    dtype=array_dtype,
+                    filters=filters or None,
+                    compressor=array_compressor,
+                )
+                array.attrs[_DIMENSIONS] = list(sizes)
+
+    # the metadata does not change while the data is written
+    zarr.consolidate_metadata(root.store)
+
+
+def get_diagnostics(
+    root: zarr.Group,
+    domains: Sequence[Domain],
+    grid: earth2mip.grid.LatLonGrid,
+    channel_names_of_data: List[str],
+    device: Union[str, torch.device] = "cpu",
+) -> List[Diagnostics]:
+    """The diagnostics of ``domains``, writing to the arrays created by
+    :py:func:`initialize_zarr`
+
+    They select the domain and channels on ``device`` like the netCDF output.
+    """
+    check_zarr_domains(domains)
+    lat = np.array(grid.lat)
+    lon = np.array(grid.lon)
+    diagnostics = []
+    for domain in domains:
+        for d in domain.diagnostics:
+            diagnostic = Raw(None, domain, grid, d, lat, lon, torch.device(device))
+            diagnostic.set_channels(channel_names_of_data)
+            diagnostic.subgroup = root[domain.name]
+            diagnostics.append(diagnostic)
+    return diagnostics
+
+
+def update_zarr(
+    root: zarr.Group,
+    data: torch.Tensor,
+    domains: Sequence[Domain],
+    ensemble_index: int,
+    time_count: int,
+    grid: earth2mip.grid.LatLonGrid,
+    channel_names_of_data: List[str],
+):
+    """Write the (batch, channel, lat, lon) ``data`` of one output step
+
+    Args:
+        ensemble_index: the index of ``data[0]`` among all ensemble members
+        time_count: the index of the output step
+    """
+    diagnostics = [
+        get_diagnostics(root, domains, grid, channel_names_of_data, data.device)
+    ]
+    outputs = select_netcdf(
+        data, diagnostics, channel_names_of_data, ensemble_index, time_count
+    )
+    write_netcdf(outputs, diagnostics, ensemble_index, time_count)
+
+
+class AsyncZarrWriter(AsyncWriter):
+    """Write each output step to a zarr store on a background thread
+
+    See :py:class:`earth2mip._writer.AsyncWriter`. ``batch_id`` is offset by
+    ``ensemble_offset``, the index of this rank's first ensemble member. Only
+    the domains and channels to save are gathered on ``device`` and copied to
+    the host.
+    """
+
+    def __init__(
+        self,
+        root: zarr.Group,
+        domains: Sequence[Domain],
+        grid: earth2mip.grid.LatLonGrid,
+        channel_names_of_data: List[str],
+        ensemble_offset: int = 0,
+        max_queue: int = 2,
+        device: Union[str, torch.device] = "cpu",
+    ):
+        self.root = root
+        self.domains = domains
+        self.grid = grid
+        self.channel_names_of_data = channel_names_of_data
+        self.ensemble_offset = ensemble_offset
+        self.diagnostics = [
+            get_diagnostics(root, domains, grid, channel_names_of_data, device)
+        ]
+        super().__init__(max_queue)
+
+    def _select(self, data, batch_id, time_count):
+        return select_netcdf(
+            data, self.diagnostics, self.channel_names_of_data, batch_id, time_count
+        )
+
+    def _write_step(self, data, batch_id, time_count, time):
+        ensemble_index = self.ensemble_offset + batch_id
+        write_netcdf(data, self.diagnostics, ensemble_index, time_count)
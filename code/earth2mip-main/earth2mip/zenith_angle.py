@@ -0,0 +1,238 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Solar forcings evaluated on the device
+
+The position of the sun only depends on time, so it is computed on the host
+in float64 for a whole batch of times with the formulas of
+:py:mod:`modulus.utils.zenith_angle`. The fields are then linear combinations
+of a few per point terms kept on the device, e.g.::
+
+    cos(zenith) = sin(lat) sin(dec) + cos(lat) cos(dec) cos(h + lon)
+        = sin(dec) sin(lat)
+        + cos(dec) cos(h) cos(lat) cos(lon)
+        - cos(dec) sin(h) cos(lat) sin(lon)
+
+where ``dec`` is the declination of the sun and ``h`` the hour angle at
+longitude 0.
+"""
+import datetime
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import torch
+from modulus.utils import zenith_angle
+
+import earth2mip.grid
+
+__all__ = ["CosZenith"]
+
+TimeLike = Union[datetime.datetime, Sequence[datetime.datetime], np.ndarray]
+
+
+def _to_timestamps(time: TimeLike) -> np.ndarray:
+    """Seconds since the UNIX epoch, naive datetimes are UTC"""
+    if isinstance(time, datetime.datetime):
+        time = [time]
+        squeeze = True
+    else:
+        squeeze = False
+
+    array = np.asarray(time)
+    if array.dtype == object:
+        array = np.vectorize(
+            lambda t: t.replace(tzinfo=datetime.timezone.utc).timestamp()
+            if t.tzinfo is None
+            else t.timestamp(),
+            otypes=[np.float64],
+        )(array)
+    elif np.issubdtype(array.dtype, np.datetime64):
+        array = array.astype("datetime64[us]").astype(np.int64) / 1e6
+    array = array.astype(np.float64)
+    return array[0] if squeeze else array
+
+
+def _sun_position(timestamps: np.ndarray):
+    """The declination of the sun and its hour angle at longitude 0"""
+    century = zenith_angle._timestamp_to_julian_century(timestamps)
+    right_ascension, declination = zenith_angle._right_ascension_declination(century)
+    hour_angle = zenith_angle._local_hour_angle(century, 0.0, right_ascension)
+    return declination, hour_angle
+
+
+class CosZenith(torch.nn.Module):
+    """Cosine of the solar zenith angle on a fixed set of points
+
+    The per point terms are buffers, so the module follows the model it is
+    part of across devices. They are not saved in the state dict.
+
+    Args:
+        lat: latitudes in degrees
+        lon: longitudes in degrees, broadcastable with ``lat`` to the shape of
+            the points, e.g. ``lat[:, None]`` and ``lon[None, :]`` for a
+            regular grid
+        dtype: the dtype of the fields
+        device: the device of the fields
+    """
+
+    def __init__(
+        self,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        dtype: torch.dtype = torch.float32,
+        device: Optional[torch.device] = None,
+    ):
+        super().__init__()
+        lat, lon = np.broadcast_arrays(np.deg2rad(lat), np.deg2rad(lon))
+        basis = np.stack(
+            [np.sin(lat), np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon)]
+        )
+
+        def buffer(name, value):
+            value = torch.as_tensor(value, dtype=dtype, device=device)
+            self.register_buffer(name, value, persistent=False)
+
+        buffer("basis", basis)
+        buffer("sin_lat", np.sin(lat))
+        buffer("cos_lat", np.cos(lat))
+        buffer("lon", lon)
+        self._table = None
+        self._table_index = {}
+
+    @classmethod
+    def from_grid(cls, grid: earth2mip.grid.LatLonGrid, **kwargs) -> "CosZenith":
+        """The cosine zenith angle on a regular lat-lon grid"""
+        lat = np.asarray(grid.lat)
+        lon = np.asarray(grid.lon)
+        return cls(lat[:, None], lon[None, :], **kwargs)
+
+    @property
+    def shape(self):
+        return self.basis.shape[1:]
+
+    def _coefficients(self, timestamps: np.ndarray) -> torch.Tensor:
+        declination, hour_angle = _sun_position(timestamps)
+        coefficients = np.stack(
+            [
+                np.sin(declination),
+                np.cos(declination) * np.cos(hour_angle),
+                -np.cos(declination) * np.sin(hour_angle),
+            ],
+            axis=-1,
+        )
+        return torch.as_tensor(
+            coefficients, dtype=self.basis.dtype, device=self.basis.device
+        )
+
+    def forward(self, time: TimeLike) -> torch.Tensor:
+        """The cosine zenith angle at ``time``
+
+        Args:
+            time: a datetime, or an array of datetimes, datetime64 or seconds
+                since the UNIX epoch. Naive datetimes are UTC.
+
+        Returns:
+            the cosine zenith angle with shape ``time.shape + self.shape``
+        """
+        timestamps = _to_timestamps(time)
+        if self._table is not None:
+            index = [self._table_index.get(t) for t in np.ravel(timestamps)]
+            if None not in index:
+                index = torch.tensor(index, device=self._table.device)
+                values = self._table.index_select(0, index)
+                return values.view(np.shape(timestamps) + self.shape)
+
+        coefficients = self._coefficients(timestamps)
+        return torch.tensordot(coefficients, self.basis, dims=1)
+
+    def precompute(self, times: TimeLike):
+        """Keep the fields of ``times``, e.g. the valid times of a rollout
+
+        Later calls with these times are a lookup in the table. The table uses
+        ``len(times) * prod(self.shape)`` elements of device memory.
+        """
+        timestamps = np.ravel(_to_timestamps(times))
+        self._table = self(timestamps)
+        self._table_index = {t: i for i, t in enumerate(timestamps)}
+
+    def clear(self):
+        """Free the table of :py:meth:`precompute`"""
+        self._table = None
+        self._table_index = {}
+
+    def toa_incident_solar_radiation(
+        self,
+        time: TimeLike,
+        interval: float = 3600,
+        S0: float = 1361,
+        e: float = 0.0167,
+        perihelion_longitude: float = 282.895,
+        mean_tropical_year: float = 365.2422,
+    ) -> torch.Tensor:
+        """The TOA incident solar radiation accumulated over ``interval``
+
+        The device version of
+        :py:func:`modulus.utils.zenith_angle.toa_incident_solar_radiation_accumulated`,
+        see there for the arguments.
+
+        Returns:
+            the radiation in J/m2 with shape ``time.shape + self.shape``
+        """
+        timestamps = _to_timestamps(time)
+        declination, hour_angle = _sun_position(timestamps)
+        irradiance = zenith_angle.irradiance(
+            timestamps, S0, e, perihelion_longitude, mean_tropical_year
+        )
+
+        def per_time(value):
+            value = torch.as_tensor(
+                value, dtype=self.basis.dtype, device=self.basis.device
+            )
+            return value.view(value.shape + (1,) * len(self.shape))
+
+        A = per_time(np.sin(declination)) * self.sin_lat
+        B = per_time(np.cos(declination)) * self.cos_lat
+        h1 = per_time(hour_angle) + self.lon
+        h0 = h1 - interval / 86400 * 2 * np.pi
+        sec_per_rad = 86400 / (2 * np.pi)
+        return per_time(irradiance) * _integrate_abs_cosz(A, B, h0, h1) * sec_per_rad
+
+
+def _integrate_abs_cosz(A, B, h0, h1):
+    """Integrate max(A + B cos(h), 0) from h=h0 to h1, see modulus"""
+    hc = torch.arccos(-A / B)
+    two_pi = 2 * np.pi
+
+    def sin(x):
+        return torch.sin(x) if isinstance(x, torch.Tensor) else np.sin(x)
+
+    def integrate_cosz(left, right):
+        return A * (right - left) + B * (sin(right) - sin(left))
+
+    def integrate_abs_cosz_from_zero_to(a):
+        root1 = -hc + two_pi
+        n = torch.div(a, two_pi, rounding_mode="floor")
+        a = torch.remainder(a, two_pi)
+        C = integrate_cosz(0, torch.where(a < hc, a, hc))
+        D = torch.where(root1 < a, integrate_cosz(root1, a), 0)
+        total = integrate_cosz(0, hc) + integrate_cosz(root1, two_pi)
+        return C + D + total * n
+
+    return torch.where(
+        torch.isnan(hc),
+        torch.clamp(integrate_cosz(h0, h1), min=0),
+        integrate_abs_cosz_from_zero_to(h1) - integrate_abs_cosz_from_zero_to(h0),
+    )
@@ -22,19 +22,27 @@ import numpy as np
 import pytest
 
 from earth2mip import grid
-from earth2mip.initial_conditions import hdf5
+from earth2mip.initial_conditions import base, hdf5
 
 
-def create_hdf5(tmp_path: pathlib.Path, year: int, num_time, grid, channels):
+def create_hdf5(
+    tmp_path: pathlib.Path, year: int, num_time, grid, channels, zonal=False
+):
     h5_var_name = "fields"
 
     data_json = {
         "attrs": {},
         "coords": {"lat": grid.lat, "lon": grid.lon, "channel": channels},
-        "dims": ["time", "channel", "lat", "lon"],
+        "dims": ["time", "channel", "lat"]
+        if zonal
+        else ["time", "channel", "lat", "lon"],
         "h5_path": h5_var_name,
         "dhours": 6,
+        "zonal": zonal,
     }
+    shape = (num_time, len(channels), *grid.shape)
+    if zonal:
+        shape = shape[:-1]
 
     data_json_path = tmp_path / "data.json"
     data_json_path.write_text(json.dumps(data_json))
@@ -42,9 +50,11 @@ def create_hdf5(tmp_path: pathlib.Path, year: int, num_time, grid, channels):
     h5_path = tmp_path / "validation" / (str(year) + ".h5")
     h5_path.parent.mkdir()
     with h5py.File(h5_path.as_posix(), mode="w") as f:
-        f.create_dataset(
-            h5_var_name, shape=(num_time, len(channels), *grid.shape), dtype="<f"
-        )
+        if zonal:
+            data = np.arange(np.prod(shape), dtype="<f").reshape(shape)
+            f.create_dataset(h5_var_name, data=data)
+        else:
+            f.create_dataset(h5_var_name, shape=shape, dtype="<f")
 
     # create stats/time_means.npy
     time_means = tmp_path / "stats" / "time_means.npy"
@@ -97,3 +107,93 @@ def test_hdf_data_source_subset_channels(tmp_path: pathlib.Path):
     array = ds[time]
     assert array.shape == (1, 2, 2)
     assert isinstance(ds.grid, grid.LatLonGrid)
+
+
+def test_hdf_data_source_zonal(tmp_path: pathlib.Path):
+    time = datetime.datetime(2018, 1, 1, 6)
+    create_hdf5(
+        tmp_path,
+        time.year,
+        10,
+        grid=grid.equiangular_lat_lon_grid(3, 4),
+        channels=["t850", "t2m"],
+        zonal=True,
+    )
+    ds = hdf5.DataSource.from_path(tmp_path.as_posix(), channel_names=["t2m"])
+    array = ds[time]
+    assert array.shape == (1, 3, 4)
+    # broadcast view along lon, no copy
+    assert array.strides[-1] == 0
+    np.testing.assert_array_equal(array[0, :, 0], [9, 10, 11])
+    np.testing.assert_array_equal(array[..., 0], array[..., -1])
+
+
+def test_hdf_data_source_caches_files(tmp_path: pathlib.Path, monkeypatch):
+    g = grid.equiangular_lat_lon_grid(2, 2)
+    create_hdf5(tmp_path, 2018, 10, grid=g, channels=["t850", "t2m"])
+    (tmp_path / "train").mkdir()
+    with h5py.File(tmp_path / "train" / "2017.h5", mode="w") as f:
+        f.create_dataset("fields", shape=(10, 2, *g.shape), dtype="<f")
+    ds = hdf5.DataSource.from_path(tmp_path.as_posix(), max_open_files=1)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the file index should only be built once")
+
+    monkeypatch.setattr(hdf5.filesystem, "glob", fail)
+    for time in [datetime.datetime(2018, 1, 1), datetime.datetime(2018, 1, 2)]:
+        assert ds[time].shape == (2, 2, 2)
+    (handle,) = ds._handles.values()
+    assert ds[datetime.datetime(2018, 1, 1, 6)].shape == (2, 2, 2)
+    assert list(ds._handles.values()) == [handle]
+
+    # opening another year evicts the least recently used file
+    assert ds[datetime.datetime(2017, 1, 1)].shape == (2, 2, 2)
+    assert len(ds._handles) == 1
+    assert not handle.id.valid
+
+    for time in [datetime.datetime(2018, 1, 3, 12), datetime.datetime(2018, 1, 1, 1)]:
+        with pytest.raises(KeyError):
+            ds[time]
+    ds.close()
+    assert not ds._handles
+
+
+def test__contiguous_runs():
+    assert hdf5._contiguous_runs([3, 4, 5, 10, 11, 0]) == [
+        (0, 3, 3),
+        (3, 10, 2),
+        (5, 0, 1),
+    ]
+    assert hdf5._contiguous_runs([]) == []
+
+
+def test_hdf_data_source_read(tmp_path: pathlib.Path):
+    time = datetime.datetime(2018, 1, 1, 6)
+    channels = ["a", "b", "c", "d", "e"]
+    create_hdf5(
+        tmp_path,
+        time.year,
+        10,
+        grid=grid.equiangular_lat_lon_grid(3, 4),
+        channels=channels,
+        zonal=True,
+    )
+    ds = hdf5.DataSource.from_path(tmp_path.as_posix())
+    assert isinstance(ds, base.ChannelSubsetDataSource)
+    expected = ds[time]
+
+    # channels are returned in the requested order
+    names = ["d", "e", "a", "c"]
+    array = ds.read(time, names)
+    np.testing.assert_array_equal(array, expected[[3, 4, 0, 2]])
+
+    out = np.zeros((4, 3), dtype=np.float64)
+    array = ds.read(time, names, out=out)
+    np.testing.assert_array_equal(out, expected[[3, 4, 0, 2], :, 0])
+
+    with pytest.raises(ValueError):
+        ds.read(time, names, out=np.zeros((3, 3)))
+
+    ds = hdf5.DataSource.from_path(tmp_path.as_posix(), channel_names=["a", "b"])
+    with pytest.raises(ValueError):
+        ds.read(time, ["c"])
@@ -98,3 +98,25 @@ def test_get_initial_conditions_for_model_history_correct_order(n):
     x = initial_conditions.get_initial_condition_for_model(Model, data_source, time)
     for i in range(Model.n_history_levels):
         assert x[0, -i - 1, 0, 0, 0] == -i
+
+
+def test_get_initial_conditions_for_model_zonal(tmp_path):
+    class Model:
+        in_channel_names = ["t2m", "t850"]
+        n_history_levels = 1
+        history_time_step = datetime.timedelta(hours=6)
+        grid = grid.equiangular_lat_lon_grid(5, 8)
+        device = "cpu"
+        dtype = torch.float
+
+    time = datetime.datetime(2018, 1, 1)
+    test_hdf5.create_hdf5(
+        tmp_path, time.year, 2, Model.grid, ["t850", "t2m"], zonal=True
+    )
+    data_source = hdf5.DataSource.from_path(tmp_path.as_posix())
+
+    x = initial_conditions.get_initial_condition_for_model(Model, data_source, time)
+    assert x.shape == (1, 1, 2, 5, 8)
+    assert x.is_contiguous()
+    expected = torch.tensor([5.0, 6, 7, 8, 9])
+    torch.testing.assert_close(x[0, 0, 0], expected[:, None].expand(5, 8))
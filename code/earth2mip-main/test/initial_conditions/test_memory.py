@@ -0,0 +1,102 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import numpy as np
+import pytest
+import torch
+
+from earth2mip import grid, inference_ensemble, networks
+from earth2mip.initial_conditions import base, get_data_from_source, memory
+
+
+def test_memory_data_source():
+    g = grid.equiangular_lat_lon_grid(3, 4)
+    data = torch.arange(2 * 2 * 3 * 4.0).reshape(2, 2, 3, 4)
+    ds = memory.DataSource(data, channel_names=["t850", "t2m"], grid=g)
+    assert isinstance(ds, base.DataSource)
+    assert not isinstance(ds, base.ChannelSubsetDataSource)
+    assert ds.times == [datetime.datetime(1970, 1, 1), datetime.datetime(1970, 1, 1, 6)]
+
+    array = ds[datetime.datetime(1970, 1, 1, 6)]
+    np.testing.assert_array_equal(array, data[1].numpy())
+
+    for time in [datetime.datetime(1970, 1, 1, 12), datetime.datetime(1970, 1, 1, 3)]:
+        with pytest.raises(KeyError):
+            ds[time]
+
+
+def test_memory_data_source_zonal():
+    g = grid.equiangular_lat_lon_grid(3, 4)
+    data = np.arange(2 * 3.0).reshape(1, 2, 3)
+    ds = memory.DataSource(data, channel_names=["t850", "t2m"], grid=g)
+    array = ds[datetime.datetime(1970, 1, 1)]
+    assert array.shape == (2, 3, 4)
+    assert array.strides[-1] == 0
+    np.testing.assert_array_equal(array[..., -1], data[0])
+
+
+def test_memory_data_source_tensor():
+    g = grid.equiangular_lat_lon_grid(3, 4)
+    data = torch.arange(2 * 2 * 3 * 4.0).reshape(2, 2, 3, 4)
+    ds = memory.DataSource(data, channel_names=["t850", "t2m"], grid=g)
+    array = ds[datetime.datetime(1970, 1, 1, 6)]
+    assert isinstance(array, torch.Tensor)
+    assert array.data_ptr() == data[1].data_ptr()
+
+    x = get_data_from_source(
+        ds, datetime.datetime(1970, 1, 1, 6), ["t2m", "t850"], g, 2, ds.time_step
+    )
+    assert x.shape == (1, 2, 2, 3, 4)
+    torch.testing.assert_close(x[0], data[:, [1, 0]])
+    # the source is not aliased
+    x.zero_()
+    assert data.sum() > 0
+
+
+def test_memory_data_source_tensor_zonal():
+    g = grid.equiangular_lat_lon_grid(3, 4)
+    data = torch.arange(2 * 3.0).reshape(1, 2, 3)
+    ds = memory.DataSource(data, channel_names=["t850", "t2m"], grid=g)
+    array = ds[datetime.datetime(1970, 1, 1)]
+    assert array.shape == (2, 3, 4)
+    assert array.stride(-1) == 0
+
+    x = get_data_from_source(ds, datetime.datetime(1970, 1, 1), ["t850", "t2m"], g, 1)
+    torch.testing.assert_close(x[0, 0], data[0, ..., None].expand(2, 3, 4))
+
+
+def test_memory_data_source_bad_shape():
+    g = grid.equiangular_lat_lon_grid(3, 4)
+    with pytest.raises(ValueError):
+        memory.DataSource(np.zeros((1, 2, 4, 3)), channel_names=["a", "b"], grid=g)
+
+
+def test_memory_data_source_run_basic_inference():
+    model = networks.Inference(
+        networks.Identity(),
+        center=np.zeros(3),
+        scale=np.ones(3),
+        grid=grid.equiangular_lat_lon_grid(5, 8),
+        channel_names=["a", "b", "c"],
+    )
+    data = np.random.rand(1, len(model.in_channel_names), model.grid.shape[0])
+    data_source = memory.DataSource(data, model.in_channel_names, model.grid)
+
+    time = datetime.datetime(1970, 1, 1)
+    ds = inference_ensemble.run_basic_inference(model, 2, data_source, time)
+    assert ds.shape == (3, 1, 3, *model.grid.shape)
+    np.testing.assert_allclose(ds[-1, 0, :, :, 0], data[0], rtol=1e-6)
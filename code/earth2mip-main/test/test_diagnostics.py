@@ -17,6 +17,7 @@
 import pathlib
 
 import netCDF4 as nc
+import numpy as np
 import pytest
 import torch
 
@@ -64,3 +65,121 @@ def test_diagnostic(cls: str, tmp_path: pathlib.Path):
             assert "tcwv" in ncfile["Test"].variables
         else:
             assert "tcwv" in ncfile["Test"][cls].variables
+
+
+def _run_statistic(type, tmp_path, data, batch_size, **kwargs):
+    n_ensemble, n_time = data.shape[:2]
+    grid = earth2mip.grid.equiangular_lat_lon_grid(4, 8)
+    domain = weather_events.Window(
+        name="Test",
+        diagnostics=[
+            weather_events.Diagnostic(type=type, channels=["b", "a"], **kwargs)
+        ],
+    )
+    path = tmp_path / "a.nc"
+    with nc.Dataset(path.as_posix(), "w") as ncfile:
+        total_diagnostics = netcdf.initialize_netcdf(
+            ncfile, [domain], grid, n_ensemble, torch.device("cpu"), ["a", "b"]
+        )
+        for batch_id in range(0, n_ensemble, batch_size):
+            for time_count in range(n_time):
+                batch = data[batch_id : batch_id + batch_size, time_count]
+                netcdf.update_netcdf(
+                    batch,
+                    total_diagnostics,
+                    [domain],
+                    batch_id,
+                    time_count,
+                    grid,
+                    ["a", "b"],
+                )
+        return {c: ncfile["Test"][type][c][:] for c in ["a", "b"]}
+
+
+@pytest.mark.parametrize(
+    "type, reduce",
+    [
+        ("ensemble_mean", lambda x: x.mean(0)),
+        ("ensemble_variance", lambda x: x.var(0, unbiased=False)),
+        ("ensemble_min", lambda x: x.amin(0)),
+        ("ensemble_max", lambda x: x.amax(0)),
+    ],
+)
+@pytest.mark.parametrize("batch_size", [1, 3, 7])
+def test_ensemble_statistic(type, reduce, batch_size, tmp_path):
+    torch.manual_seed(0)
+    data = 10 + torch.randn(7, 2, 2, 4, 8, dtype=torch.float64)
+    output = _run_statistic(type, tmp_path, data, batch_size)
+    expected = reduce(data)
+    np.testing.assert_allclose(output["a"], expected[:, 0])
+    np.testing.assert_allclose(output["b"], expected[:, 1])
+
+
+@pytest.mark.parametrize("n_ensemble", [3, 5, 6, 30, 31, 200])
+def test_ensemble_quantile(n_ensemble, tmp_path):
+    torch.manual_seed(0)
+    quantiles = [0.1, 0.5, 0.9]
+    data = torch.randn(n_ensemble, 2, 2, 4, 8, dtype=torch.float64)
+    output = _run_statistic(
+        "ensemble_quantile", tmp_path, data, batch_size=2, quantiles=quantiles
+    )
+    expected = torch.quantile(data, torch.tensor(quantiles, dtype=data.dtype), dim=0)
+    assert output["a"].shape == expected[:, :, 0].shape
+    output = np.stack([output["a"], output["b"]], 2)
+    # exact while the members take no more memory than the 5 P² markers of
+    # each quantile, with a height and a position each, approximate beyond
+    if n_ensemble <= 2 * 5 * len(quantiles):
+        np.testing.assert_allclose(output, expected, rtol=0, atol=1e-12)
+    else:
+        assert np.abs(output - expected.numpy()).mean() < 0.1
+
+
+def test_ensemble_quantile_bounds(tmp_path):
+    data = torch.randn(3, 1, 2, 4, 8, dtype=torch.float64)
+    with pytest.raises(ValueError, match="between 0 and 1"):
+        _run_statistic("ensemble_quantile", tmp_path, data, 1, quantiles=[0.0, 0.5])
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_histogram(batch_size, tmp_path):
+    torch.manual_seed(0)
+    data = torch.randn(9, 2, 2, 4, 8, dtype=torch.float64)
+    # a value on the closed right edge of the last bin
+    data[0, 0, 0, 0, 0] = 2
+    edges = [-2, -1, 0, 0.5, 2]
+    counts = _run_statistic("bin_count", tmp_path, data, batch_size, bin_edges=edges)
+    fraction = _run_statistic("histogram", tmp_path, data, batch_size, bin_edges=edges)
+
+    expected = np.apply_along_axis(lambda x: np.histogram(x, edges)[0], 0, data)
+    np.testing.assert_array_equal(counts["a"], expected[:, :, 0])
+    np.testing.assert_array_equal(counts["b"], expected[:, :, 1])
+    np.testing.assert_allclose(fraction["a"], expected[:, :, 0] / 9)
+
+
+def test_histogram_bin_range(tmp_path):
+    data = torch.linspace(0, 1, 5, dtype=torch.float64)
+    data = data.view(5, 1, 1, 1, 1).expand(5, 1, 2, 4, 8)
+    counts = _run_statistic("bin_count", tmp_path, data, 5, nbins=2, bin_range=(0, 1))
+    np.testing.assert_array_equal(counts["a"][:, 0, 0, 0], [2, 3])
+    with nc.Dataset((tmp_path / "a.nc").as_posix()) as ncfile:
+        np.testing.assert_array_equal(ncfile["Test/bin_count/bin_lower"][:], [0, 0.5])
+
+
+def test_histogram_needs_bins(tmp_path):
+    data = torch.zeros(2, 1, 2, 4, 8)
+    with pytest.raises(ValueError):
+        _run_statistic("histogram", tmp_path, data, 1)
+
+
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_exceedance_probability(batch_size, tmp_path):
+    torch.manual_seed(0)
+    data = torch.randn(6, 2, 2, 4, 8)
+    thresholds = [-1, 0, 1.5]
+    output = _run_statistic(
+        "exceedance_probability", tmp_path, data, batch_size, thresholds=thresholds
+    )
+    expected = torch.stack([(data > t).double().mean(0) for t in thresholds])
+    assert output["a"].shape == (3, 2, 4, 8)
+    np.testing.assert_allclose(output["a"], expected[:, :, 0], rtol=1e-6)
+    np.testing.assert_allclose(output["b"], expected[:, :, 1], rtol=1e-6)
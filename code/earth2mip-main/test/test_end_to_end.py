@@ -64,7 +64,8 @@ class get_data_source:
         return self.arr
 
 
-def test_inference_ensemble(tmp_path):
+@pytest.mark.parametrize("output_format", ["netcdf", "zarr"])
+def test_inference_ensemble(tmp_path, output_format):
     inference = persistence(package=None)
     data_source = get_data_source(inference)
     time = datetime.datetime(2018, 1, 1)
@@ -75,6 +76,7 @@ def test_inference_ensemble(tmp_path):
         weather_model="dummy",
         simulation_length=8,
         output_path=tmp_path.as_posix(),
+        output_format=output_format,
         weather_event=schema.WeatherEvent(
             properties=weather_events.WeatherEventProperties(
                 name="test", start_time=time
@@ -97,8 +99,13 @@ def test_inference_ensemble(tmp_path):
         inference, config, data_source=data_source, progress=True
     )
 
-    path = tmp_path / "ensemble_out_0.nc"
-    ds = xarray.open_dataset(path.as_posix(), decode_times=False)
+    if output_format == "zarr":
+        path = tmp_path / "ensemble_out.zarr"
+        ds = xarray.open_zarr(path.as_posix(), group="globe", decode_times=False)
+        assert ds.sizes["time"] == 9
+    else:
+        path = tmp_path / "ensemble_out_0.nc"
+        ds = xarray.open_dataset(path.as_posix(), decode_times=False)
     assert ds.time[0].item() == 0
     out = tmp_path / "out"
     score_ensemble_outputs.main(tmp_path.as_posix(), out.as_posix(), score=False)
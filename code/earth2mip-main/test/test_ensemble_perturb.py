@@ -19,8 +19,16 @@ import datetime
 import pytest
 import torch
 
-from earth2mip import networks
-from earth2mip.ensemble_utils import generate_bred_vector, generate_noise_correlated
+from earth2mip import grid, inference_ensemble, networks, schema
+from earth2mip.ensemble_utils import (
+    BredVectorEngine,
+    EnsembleBatches,
+    MemberRNG,
+    generate_bred_vector,
+    generate_noise_correlated,
+    generate_noise_grf,
+    get_grf_sampler,
+)
 from earth2mip.schema import Grid
 
 
@@ -81,3 +89,143 @@ def test_bred_vector():
     assert noise.device == x.device
     assert noise.shape == x.shape
     assert not torch.any(torch.isnan(noise))
+
+
+def test_ensemble_batches():
+    x = torch.randn(1, 1, 2, 3, 4)
+    batches = EnsembleBatches(x, n_ensemble=5, batch_size=2)
+    assert len(batches) == 3
+    sizes = []
+    for batch_id, batch in batches:
+        sizes.append(len(batch))
+        torch.testing.assert_close(batch, x.expand_as(batch))
+        # perturbing in place leaves the base initial condition unchanged
+        batch += 1
+    assert sizes == [2, 2, 1]
+
+
+@pytest.mark.parametrize("strategy", ["gaussian", "correlated"])
+def test_perturb_independent_of_batch_size(strategy):
+    model = networks.Inference(
+        Dummy(),
+        center=[0, 0],
+        scale=[1, 1],
+        grid=Grid.grid_720x1440,
+        channel_names=["t850", "z500"],
+    )
+    config = schema.EnsembleRun(
+        weather_model="unused",
+        simulation_length=1,
+        perturbation_strategy=strategy,
+        ensemble_members=4,
+        weather_event={
+            "properties": {"name": "test", "start_time": "2018-01-01T00:00:00"},
+            "domains": [],
+        },
+        output_path="unused",
+    )
+    perturb = inference_ensemble.get_initializer(model, config)
+    x = torch.zeros(1, 1, 2, 8, 16)
+
+    def run(batch_size):
+        return torch.cat(
+            [
+                perturb(batch, 0, batch_id, "cpu").clone()
+                for batch_id, batch in EnsembleBatches(x, 4, batch_size)
+            ]
+        )
+
+    members = run(1)
+    torch.testing.assert_close(members, run(3))
+    # members 2 and 3 run by another rank
+    other_rank = perturb(x.repeat(2, 1, 1, 1, 1), 1, 2, "cpu")
+    torch.testing.assert_close(members[2:], other_rank)
+    # the first member is the unperturbed control
+    assert torch.all(members[0] == 0)
+    assert torch.all(members[1:].std(dim=(1, 3, 4)) > 0)
+
+
+def test_member_rng():
+    rng = MemberRNG(seed=1)
+    noise = rng.randn(range(4), (3, 5))
+    assert noise.shape == (4, 3, 5)
+    torch.testing.assert_close(noise[2:], rng.randn([2, 3], (3, 5)))
+    assert not torch.equal(noise, MemberRNG(seed=2).randn(range(4), (3, 5)))
+
+
+def test_bred_vector_members():
+    model = networks.Inference(
+        Dummy(),
+        center=[0, 0],
+        scale=[1, 1],
+        grid=Grid.grid_720x1440,
+        channel_names=["a", "b"],
+    )
+    rng = MemberRNG(seed=1)
+    x = torch.rand([1, 1, 2, 5, 6]).repeat(4, 1, 1, 1, 1)
+    kwargs = dict(
+        noise_amplitude=0.01,
+        time=datetime.datetime(2018, 1, 1),
+        integration_steps=3,
+        rng=rng,
+    )
+    noise = generate_bred_vector(x, model, members=range(4), **kwargs)
+    last = generate_bred_vector(x[2:], model, members=[2, 3], **kwargs)
+    torch.testing.assert_close(noise[2:] / noise[2:].norm(), last / last.norm())
+
+
+@pytest.mark.parametrize("nlat", [32, 33])
+def test_generate_noise_grf(nlat):
+    output_grid = grid.equiangular_lat_lon_grid(nlat, 64)
+    kwargs = dict(grid=output_grid, alpha=2.0, sigma=5.0, tau=2.0)
+    sampler = get_grf_sampler(output_grid, alpha=2.0, tau=2.0, sigma=5.0)
+    assert sampler is get_grf_sampler(output_grid, alpha=2.0, tau=2.0, sigma=5.0)
+
+    rng = MemberRNG(seed=1)
+    shape = (3, 1, 2, nlat, 64)
+    noise = generate_noise_grf(shape, rng=rng, members=range(3), **kwargs)
+    assert noise.shape == shape
+    assert torch.all(noise.std(dim=(-2, -1)) > 0)
+    chunked = generate_noise_grf(
+        shape, rng=rng, members=range(3), chunk_size=1, **kwargs
+    )
+    torch.testing.assert_close(noise, chunked)
+    last = generate_noise_grf((1,) + shape[1:], rng=rng, members=[2], **kwargs)
+    torch.testing.assert_close(noise[2:], last)
+
+
+class CountingDummy(Dummy):
+    def __init__(self):
+        super().__init__()
+        self.batch_sizes = []
+
+    def forward(self, x, time):
+        self.batch_sizes.append(x.shape[0])
+        return super().forward(x, time)
+
+
+def test_bred_vector_engine(tmp_path):
+    network = CountingDummy()
+    model = networks.Inference(
+        network,
+        center=[0, 0],
+        scale=[1, 2],
+        grid=Grid.grid_720x1440,
+        channel_names=["a", "b"],
+    )
+    time = datetime.datetime(2018, 1, 1)
+    engine = BredVectorEngine(
+        model, [0.1, 0.2], integration_steps=3, checkpoint_dir=tmp_path.as_posix()
+    )
+    x = torch.rand([1, 1, 2, 5, 6]).repeat(3, 1, 1, 1, 1)
+    dz = engine(x, time, rng=MemberRNG(seed=1), members=range(3))
+
+    # one batched step per cycle, with the control in the first
+    assert network.batch_sizes == [4, 3, 3]
+    rms = dz.pow(2).mean(dim=(-2, -1)).sqrt()
+    torch.testing.assert_close(rms, torch.tensor([0.1, 0.2]).expand(3, 1, 2))
+    assert (tmp_path / "bred_vector_2.pt").exists()
+
+    # the saved vectors start the next breeding
+    engine.integration_steps = 0
+    torch.testing.assert_close(engine(x, time, members=range(3)), dz)
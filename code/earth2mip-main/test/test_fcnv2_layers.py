@@ -0,0 +1,116 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import importlib.util
+import sys
+import time
+import types
+from unittest import mock
+
+import pytest
+import torch
+import torch_harmonics as th
+
+
+def _import_layers():
+    """Import the fcnv2 layers, which need neither apex nor ruamel.yaml
+
+    The fcnv2 package imports both, so stand-ins for the missing ones are only
+    installed while importing. They and the fcnv2 modules imported with them
+    are removed from ``sys.modules`` afterwards.
+    """
+    normalization = types.ModuleType("apex.normalization")
+    normalization.FusedLayerNorm = torch.nn.LayerNorm
+    yaml = types.ModuleType("ruamel.yaml")
+    yaml.YAML = object
+
+    stand_ins = {}
+    for package, module in [("apex", normalization), ("ruamel", yaml)]:
+        if importlib.util.find_spec(package) is None:
+            stand_ins[package] = types.ModuleType(package)
+            stand_ins[module.__name__] = module
+    with mock.patch.dict(sys.modules, stand_ins):
+        from earth2mip.networks.fcnv2 import layers
+
+    return layers
+
+
+SpectralConvS2 = _import_layers().SpectralConvS2
+
+
+def _spectral_conv_pair(nlat, nlon, hidden_size, lmax=None, mmax=None, **kwargs):
+    forward = th.RealSHT(nlat, nlon, lmax=lmax, mmax=mmax, grid="equiangular")
+    inverse = th.InverseRealSHT(
+        nlat, nlon, lmax=forward.lmax, mmax=forward.mmax, grid="equiangular"
+    )
+    torch.manual_seed(0)
+    conv = SpectralConvS2(forward, inverse, hidden_size, **kwargs)
+    buffered = SpectralConvS2(
+        forward, inverse, hidden_size, work_buffers=True, **kwargs
+    )
+    buffered.load_state_dict(conv.state_dict())
+    return conv, buffered
+
+
+@pytest.mark.parametrize(
+    "lmax, mmax, kwargs",
+    [
+        (None, None, {}),
+        (6, 3, {"sparsity_threshold": 0.01}),
+        (None, None, {"use_complex_kernels": True}),
+        (None, None, {"compression": "tt", "rank": 4}),
+    ],
+)
+def test_spectral_conv_s2_work_buffers(lmax, mmax, kwargs):
+    conv, buffered = _spectral_conv_pair(16, 32, 4, lmax, mmax, **kwargs)
+
+    with torch.no_grad():
+        for batch_size in [2, 2, 3]:
+            x = torch.randn(batch_size, 4, 16, 32)
+            torch.testing.assert_close(buffered(x), conv(x))
+
+
+def test_spectral_conv_s2_work_buffers_batch_of_one():
+    conv, buffered = _spectral_conv_pair(32, 64, 4)
+
+    x = torch.randn(1, 4, 32, 64)
+    with torch.no_grad():
+        torch.testing.assert_close(buffered(x), conv(x))
+
+
+def test_spectral_conv_s2_work_buffers_not_used_with_grad():
+    _, buffered = _spectral_conv_pair(16, 32, 4)
+    x = torch.randn(1, 4, 16, 32)
+    buffered(x).sum().backward()
+    assert not buffered._buffers_by_shape
+
+
+@pytest.mark.slow
+def test_spectral_conv_s2_benchmark():
+    """Micro-benchmark of a 721x1440 forward on the CPU, run with -s"""
+    conv, buffered = _spectral_conv_pair(721, 1440, 16, lmax=180, mmax=180)
+    x = torch.randn(1, 16, 721, 1440)
+
+    def bench(f, n=3):
+        f(x)
+        start = time.perf_counter()
+        for _ in range(n):
+            f(x)
+        return (time.perf_counter() - start) / n
+
+    with torch.no_grad():
+        default = bench(conv)
+        reused = bench(buffered)
+    print(f"SpectralConvS2 721x1440: {default:.3f}s default, {reused:.3f}s buffered")
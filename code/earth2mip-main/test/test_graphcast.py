@@ -23,6 +23,7 @@ from earth2mip.model_registry import Package
 from earth2mip.networks import graphcast
 from earth2mip.networks.graphcast import get_channel_names, get_forcings
 from earth2mip.time_loop import TimeStepperLoop
+from earth2mip.zenith_angle import CosZenith
 
 
 def test_get_forcings():
@@ -54,6 +55,18 @@ def test_get_forcings_jax():
         assert v.device() == lat.device()
 
 
+def test_get_forcings_solar_provider():
+    time = np.array([[np.datetime64("2018-01-01T00:00:00")]])
+    lat = np.arange(-90, 90)
+    lon = np.arange(0, 360)
+    solar = CosZenith(lat[:, None], lon[None, :])
+    f = get_forcings(time, lat, lon, solar)
+    expected = get_forcings(time, lat, lon)
+    np.testing.assert_array_equal(
+        f["toa_incident_solar_radiation"], expected["toa_incident_solar_radiation"]
+    )
+
+
 def test_get_channel_names():
     names = get_channel_names(
         [
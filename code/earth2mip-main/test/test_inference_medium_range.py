@@ -0,0 +1,160 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+
+import numpy as np
+import pytest
+import torch
+
+from earth2mip import forecast_metrics_io, grid, inference_medium_range, networks
+from earth2mip.initial_conditions import memory
+
+
+def _model_and_data_source(n_times):
+    model = networks.Inference(
+        networks.Identity(),
+        center=np.zeros(3),
+        scale=np.ones(3),
+        grid=grid.equiangular_lat_lon_grid(5, 8),
+        channel_names=["a", "b", "c"],
+    )
+    shape = (n_times, len(model.in_channel_names), *model.grid.shape)
+    data = np.random.rand(*shape).astype(np.float32)
+    data_source = memory.DataSource(data, model.in_channel_names, model.grid)
+    return model, data_source
+
+
+@pytest.mark.parametrize("lookahead", [0, 1, 3])
+def test_verification_reader(lookahead):
+    model, data_source = _model_and_data_source(6)
+    times = data_source.times[1:] + data_source.times[:2]
+    reader = inference_medium_range.VerificationReader(
+        data_source,
+        times,
+        channel_names=["c", "a"],
+        grid=model.grid,
+        device="cpu",
+        lookahead=lookahead,
+    )
+    out = list(reader)
+    assert [time for time, _ in out] == times
+    for time, data in out:
+        assert data.shape == (1, 2, *model.grid.shape)
+        np.testing.assert_array_equal(data[0].numpy(), data_source[time][[2, 0]])
+
+    # stopping early is fine
+    for _ in zip(range(2), reader):
+        pass
+
+
+def test_save_scores_lookahead(tmp_path):
+    model, data_source = _model_and_data_source(8)
+    initial_times = data_source.times[:3]
+    time_mean = np.zeros((3, *model.grid.shape))
+    series = {}
+    for lookahead in [0, 2]:
+        output = tmp_path / str(lookahead)
+        inference_medium_range.save_scores(
+            model,
+            n=4,
+            initial_times=initial_times,
+            data_source=data_source,
+            time_mean=time_mean,
+            output_directory=output.as_posix(),
+            device="cpu",
+            lookahead=lookahead,
+        )
+        series[lookahead] = forecast_metrics_io.read_metrics(output.as_posix())
+
+    assert len(series[0]) == len(initial_times) * 5 * 3 * 4
+    assert series[0].equals(series[2])
+
+
+def test_verification_cache():
+    cache = inference_medium_range.VerificationCache(max_bytes=2 * 4 * 10)
+    times = [datetime.datetime(2018, 1, 1, h) for h in range(4)]
+    for time in times[:2]:
+        cache.put(time, torch.zeros(10))
+    assert cache.nbytes == 80
+    assert cache.get(times[0]) is not None
+
+    # evicts the least recently used
+    cache.put(times[2], torch.zeros(10))
+    assert times[1] not in cache
+    assert times[0] in cache
+    assert cache.nbytes == 80
+
+    # too big to cache
+    cache.put(times[3], torch.zeros(30))
+    assert times[3] not in cache
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_verification_cache_budget():
+    times = [datetime.datetime(2018, 1, 1, h) for h in range(4)]
+    # sized from the first field
+    cache = inference_medium_range.VerificationCache(min_fields=3)
+    for time in times:
+        cache.put(time, torch.zeros(10))
+    assert cache.max_bytes == 3 * 4 * 10
+    assert len(cache) == 3
+
+    cache = inference_medium_range.VerificationCache(2 * 4 * 10, min_fields=3)
+    with pytest.warns(UserWarning, match="fewer than 3 fields"):
+        cache.put(times[0], torch.zeros(10))
+
+
+class CountingDataSource:
+    def __init__(self, data_source):
+        self.data_source = data_source
+        self.grid = data_source.grid
+        self.channel_names = data_source.channel_names
+        self.reads = []
+
+    def __getitem__(self, time):
+        self.reads.append(time)
+        return self.data_source[time]
+
+
+def test_save_scores_cache(tmp_path):
+    model, data_source = _model_and_data_source(8)
+    data_source = CountingDataSource(data_source)
+    initial_times = data_source.data_source.times[:4]
+    time_mean = np.zeros((3, *model.grid.shape))
+    series = {}
+    reads = {}
+    for cache_bytes in [0, None]:
+        data_source.reads = []
+        output = tmp_path / str(cache_bytes)
+        inference_medium_range.save_scores(
+            model,
+            n=4,
+            initial_times=initial_times,
+            data_source=data_source,
+            time_mean=time_mean,
+            output_directory=output.as_posix(),
+            device="cpu",
+            cache_bytes=cache_bytes,
+        )
+        series[cache_bytes] = forecast_metrics_io.read_metrics(output.as_posix())
+        reads[cache_bytes] = sorted(data_source.reads)
+
+    # initial conditions and each distinct valid time are read once
+    assert reads[None] == sorted(initial_times + data_source.data_source.times)
+    # without the cache the valid times shared by forecasts are read again
+    assert len(reads[0]) > len(reads[None])
+    assert series[0].equals(series[None])
@@ -14,12 +14,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
+
 import netCDF4 as nc
+import numpy as np
+import pytest
 import torch
+import xarray
+import zarr
 
 import earth2mip.grid
-from earth2mip import netcdf
-from earth2mip.weather_events import Diagnostic, Window
+from earth2mip import netcdf, zarr_output
+from earth2mip.weather_events import Diagnostic, MultiPoint, OutputEncoding, Window
 
 
 def test_initialize_netcdf(tmp_path):
@@ -41,3 +47,257 @@ def test_initialize_netcdf(tmp_path):
             n_ensemble,
             torch.device(type="cpu"),
         )
+
+
+def test_async_netcdf_writer(tmp_path):
+    domain = Window(
+        name="globe",
+        diagnostics=[Diagnostic(type="raw", function="", channels=["b", "a"])],
+    )
+    grid = earth2mip.grid.equiangular_lat_lon_grid(3, 4)
+    n_ensemble = 4
+    data = torch.randn(n_ensemble, 3, 2, *grid.shape)
+    time = datetime.datetime(2018, 1, 1)
+
+    path = tmp_path / "a.nc"
+    with nc.Dataset(path.as_posix(), "w") as ncfile:
+        diagnostics = netcdf.initialize_netcdf(
+            ncfile, [domain], grid, n_ensemble, torch.device("cpu")
+        )
+        ncfile["time"].units = "hours since 2018-01-01 00:00:00"
+        with netcdf.AsyncNetCDFWriter(
+            ncfile, diagnostics, [domain], grid, ["a", "b"], max_queue=1
+        ) as writer:
+            for batch_id in [0, 2]:
+                for k in range(3):
+                    step = data[batch_id : batch_id + 2, k].clone()
+                    writer.write(
+                        step, batch_id, k, time + k * datetime.timedelta(hours=6)
+                    )
+                    # the writer has its own copy
+                    step.zero_()
+        assert writer.n_writes == 6
+        assert writer.max_queue_depth <= 1
+
+    with nc.Dataset(path.as_posix()) as ncfile:
+        np.testing.assert_array_equal(ncfile["time"][:], [0, 6, 12])
+        np.testing.assert_allclose(ncfile["globe"]["a"][:], data[:, :, 0].numpy())
+        np.testing.assert_allclose(ncfile["globe"]["b"][:], data[:, :, 1].numpy())
+
+
+def test_zarr_output_ranks_share_store(tmp_path):
+    grid = earth2mip.grid.equiangular_lat_lon_grid(5, 8)
+    domains = [
+        Window(
+            name="tropics",
+            lat_min=-45,
+            lat_max=45,
+            diagnostics=[Diagnostic(type="raw", channels=["b"])],
+        ),
+        MultiPoint(
+            type="MultiPoint",
+            name="points",
+            lat=[90.0, 0.0],
+            lon=[0.0, 90.0],
+            diagnostics=[Diagnostic(type="raw", channels=["a", "b"])],
+        ),
+    ]
+    time = datetime.datetime(2018, 1, 1)
+    times = [time + k * datetime.timedelta(hours=6) for k in range(3)]
+    n_ranks, n_per_rank = 2, 2
+    data = torch.randn(n_ranks * n_per_rank, len(times), 2, *grid.shape)
+
+    path = (tmp_path / "out.zarr").as_posix()
+    zarr_output.initialize_zarr(
+        zarr.open_group(path, mode="w"),
+        domains,
+        grid,
+        n_ensemble=n_ranks * n_per_rank,
+        times=times,
+        chunks={"ensemble": 1, "time": 1},
+        compressor=zarr_output.get_compressor("zstd"),
+    )
+    for rank in range(n_ranks):
+        root = zarr.open_group(path, mode="r+")
+        offset = rank * n_per_rank
+        with zarr_output.AsyncZarrWriter(
+            root, domains, grid, ["a", "b"], ensemble_offset=offset
+        ) as writer:
+            for k, valid_time in enumerate(times):
+                writer.write(data[offset : offset + n_per_rank, k], 0, k, valid_time)
+
+    tropics = xarray.open_zarr(path, group="tropics")
+    assert tropics.b.dims == ("ensemble", "time", "lat", "lon")
+    np.testing.assert_array_equal(tropics.lat, [45, 0, -45])
+    np.testing.assert_array_equal(tropics.time, np.array(times, dtype="M8[ns]"))
+    np.testing.assert_array_equal(tropics.b, data[:, :, 1, 1:4].numpy())
+    assert tropics.b.encoding["chunks"] == (1, 1, 3, 8)
+
+    points = xarray.open_zarr(path, group="points")
+    assert points.a.dims == ("ensemble", "time", "npoints")
+    np.testing.assert_array_equal(points.a, data[:, :, 0, [0, 2], [0, 2]].numpy())
+
+
+def test_initialize_zarr_rejects_statistics(tmp_path):
+    grid = earth2mip.grid.equiangular_lat_lon_grid(5, 8)
+    domain = Window(
+        name="globe",
+        diagnostics=[Diagnostic(type="ensemble_mean", channels=["a"])],
+    )
+    root = zarr.open_group((tmp_path / "out.zarr").as_posix(), mode="w")
+    with pytest.raises(ValueError, match="ensemble_mean"):
+        zarr_output.initialize_zarr(
+            root, [domain], grid, 1, times=[datetime.datetime(2018, 1, 1)]
+        )
+
+
+def test_async_zarr_writer_copies_selection(tmp_path):
+    grid = earth2mip.grid.equiangular_lat_lon_grid(5, 8)
+    domain = Window(
+        name="tropics",
+        lat_min=-45,
+        lat_max=45,
+        diagnostics=[Diagnostic(type="raw", channels=["c", "a"])],
+    )
+    root = zarr.open_group((tmp_path / "out.zarr").as_posix(), mode="w")
+    zarr_output.initialize_zarr(
+        root, [domain], grid, 1, times=[datetime.datetime(2018, 1, 1)]
+    )
+    writer = zarr_output.AsyncZarrWriter(root, [domain], grid, ["a", "b", "c"])
+    data = torch.randn(1, 3, *grid.shape)
+    with writer:
+        (selected,) = writer._select(data, 0, 0)
+        # only the window of the saved channels is copied to the host
+        assert selected.shape == (1, 2, 3, 8)
+        writer.write(data, 0, 0, datetime.datetime(2018, 1, 1))
+
+    np.testing.assert_array_equal(root["tropics"]["c"][0, 0], data[0, 2, 1:4])
+    np.testing.assert_array_equal(root["tropics"]["a"][0, 0], data[0, 0, 1:4])
+
+
+def test_update_netcdf_selects_domain(tmp_path):
+    grid = earth2mip.grid.equiangular_lat_lon_grid(5, 8)
+    domains = [
+        Window(
+            name="tropics",
+            lat_min=-45,
+            lat_max=45,
+            diagnostics=[Diagnostic(type="raw", channels=["c", "a"])],
+        ),
+        MultiPoint(
+            type="MultiPoint",
+            name="points",
+            lat=[90.0, 0.0],
+            lon=[0.0, 90.0],
+            diagnostics=[Diagnostic(type="raw", channels=["b"])],
+        ),
+    ]
+    data = torch.randn(2, 3, *grid.shape)
+    path = tmp_path / "a.nc"
+    with nc.Dataset(path.as_posix(), "w") as ncfile:
+        diagnostics = netcdf.initialize_netcdf(
+            ncfile,
+            domains,
+            grid,
+            2,
+            torch.device("cpu"),
+            channel_names_of_data=["a", "b", "c"],
+        )
+        netcdf.update_netcdf(data, diagnostics, domains, 0, 0, grid, ["a", "b", "c"])
+
+    with nc.Dataset(path.as_posix()) as ncfile:
+        tropics = ncfile["tropics"]
+        np.testing.assert_allclose(tropics["c"][:, 0], data[:, 2, 1:4].numpy())
+        np.testing.assert_allclose(tropics["a"][:, 0], data[:, 0, 1:4].numpy())
+        np.testing.assert_allclose(
+            ncfile["points"]["b"][:, 0], data[:, 1, [0, 2], [0, 2]].numpy()
+        )
+
+
+@pytest.mark.parametrize(
+    "encoding, dtype, atol",
+    [
+        (OutputEncoding(), np.float64, 0),
+        (OutputEncoding(dtype="float32", compression="zstd"), np.float32, 0),
+        (
+            OutputEncoding(dtype="int16", scale_factor=0.01, add_offset=1),
+            np.int16,
+            0.005,
+        ),
+        (
+            OutputEncoding(dtype="float32", compression="zlib", significant_bits=8),
+            np.float32,
+            0.02,
+        ),
+        (
+            OutputEncoding(least_significant_digit=2, compression="zlib"),
+            np.float64,
+            0.01,
+        ),
+    ],
+)
+def test_netcdf_encoding(tmp_path, encoding, dtype, atol):
+    grid = earth2mip.grid.equiangular_lat_lon_grid(5, 8)
+    domain = Window(
+        name="globe",
+        diagnostics=[Diagnostic(type="raw", channels=["a"], encoding=encoding)],
+    )
+    data = torch.rand(1, 1, *grid.shape)
+    path = tmp_path / "a.nc"
+    with nc.Dataset(path.as_posix(), "w") as ncfile:
+        diagnostics = netcdf.initialize_netcdf(
+            ncfile, [domain], grid, 1, torch.device("cpu"), ["a"]
+        )
+        netcdf.update_netcdf(data, diagnostics, [domain], 0, 0, grid, ["a"])
+
+    with nc.Dataset(path.as_posix()) as ncfile:
+        variable = ncfile["globe"]["a"]
+        assert variable.dtype == dtype
+        np.testing.assert_allclose(variable[0, 0], data[0, 0].numpy(), atol=atol)
+
+
+def test_netcdf_encoding_float16_unsupported(tmp_path):
+    domain = Window(
+        name="globe",
+        diagnostics=[
+            Diagnostic(
+                type="raw", channels=["a"], encoding=OutputEncoding(dtype="float16")
+            )
+        ],
+    )
+    with nc.Dataset((tmp_path / "a.nc").as_posix(), "w") as ncfile:
+        with pytest.raises(ValueError):
+            netcdf.initialize_netcdf(
+                ncfile,
+                [domain],
+                earth2mip.grid.equiangular_lat_lon_grid(5, 8),
+                1,
+                torch.device("cpu"),
+            )
+
+
+@pytest.mark.parametrize(
+    "encoding, dtype, atol",
+    [
+        (OutputEncoding(dtype="float16", compression="zlib"), np.float16, 1e-3),
+        (OutputEncoding(dtype="int16", scale_factor=0.01), np.float32, 0.005),
+        (OutputEncoding(significant_bits=8, compression="zstd"), np.float32, 0.02),
+    ],
+)
+def test_zarr_encoding(tmp_path, encoding, dtype, atol):
+    grid = earth2mip.grid.equiangular_lat_lon_grid(5, 8)
+    domain = Window(
+        name="globe",
+        diagnostics=[Diagnostic(type="raw", channels=["a"], encoding=encoding)],
+    )
+    data = torch.rand(1, 1, *grid.shape)
+    path = (tmp_path / "out.zarr").as_posix()
+    root = zarr.open_group(path, mode="w")
+    zarr_output.initialize_zarr(
+        root, [domain], grid, 1, times=[datetime.datetime(2018, 1, 1)]
+    )
+    zarr_output.update_zarr(root, data, [domain], 0, 0, grid, ["a"])
+
+    array = zarr.open_group(path)["globe"]["a"]
+    assert array.dtype == dtype
+    np.testing.assert_allclose(array[0, 0], data[0, 0].numpy(), atol=atol)
@@ -17,11 +17,12 @@
 import datetime
 
 import numpy as np
+import pytest
 import torch
 import torch.nn
 
 import earth2mip.grid
-from earth2mip import networks
+from earth2mip import networks, time_loop
 
 
 class Identity(torch.nn.Module):
@@ -60,3 +61,57 @@ def test_inference_run_with_restart():
             break
 
     np.testing.assert_array_equal(final_state.numpy(), state.numpy())
+
+
+def test_inference_lazy_output():
+    model = networks.Inference(
+        Identity(),
+        center=[1, 2],
+        scale=[3, 4],
+        grid=earth2mip.grid.equiangular_lat_lon_grid(5, 6),
+        channel_names=["a", "b"],
+    )
+    x = torch.randn([2, 1, 2, 5, 6])
+    time = datetime.datetime(2018, 1, 1)
+    out = torch.empty([2, 2, 5, 6])
+    for k, ((t, expected, _), (lazy_t, lazy, _)) in enumerate(
+        zip(model(time, x), model(time, x, lazy=True))
+    ):
+        assert t == lazy_t
+        assert lazy.shape == expected.shape
+        torch.testing.assert_close(lazy.materialize(), expected)
+        assert lazy.materialize(out=out) is out
+        torch.testing.assert_close(out, expected)
+        if k == 2:
+            break
+
+
+@pytest.mark.parametrize("save_every", [1, 3])
+def test_inference_rollout(save_every):
+    model = networks.Inference(
+        Identity(),
+        center=[1, 2],
+        scale=[3, 4],
+        grid=earth2mip.grid.equiangular_lat_lon_grid(5, 6),
+        channel_names=["a", "b"],
+    )
+    x = torch.randn([2, 1, 2, 5, 6])
+    time = datetime.datetime(2018, 1, 1)
+    expected = []
+    for k, (_, output, _) in enumerate(model(time, x)):
+        if k % save_every == 0:
+            expected.append(output)
+        if k == 7:
+            break
+    expected = torch.stack(expected)
+
+    output = model.rollout(x, time, 7, save_every=save_every)
+    torch.testing.assert_close(output, expected)
+
+    # the default of the time loop protocol, into a given buffer
+    out = torch.empty_like(expected)
+    assert time_loop.TimeLoop.rollout(model, x, time, 7, save_every, out=out) is out
+    torch.testing.assert_close(out, expected)
+
+    with pytest.raises(ValueError):
+        model.rollout(x, time, 7, save_every=0)
@@ -16,6 +16,9 @@
 
 import json
 
+import pydantic
+import pytest
+
 from earth2mip import schema
 
 
@@ -29,3 +32,29 @@ def test_model():
     )
     loaded = json.loads(obj.json())
     assert loaded
+
+
+@pytest.mark.parametrize("type", ["raw", "ensemble_mean"])
+def test_ensemble_run_zarr_diagnostics(type):
+    weather_event = {
+        "properties": {"name": "test", "start_time": "2018-01-01 00:00:00"},
+        "domains": [
+            {
+                "type": "Window",
+                "name": "globe",
+                "diagnostics": [{"type": type, "channels": ["t2m"]}],
+            }
+        ],
+    }
+    config = dict(
+        weather_model="fcn",
+        simulation_length=1,
+        weather_event=weather_event,
+        output_format="zarr",
+    )
+    if type == "raw":
+        schema.EnsembleRun.parse_obj(config)
+    else:
+        with pytest.raises(pydantic.ValidationError, match="not supported by the zarr"):
+            schema.EnsembleRun.parse_obj(config)
+        schema.EnsembleRun.parse_obj({**config, "output_format": "netcdf"})
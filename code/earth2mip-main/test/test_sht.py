@@ -0,0 +1,101 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+import torch
+import torch_harmonics as th
+
+from earth2mip import config, sht
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    sht.clear_cache()
+    yield
+    sht.clear_cache()
+
+
+def test_get_sht_matches_torch_harmonics():
+    x = torch.randn(2, 8, 16)
+    forward = sht.get_sht(8, 16, grid="legendre-gauss")
+    inverse = sht.get_inverse_sht(8, 16, grid="legendre-gauss")
+    assert isinstance(forward, th.RealSHT)
+    assert isinstance(inverse, th.InverseRealSHT)
+
+    expected = th.RealSHT(8, 16, grid="legendre-gauss")(x)
+    torch.testing.assert_close(forward(x), expected)
+    torch.testing.assert_close(
+        inverse(expected), th.InverseRealSHT(8, 16, grid="legendre-gauss")(expected)
+    )
+
+
+def test_get_sht_shares_tables():
+    a = sht.get_sht(8, 16)
+    b = sht.get_sht(8, 16)
+    assert a is not b
+    assert a.weights is b.weights
+    assert sht.get_sht(8, 16, norm="backward").weights is not a.weights
+    assert sht.get_sht(8, 16, dtype=torch.float64).weights.dtype == torch.float64
+
+
+def test_get_sht_to_plan_device_keeps_table():
+    # a model built with the transforms on its device moves without copying them
+    model = torch.nn.Sequential(sht.get_sht(8, 16, device="cpu")).to("cpu")
+    assert model[0].weights is sht.get_sht(8, 16, device="cpu").weights
+
+
+def test_get_sht_scale():
+    a = sht.get_sht(8, 16)
+    b = sht.get_sht(8, 16, scale=1e5)
+    torch.testing.assert_close(b.weights, a.weights * 1e5)
+
+    a = sht.get_inverse_sht(8, 16)
+    b = sht.get_inverse_sht(8, 16, scale=1e5)
+    torch.testing.assert_close(b.pct, a.pct / 1e5)
+
+
+def test_get_sht_modifications_are_not_shared():
+    a = sht.get_sht(8, 16)
+    weights = a.weights
+    a.weights = a.weights * 2
+    a.to(torch.float64)
+    b = sht.get_sht(8, 16)
+    assert b.weights is weights
+    assert b.weights.dtype == torch.float32
+
+
+@pytest.mark.parametrize("get", [sht.get_sht, sht.get_inverse_sht])
+def test_get_sht_persistent(tmp_path, monkeypatch, get):
+    monkeypatch.setattr(config, "LOCAL_CACHE", tmp_path.as_posix())
+    monkeypatch.setattr(config, "SHT_CACHE", True)
+    a = get(8, 16, grid="legendre-gauss", scale=2.0)
+    (path,) = (tmp_path / "sht").iterdir()
+    # only the table and plain attributes are saved
+    assert set(torch.load(path, weights_only=True)) == {"table", "attributes"}
+
+    sht.clear_cache()
+    b = get(8, 16, grid="legendre-gauss", scale=2.0)
+    assert type(b) is type(a)
+    assert b.extra_repr() == a.extra_repr()
+    for buffer in a._buffers:
+        assert getattr(b, buffer) is not getattr(a, buffer)
+        torch.testing.assert_close(getattr(b, buffer), getattr(a, buffer))
+
+    if get is sht.get_sht:
+        x = torch.randn(2, 8, 16)
+    else:
+        x = torch.randn(2, a.lmax, a.mmax, dtype=torch.complex64)
+    torch.testing.assert_close(b(x), a(x))
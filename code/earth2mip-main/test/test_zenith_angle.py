@@ -0,0 +1,99 @@
+# SPDX-FileCopyrightText: Copyright (c) 2023 NVIDIA CORPORATION & AFFILIATES.
+# SPDX-FileCopyrightText: All rights reserved.
+# SPDX-License-Identifier: Apache-2.0
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import datetime
+import warnings
+
+import numpy as np
+import torch
+from modulus.utils import zenith_angle
+
+import earth2mip.grid
+from earth2mip.networks import CosZenWrapper
+from earth2mip.zenith_angle import CosZenith
+
+grid = earth2mip.grid.equiangular_lat_lon_grid(19, 36)
+times = [
+    datetime.datetime(2018, 1, 1) + datetime.timedelta(hours=6 * i) for i in range(5)
+]
+
+
+def test_cos_zenith_batch_of_times():
+    provider = CosZenith.from_grid(grid)
+    lon, lat = np.meshgrid(grid.lon, grid.lat)
+    expected = np.stack([zenith_angle.cos_zenith_angle(t, lon, lat) for t in times])
+
+    out = provider(times)
+    assert out.shape == (len(times), *grid.shape)
+    np.testing.assert_allclose(out.numpy(), expected, atol=1e-5)
+    np.testing.assert_allclose(provider(times[1]).numpy(), expected[1], atol=1e-5)
+
+
+def test_cos_zenith_time_types_agree():
+    provider = CosZenith.from_grid(grid)
+    expected = provider(times)
+    datetime64 = np.array(times, dtype="datetime64[s]")
+    seconds = datetime64.astype(np.int64)
+    utc = [t.replace(tzinfo=datetime.timezone.utc) for t in times]
+
+    for time in [datetime64, seconds, utc]:
+        torch.testing.assert_close(provider(time), expected)
+
+
+def test_cos_zenith_precompute():
+    provider = CosZenith.from_grid(grid)
+    expected = provider(times)
+    provider.precompute(times)
+    assert provider._table is not None
+
+    torch.testing.assert_close(provider(times[2:4]), expected[2:4])
+    # times outside of the table are still evaluated
+    other = times[0] + datetime.timedelta(hours=1)
+    torch.testing.assert_close(provider(other), CosZenith.from_grid(grid)(other))
+
+    provider.clear()
+    assert provider._table is None
+
+
+def test_toa_incident_solar_radiation():
+    provider = CosZenith.from_grid(grid, dtype=torch.float64)
+    seconds = np.array(times, dtype="datetime64[s]").astype(np.int64)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        expected = zenith_angle.toa_incident_solar_radiation_accumulated(
+            seconds[:, None, None],
+            np.array(grid.lat)[:, None],
+            np.array(grid.lon)[None, :],
+        )
+
+    out = provider.toa_incident_solar_radiation(seconds)
+    assert out.shape == (len(times), *grid.shape)
+    np.testing.assert_allclose(out.numpy(), expected, rtol=1e-6, atol=1e-3)
+
+
+def test_cos_zen_wrapper():
+    class Model(torch.nn.Module):
+        def forward(self, x):
+            return x
+
+    model = CosZenWrapper(Model(), grid.lon, grid.lat)
+    x = torch.zeros(2, 3, *grid.shape)
+    y = model(x, times[0])
+
+    lon, lat = np.meshgrid(grid.lon, grid.lat)
+    expected = zenith_angle.cos_zenith_angle(times[0], lon, lat)
+    assert y.shape == (2, 4, *grid.shape)
+    for b in range(2):
+        np.testing.assert_allclose(y[b, -1].numpy(), expected, atol=1e-5)
@@ -1,25 +1,98 @@
 import numpy as np
 import pandas as pd
 import xarray as xr
+import h5py
+import itertools
 import json
 from pathlib import Path
 import scipy
 
-
-def read_to_df(fort_output_dir: Path, f_in_name: str, nlat: int) -> tuple[pd.DataFrame, int]:
-
-    # load the data
-    f_in = pd.read_csv(fort_output_dir / f_in_name, header=0, index_col=None)
-
-    # make sure given nlat is consistent with the input data
-    assert f_in.shape[
-        0] % nlat == 0, f"invalid dimensions: nlat x nlat != {f_in.shape[0]} (len(f_in))"
-    nlev = f_in.shape[0] // nlat
-
-    # remove leading/trailing whitespace from column names
-    f_in.columns = [c.strip() for c in f_in.columns]
-
-    return f_in, nlev
+# SFNO pressure-level variable prefixes and the gen_IC_FCN column each one comes from
+PLEV_FIELDS = [("u", "ZU"), ("v", "ZV"), ("t", "ZT"), ("z", "ZPHI_F"), ("q", "ZQ")]
+
+# read_fields caches each parsed CSV next to it as <name> + SIDECAR_SUFFIX
+SIDECAR_SUFFIX = ".npy"
+
+
+def read_fields(fort_output_dir: Path, f_in_name: str, nlat: int, chunk_lats: int = 64, cache: bool = True) -> tuple[np.ndarray, int]:
+    # parse the Fortran CSV straight into a structured (nlat, nlev) array with one float field per column,
+    # and cache it as a .npy sidecar that later loads memory-map instead of parsing the text again
+    f_in_path = fort_output_dir / f_in_name
+    sidecar_path = f_in_path.with_name(f_in_path.name + SIDECAR_SUFFIX)
+    if cache and sidecar_path.exists() and sidecar_path.stat().st_mtime >= f_in_path.stat().st_mtime:
+        fields = np.load(sidecar_path, mmap_mode="r")
+        if fields.shape[0] != nlat:
+            raise ValueError(f"invalid dimensions: {sidecar_path} has {fields.shape[0]} lats, expected {nlat}")
+        return fields, fields.shape[1]
+
+    with open(f_in_path) as f:
+        # remove leading/trailing whitespace from column names
+        names = [c.strip() for c in f.readline().split(",")]
+
+        # rows are ordered (lat, lev), so the first latitude's rows give nlev
+        first_lat = []
+        line = f.readline()
+        while line and int(line.split(",", 1)[0]) == 0:
+            first_lat.append(line)
+            line = f.readline()
+        nlev = len(first_lat)
+        if nlev == 0:
+            raise ValueError(f"no rows for the first latitude in {f_in_path}")
+
+        # preallocate the whole output and fill it one chunk of latitudes at a time
+        buf = np.empty((nlat * nlev, len(names)))
+        rows = itertools.chain(first_lat, [line], f)
+        for start in range(0, nlat * nlev, chunk_lats * nlev):
+            n = min(chunk_lats * nlev, nlat * nlev - start)
+            chunk = np.loadtxt(itertools.islice(rows, n), delimiter=",", ndmin=2)
+            if chunk.shape[0] != n:
+                raise ValueError(f"invalid dimensions: {f_in_path} ended after {start + chunk.shape[0]} rows, expected nlat x nlev = {nlat * nlev}")
+            buf[start:start + n] = chunk
+        if any(row.strip() for row in rows):
+            raise ValueError(f"invalid dimensions: {f_in_path} has more than nlat x nlev = {nlat * nlev} rows")
+
+    # make sure every row landed where its (ILAT, ILEV) index says it belongs
+    idx = np.arange(nlat * nlev)
+    if not (np.array_equal(buf[:, 0], idx // nlev) and np.array_equal(buf[:, 1], idx % nlev)):
+        raise ValueError(f"{f_in_path} rows are not ordered by (ILAT, ILEV)")
+
+    fields = buf.view([(name, buf.dtype) for name in names]).reshape(nlat, nlev)
+    if cache:
+        np.save(sidecar_path, fields)
+
+    return fields, nlev
+
+
+# header of the stream binary written by gen_IC_FCN with OUTFMT=bin, followed by nfield 8-char names
+BIN_HEADER = np.dtype([("magic", "S8"), ("nlat", "<i8"), ("nlev", "<i8"), ("nfield", "<i8")])
+
+
+def read_fields_bin(fort_output_dir: Path, f_in_name: str, nlat: int) -> tuple[np.ndarray, int]:
+    # memory-map the gen_IC_FCN binary output as a structured (nlat, nlev) array, same layout as read_fields
+    f_in_path = fort_output_dir / f_in_name
+    header = np.fromfile(f_in_path, dtype=BIN_HEADER, count=1)[0]
+    if header["magic"] != b"GENICBIN":
+        raise ValueError(f"{f_in_path} is not a gen_IC_FCN binary file")
+    if header["nlat"] != nlat:
+        raise ValueError(f"invalid dimensions: {f_in_path} has {header['nlat']} lats, expected {nlat}")
+    nlev, nfield = int(header["nlev"]), int(header["nfield"])
+
+    names = np.fromfile(f_in_path, dtype="S8", count=nfield, offset=BIN_HEADER.itemsize)
+    dtype = np.dtype([(name.decode().strip(), "<f8") for name in names])
+    offset = BIN_HEADER.itemsize + names.nbytes
+    if f_in_path.stat().st_size != offset + nlat * nlev * dtype.itemsize:
+        raise ValueError(f"invalid dimensions: {f_in_path} size does not match nlat x nlev = {nlat * nlev} records")
+
+    fields = np.memmap(f_in_path, dtype=dtype, mode="r", offset=offset, shape=(nlat, nlev))
+
+    return fields, nlev
+
+
+def read_gen_ic(fort_output_dir: Path, f_in_name: str, nlat: int) -> tuple[np.ndarray, int]:
+    # binary output (.bin) is memory-mapped, anything else is parsed as CSV
+    if f_in_name.endswith(".bin"):
+        return read_fields_bin(fort_output_dir, f_in_name, nlat)
+    return read_fields(fort_output_dir, f_in_name, nlat)
 
 
 def read_metadata(metadata_dir: Path, lat_fname: str, lon_fname: str, lev_fname: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
@@ -32,15 +105,129 @@ def read_metadata(metadata_dir: Path, lat_fname: str, lon_fname: str, lev_fname:
     return lat, lon, lev.T
 
 
-def compute_tcwv(q: np.ndarray, lev: np.ndarray) -> np.ndarray:
-    # compute total column water vapor, see https://resources.eumetrain.org/data/3/359/print_2.htm for similar formula
+def tcwv_weights(lev: np.ndarray, rule: str = "trapezoid") -> np.ndarray:
+    # quadrature weights over the (non-uniform) pressure levels, so that tcwv = q @ weights
+    # see https://resources.eumetrain.org/data/3/359/print_2.htm for similar formula
     g = 9.80665  # m/s^2
 
     pa = 100 * lev  # convert hPa to Pa
 
-    tcwv = -(1 / g) * scipy.integrate.trapezoid(q, pa, axis=1)
+    # both rules are linear in q, integrating the identity gives the weight of each level
+    if rule == "trapezoid":
+        weights = scipy.integrate.trapezoid(np.eye(len(pa)), pa, axis=-1)
+    elif rule == "simpson":
+        weights = scipy.integrate.simpson(np.eye(len(pa)), x=pa, axis=-1)
+    else:
+        raise ValueError(f"unknown quadrature rule {rule}, expected trapezoid or simpson")
+
+    return -(1 / g) * weights
+
+
+def compute_tcwv(q, lev: np.ndarray = None, rule: str = "trapezoid", weights=None):
+    # compute total column water vapor for q of shape (..., nlev), e.g. (member, nlat, nlev)
+    # q may be a numpy array or a torch tensor, in which case the result stays on its device
+    # pass weights from tcwv_weights to reuse them across calls
+    if weights is None:
+        weights = tcwv_weights(lev, rule)
+    if hasattr(q, "new_tensor") and not hasattr(weights, "new_tensor"):
+        weights = q.new_tensor(weights)
+
+    return q @ weights
+
+
+def stack_fields(members: list[np.ndarray]) -> dict[str, np.ndarray]:
+    # stack each field of the structured (nlat, nlev) arrays across members, shape (member, nlat, nlev)
+    return {name: np.stack([m[name] for m in members]) for name in members[0].dtype.names}
+
+
+def build_channels(
+        fields: dict[str, np.ndarray],
+        plev: np.ndarray,
+        keep_plevs: list[int],
+        channels: np.ndarray,
+        include_dewpt: bool,
+        tcwv_rule: str = "trapezoid",
+) -> np.ndarray:
+    # build the (member, channel, lat) array in ``channels`` order from (member, nlat, nlev) fields
+    n_member, nlat, nlev = fields["ZQ"].shape
 
-    return tcwv
+    # extract vertical RH profile (only defined on the first latitude), convert to percentage
+    rh_raw = fields["ZRH"][:, 0, :] * 100
+
+    # compute total column water vapor
+    tcwv = compute_tcwv(fields["ZQ"], plev, tcwv_rule)
+
+    # keep only the desired vertical levels
+    keep_plevs = np.array(keep_plevs)
+    keep_idxs = np.where(np.isin(plev, keep_plevs))[0]
+
+    # RH is a single vertical profile, broadcast across lat to match the shape of the other variables
+    rh = np.broadcast_to(rh_raw[:, None, keep_idxs], (n_member, nlat, len(keep_idxs)))
+
+    # pressure-level variables, (member, var, lat, lev) -> (member, var * lev, lat)
+    plev_vars = np.stack([fields[uname][..., keep_idxs] for _, uname in PLEV_FIELDS] + [rh], axis=1)
+    plev_vars = plev_vars.transpose(0, 1, 3, 2).reshape(n_member, -1, nlat)
+    plev_names = [
+        f"{lname}{p}" for lname in [lname for lname, _ in PLEV_FIELDS] + ["r"] for p in keep_plevs.astype(str)
+    ]
+
+    # single-level variables, pressure vars are both constant due to initiation at sea level
+    u, v, t = fields["ZU"], fields["ZV"], fields["ZT"]
+    single = {
+        "tcwv": tcwv,
+        "sp": np.full_like(tcwv, 1013.25) * 100,  # convert hPa to Pa
+        "msl": np.full_like(tcwv, 1013.25) * 100,  # convert hPa to Pa
+        # lowest model level instead of 10 meter winds
+        "u10m": u[..., 0],
+        "v10m": v[..., 0],
+        # lowest model level instead of 100 meter winds
+        "u100m": u[..., 0],
+        "v100m": v[..., 0],
+        # lowest model level instead of 2 meter temperature
+        "t2m": t[..., 0],
+    }
+
+    # add dewpoint temperature if requested
+    if include_dewpt:
+        t2mC = t[..., 0] - 273.15
+        # calculate dewpoint temperature, formula from https://en.wikipedia.org/wiki/Dew_point
+        b = 17.625
+        c = 243.04
+        gamma = np.log(rh_raw[:, :1] / 100) + (b * t2mC) / (c + t2mC)
+        single["2d"] = (c * gamma) / (b - gamma) + 273.15
+
+    # gather every channel in the requested order with a single take
+    names = list(single) + plev_names
+    columns = np.concatenate([np.stack(list(single.values()), axis=1), plev_vars], axis=1)
+    index = [names.index(ch) for ch in channels]
+
+    return np.take(columns, index, axis=1)
+
+
+def write_metadata(
+        output_to_dir: Path,
+        channels: np.ndarray,
+        lat: np.ndarray,
+        lon: np.ndarray,
+        metadata_attrs: dict,
+        zonal: bool = False,
+):
+    # save metadata to data.json
+    # zonal ICs are stored without the lon dimension and broadcast along lon when read
+    metadata = {
+        "h5_path": "data",
+        "dims": ["time", "channel", "lat"] if zonal else ["time", "channel", "lat", "lon"],
+        "zonal": zonal,
+        "coords": {
+            "channel": channels.tolist(),
+            "lat": lat.tolist(),
+            "lon": lon.tolist()
+        },
+        "dhours": 6,
+        "attrs": metadata_attrs
+    }
+    with open(output_to_dir / "data.json", "w") as f:
+        json.dump(metadata, f, indent=4)
 
 
 def main(
@@ -59,95 +246,23 @@ def main(
         keep_plevs: list[int],
         include_dewpt: bool,
         metadata_attrs: dict,
+        zonal: bool = False,
+        tcwv_rule: str = "trapezoid",
 ):
 
-    df, nlev = read_to_df(fort_output_dir, f_in_name, nlat)
-
-    # extract vertical RH profile, convert to percentage
-    rh_raw = df["ZRH"].values[:nlev] * 100
-
-    # remove RH from dataframe
-    df = df.drop(columns=["ZRH"])
+    member, nlev = read_gen_ic(fort_output_dir, f_in_name, nlat)
 
     # read latitude and vertical levels data
     lat, lon, (plev, etalev) = read_metadata(
         metadata_dir, lat_fname, lon_fname, lev_fname)
     plev, etalev = plev.T, etalev.T
 
-    # compute total column water vapor
-    q = df["ZQ"].values.reshape(nlat, nlev)
-    tcwv = compute_tcwv(q, plev)
-
-    # keep only the desired vertical levels
-    keep_plevs = np.array(keep_plevs)
-    keep_idxs = np.where(np.isin(plev, keep_plevs))[0]
-
-    # similar to above, tile across lat to match the shape of the other variables
-    rh = np.tile(rh_raw[keep_idxs], (nlat, 1))
-
-    # create pressure vars, both constant due to initiation at sea level
-    sp = np.full_like(tcwv, 1013.25) * 100  # convert hPa to Pa
-    msl = np.full_like(tcwv, 1013.25) * 100  # convert hPa to Pa
-
-    # create xarray dataset
-    ds_73 = xr.Dataset(
-        {
-            "tcwv": (["lat"], tcwv),
-            "sp": (["lat"], sp),
-            "msl": (["lat"], msl),
-        },
-        coords={
-            "lat": lat
-        }
-    )
-
-    # iteratively add pressure-coordinate necessary variables and levels to the dataset
-    for lname, uname in [("u", "ZU"), ("v", "ZV"), ("t", "ZT"), ("z", "ZPHI_F"), ("q", "ZQ"), (("r", "RH"), rh)]:
-
-        # rh case, processing done already
-        if isinstance(lname, tuple):
-            sub = uname  # uname contains rh data
-            (lname, uname) = lname  # lname contains both names
-
-        # other vars
-        else:
-            # reshape to (nlat, nlev) and keep only the vertical levels needed for SFNO
-            sub = df[uname].values.reshape(nlat, nlev)[:, keep_idxs]
-
-        for i, plev in enumerate(keep_plevs.astype(str)):
-            name = f"{lname}{plev}"
-            ds_73[name] = (["lat"], sub[:, i])
-
-    # add height level variables to dataset, all at lowest model level [0] or 1013.25 hPa
-    u = df["ZU"].values.reshape(nlat, nlev)
-    v = df["ZV"].values.reshape(nlat, nlev)
-    t = df["ZT"].values.reshape(nlat, nlev)
-    # lowest model level instead of 10 meter winds
-    ds_73["u10m"] = (["lat"], u[:, 0])
-    ds_73["v10m"] = (["lat"], v[:, 0])
-    # lowest model level instead of 100 meter winds
-    ds_73["u100m"] = (["lat"], u[:, 0])
-    ds_73["v100m"] = (["lat"], v[:, 0])
-    # lowest model level instead of 2 meter temperature
-    ds_73["t2m"] = (["lat"], t[:, 0])
-
     # find channel order
     channels = np.loadtxt(metadata_dir / channels_fname, dtype=str)
 
-    # add dewpoint temperature if requested
-    if include_dewpt:
-        t2mC = df["ZT"].values.reshape(nlat, nlev)[:, 0] - 273.15
-        # calculate dewpoint temperature, formula from https://en.wikipedia.org/wiki/Dew_point
-        b = 17.625
-        c = 243.04
-        gamma = np.log(rh_raw[0] / 100) + (b * t2mC) / (c + t2mC)
-        dewpt = (c * gamma) / (b - gamma) + 273.15
-
-        ds_73["2d"] = (["lat"], dewpt)
-
-    # convert from data variables to channel as coordinate
-    arr_lst = [ds_73[ch].data for ch in channels]
-    stacked = np.stack(arr_lst, axis=0)
+    # a single run is a batch of one member
+    fields = stack_fields([member])
+    stacked = build_channels(fields, plev, keep_plevs, channels, include_dewpt, tcwv_rule)[0]
     ds_73 = xr.DataArray(stacked, dims=["channel", "lat"], coords={
                          "channel": channels, "lat": lat})
 
@@ -164,7 +279,9 @@ def main(
     # expand all variables along longitude dimension
     # while Bouvier et al. only outputs one meridional slice, we need the whole domain for SFNO
     # unsure which axis to expand along
-    ds_73 = ds_73.expand_dims({"lon": lon}, axis=2)
+    # zonal ICs skip this, earth2mip broadcasts them along lon when reading
+    if not zonal:
+        ds_73 = ds_73.expand_dims({"lon": lon}, axis=2)
     ds_73 = ds_73.to_dataset(name="data")
 
     # # add time dimension because it's required for the inference function
@@ -175,20 +292,7 @@ def main(
     data_dir.mkdir(parents=True, exist_ok=True)
     ds_73.to_netcdf(data_dir / f_out_name)
 
-    # save metadata to data.json
-    metadata = {
-        "h5_path": "data",
-        "dims": ["time", "channel", "lat", "lon"],
-        "coords": {
-            "channel": channels.tolist(),
-            "lat": lat.tolist(),
-            "lon": lon.tolist()
-        },
-        "dhours": 6,
-        "attrs": metadata_attrs
-    }
-    with open(output_to_dir / "data.json", "w") as f:
-        json.dump(metadata, f, indent=4)
+    write_metadata(output_to_dir, channels, lat, lon, metadata_attrs, zonal)
 
     # look at data
     print(ds_73)
@@ -198,6 +302,74 @@ def main(
     print(f"Preprocessing complete, saved to {output_to_dir}")
 
 
+def main_batch(
+        fort_output_dir: Path,
+        f_in_pattern: str,
+        metadata_dir: Path,
+        lat_fname: str,
+        lon_fname: str,
+        lev_fname: str,
+        channels_fname: str,
+        output_to_dir: Path,
+        f_out_name: str,
+        nlat: int,
+        keep_plevs: list[int],
+        include_dewpt: bool,
+        metadata_attrs: dict,
+        zonal: bool = False,
+        tcwv_rule: str = "trapezoid",
+        dtype: np.dtype = np.float32,
+):
+    # preprocess every Fortran output matching f_in_pattern (e.g. "*.csv") into one HDF5 file,
+    # member k of the sweep is stored at time index k, i.e. 1970-01-01 + k * dhours for "1970.h5"
+    # skip the sidecar caches read_fields writes next to the inputs
+    f_in_paths = sorted(
+        path for path in fort_output_dir.glob(f_in_pattern)
+        if not path.name.endswith(SIDECAR_SUFFIX))
+    if not f_in_paths:
+        raise FileNotFoundError(f"no files matching {f_in_pattern} in {fort_output_dir}")
+
+    # every member must have the levels of the first one
+    members = []
+    nlev = None
+    for path in f_in_paths:
+        member, nlev_member = read_gen_ic(path.parent, path.name, nlat)
+        if nlev is not None and nlev_member != nlev:
+            raise ValueError(f"{path} has {nlev_member} levels, expected {nlev}")
+        nlev = nlev_member
+        members.append(member)
+
+    # read latitude and vertical levels data once for all members
+    lat, lon, (plev, etalev) = read_metadata(
+        metadata_dir, lat_fname, lon_fname, lev_fname)
+
+    # find channel order
+    channels = np.loadtxt(metadata_dir / channels_fname, dtype=str)
+
+    fields = stack_fields(members)
+    stacked = build_channels(fields, plev, keep_plevs, channels, include_dewpt, tcwv_rule).astype(dtype)
+    n_member, n_channel, _ = stacked.shape
+
+    # save to disk, chunked by member and channel so each IC is a contiguous read
+    data_dir = output_to_dir / 'data'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    with h5py.File(data_dir / f_out_name, "w") as f:
+        if zonal:
+            f.create_dataset("data", data=stacked, chunks=(1, n_channel, nlat))
+        else:
+            dset = f.create_dataset(
+                "data", shape=(n_member, n_channel, nlat, len(lon)), dtype=dtype, chunks=(1, 1, nlat, len(lon)))
+            # expand along longitude one member at a time to bound memory use
+            for i in range(n_member):
+                dset[i] = np.broadcast_to(stacked[i, :, :, None], dset.shape[1:])
+
+    member_names = [path.name for path in f_in_paths]
+    write_metadata(output_to_dir, channels, lat, lon, {**metadata_attrs, "members": member_names}, zonal)
+
+    # inform user
+    print(f"Preprocessing of {n_member} members complete, saved to {output_to_dir}")
+
+
 if __name__ == "__main__":
 
     data_dir = Path(